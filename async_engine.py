@@ -0,0 +1,66 @@
+# async_engine.py
+
+import asyncio
+import json
+import threading
+import aiohttp
+from config import API_URL, TIMEOUT_SECONDS, ASYNC_MAX_CONNECTIONS, ASYNC_MAX_IN_FLIGHT
+
+class AsyncPlotFetcher:
+    """
+    Runs plot probes on a single background event loop.
+
+    One aiohttp session (and its pool of keep-alive connections to API_URL)
+    lives for the lifetime of the fetcher, so batches and sheets reuse the
+    same connections instead of handshaking per request.
+    """
+
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS, max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                 timeout=TIMEOUT_SECONDS):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-fetch", daemon=True)
+        self._thread.start()
+        self._session = None
+        self._semaphore = None
+        self.run(self._open(max_connections, max_in_flight, timeout))
+
+    async def _open(self, max_connections, max_in_flight, timeout):
+        connector = aiohttp.TCPConnector(limit=max_connections, limit_per_host=max_connections)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        )
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def get_json(self, params, url=API_URL):
+        """
+        GET url with params on the shared session.
+
+        Returns:
+            tuple: (status_code, body length in bytes, decoded JSON body or
+            None when status is not 200)
+        """
+        params = {key: str(value) for key, value in params.items()}
+        async with self._semaphore:
+            async with self._session.get(url, params=params) as response:
+                body = await response.read()
+                if response.status != 200:
+                    return response.status, len(body), None
+                return response.status, len(body), json.loads(body)
+
+    def submit(self, coro):
+        """Schedule a coroutine on the fetch loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro):
+        """Run a coroutine on the fetch loop and block until it finishes"""
+        return self.submit(coro).result()
+
+    def close(self):
+        """Close the session and stop the background loop"""
+        if self._session is not None:
+            self.run(self._session.close())
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
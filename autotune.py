@@ -0,0 +1,285 @@
+# autotune.py
+
+import argparse
+import ast
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import config
+from config import (MAX_WORKERS, TIMEOUT_SECONDS, IMAGE_WORKERS, IMAGE_TIMEOUT_SECONDS, RATE_LIMIT, CONCURRENCY_MAX,
+                    TUNING_PROFILE_FILE, AUTOTUNE_SAMPLE_PLOTS, AUTOTUNE_SAMPLE_IMAGES, AUTOTUNE_REPEATS,
+                    AUTOTUNE_MAX_ERROR_RATE, AUTOTUNE_TOLERANCE, AUTOTUNE_WORKERS, AUTOTUNE_TIMEOUT_FACTORS,
+                    AUTOTUNE_MIN_TIMEOUT_SECONDS, AUTOTUNE_MIN_IMAGE_TIMEOUT_SECONDS, AUTOTUNE_IMAGE_WORKERS,
+                    AUTOTUNE_TRIAL_RATE_LIMIT)
+
+# Only settings the trials actually measure go into a profile
+DEFAULTS = {
+    "MAX_WORKERS": MAX_WORKERS,
+    "TIMEOUT_SECONDS": TIMEOUT_SECONDS,
+    "IMAGE_WORKERS": IMAGE_WORKERS,
+    "IMAGE_TIMEOUT_SECONDS": IMAGE_TIMEOUT_SECONDS
+}
+
+def _p99(endpoint):
+    from metrics import get_metrics
+    histograms = get_metrics().snapshot()["histograms"].get("request_seconds", {})
+    return histograms.get(f"endpoint={endpoint}", {}).get("p99", 0.0)
+
+def run_trial(spec):
+    """Child side: apply the trial's settings, run it in the current directory and return its counts"""
+    for key, value in spec["settings"].items():
+        setattr(config, key, value)
+    config.CACHE_ENABLED = False
+    village_no, sheet_no = spec["village"], spec["sheet"]
+    start = time.monotonic()
+
+    if spec["kind"] == "plots":
+        from plot_store import PlotStore
+        from scraper import VillageScraper
+        scraper = VillageScraper(location=spec["location"], read_cache=False)
+        found = PlotStore()
+        plot_nos = list(range(1, spec["plots"] + 1))
+        try:
+            # One windowed sweep, as a crawl keeps probe_window probes in flight across batches
+            results = list(scraper._fetch_batch(village_no, sheet_no, plot_nos, found))
+        finally:
+            scraper.close()
+        plots = [found[key] for key in found]
+        if spec.get("plots_file"):
+            with open(spec["plots_file"], "w", encoding="utf-8") as f:
+                json.dump(plots, f)
+        return {
+            "elapsed": time.monotonic() - start, "items": len(plots), "requests": len(results),
+            "errors": sum(1 for result in results if not result["success"]), "p99": _p99("plot")
+        }
+
+    from plot_image_scraper import PlotImageDownloader
+    with open(spec["plots_file"], encoding="utf-8") as f:
+        plots = json.load(f)[:spec["images"]]
+    downloader = PlotImageDownloader(village_no, max_workers=config.IMAGE_WORKERS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            downloader.submit_sheet(sheet_no, plots)
+        finally:
+            counts = downloader.finish()
+    return {
+        "elapsed": time.monotonic() - start, "items": counts["successful"], "requests": counts["total_plots"],
+        "errors": counts["failed"], "p99": _p99("wms")
+    }
+
+class Calibration:
+    """
+    Short measured runs against one sample sheet, each in a child process
+    with its own scratch directory, so every trial starts from cold
+    connections, an empty cache and no checkpoints. Settings are compared
+    on the median of `repeats` trials, run interleaved so that drift in
+    the server's load is spread over every candidate.
+
+    Trials run with the request limiter lifted (`limits`), so the worker
+    count and timeouts are measured rather than RATE_LIMIT; overrides for
+    the limiter's own settings take precedence.
+    """
+
+    def __init__(self, village_no, sheet_no, location, plots=AUTOTUNE_SAMPLE_PLOTS, images=AUTOTUNE_SAMPLE_IMAGES,
+                 overrides=None, repeats=AUTOTUNE_REPEATS):
+        self.village_no = village_no
+        self.sheet_no = sheet_no
+        self.location = location
+        self.plots = plots
+        self.images = images
+        self.overrides = overrides or {}
+        self.repeats = max(1, repeats)
+        self.limits = {
+            "RATE_LIMIT": self.overrides.get("RATE_LIMIT", AUTOTUNE_TRIAL_RATE_LIMIT),
+            "CONCURRENCY_INITIAL": self.overrides.get("CONCURRENCY_INITIAL",
+                                                      self.overrides.get("CONCURRENCY_MAX", CONCURRENCY_MAX))
+        }
+        self.workdir = tempfile.mkdtemp(prefix="scraper-autotune-")
+        self.plots_file = os.path.join(self.workdir, "sample_plots.json")
+        self.trials = []
+
+    def close(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def trial(self, kind, settings):
+        """Run one trial; returns its counts plus items/sec and error rate, or None if it crashed"""
+        spec = {
+            "kind": kind, "settings": {**self.limits, **settings, **self.overrides}, "village": self.village_no,
+            "sheet": self.sheet_no, "location": self.location, "plots": self.plots, "images": self.images,
+            "plots_file": self.plots_file
+        }
+        env = {key: value for key, value in os.environ.items() if key != "SCRAPER_PROFILE"}
+        scratch = tempfile.mkdtemp(dir=self.workdir)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+            cwd=scratch, env=env, capture_output=True, text=True
+        )
+        shutil.rmtree(scratch, ignore_errors=True)
+        if proc.returncode != 0:
+            print(f"{kind} trial {settings} failed:\n{proc.stderr[-2000:]}", file=sys.stderr)
+            return None
+
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["rate"] = result["items"] / result["elapsed"] if result["elapsed"] else 0.0
+        result["error_rate"] = result["errors"] / result["requests"] if result["requests"] else 1.0
+        self.trials.append({"kind": kind, "settings": settings, **result})
+        print(f"{kind:6} {json.dumps(settings)}: {result['rate']:.1f}/s, "
+              f"{result['error_rate']:.1%} errors, p99 {result['p99']}s")
+        return result
+
+    def measure(self, kind, candidates):
+        """
+        Run `repeats` rounds of one trial per candidate settings.
+
+        Returns:
+            list: Per candidate, its median items and items/sec, pooled error
+                rate and worst p99, or None if any of its trials crashed
+        """
+        runs = [[] for _ in candidates]
+        for _ in range(self.repeats):
+            for trials, settings in zip(runs, candidates):
+                trials.append(self.trial(kind, settings))
+
+        summaries = []
+        for trials in runs:
+            if any(result is None for result in trials):
+                summaries.append(None)
+                continue
+            requests = sum(result["requests"] for result in trials)
+            summaries.append({
+                "items": statistics.median(result["items"] for result in trials),
+                "rate": statistics.median(result["rate"] for result in trials),
+                "error_rate": sum(result["errors"] for result in trials) / requests if requests else 1.0,
+                "p99": max(result["p99"] for result in trials)
+            })
+        return summaries
+
+    def search(self, kind, settings, key, candidates):
+        """
+        Try each candidate for one setting, others fixed, and keep the first
+        (in the given order of preference) within AUTOTUNE_TOLERANCE of the
+        best median items/sec among candidates under AUTOTUNE_MAX_ERROR_RATE.
+        """
+        trial_settings = [{**settings, key: value} for value in candidates]
+        measured = [
+            (s, summary) for s, summary in zip(trial_settings, self.measure(kind, trial_settings))
+            if summary is not None and summary["error_rate"] <= AUTOTUNE_MAX_ERROR_RATE
+        ]
+        for s, summary in measured:
+            print(f"{kind:6} {key}={s[key]}: median {summary['rate']:.1f}/s, {summary['error_rate']:.1%} errors")
+        if not measured:
+            print(f"No {key} candidate met the error budget; keeping {settings.get(key)}")
+            return settings, None
+
+        best = max(summary["rate"] for _, summary in measured)
+        return next((s, r) for s, r in measured if r["rate"] >= best * (1 - AUTOTUNE_TOLERANCE))
+
+def _timeouts(p99, current, floor):
+    if not p99 or math.isinf(p99):
+        return [current]
+    return sorted({max(floor, math.ceil(p99 * factor)) for factor in AUTOTUNE_TIMEOUT_FACTORS}, reverse=True)
+
+def autotune(village_no, sheet_no, location, tune_images=True, **calibration_args):
+    """
+    Search worker count and timeout for the most plots/sec found on the
+    sample sheet within the error budget, then the image download
+    concurrency and timeout.
+
+    Returns:
+        dict: The tuned "settings" and every trial run
+    """
+    calibration = Calibration(village_no, sheet_no, location, **calibration_args)
+    try:
+        settings = dict(DEFAULTS)
+        baseline = calibration.measure("plots", [settings])[0]
+        if baseline is None:
+            raise RuntimeError("Baseline calibration run failed")
+        if not baseline["items"]:
+            raise RuntimeError(f"No plots found in the first {calibration.plots} of the sample sheet")
+
+        settings, _ = calibration.search("plots", settings, "MAX_WORKERS", AUTOTUNE_WORKERS)
+        settings, result = calibration.search(
+            "plots", settings, "TIMEOUT_SECONDS",
+            _timeouts(baseline["p99"], settings["TIMEOUT_SECONDS"], AUTOTUNE_MIN_TIMEOUT_SECONDS)
+        )
+
+        if tune_images:
+            # Every plot trial leaves its found plots in plots_file for the image trials
+            settings, image_result = calibration.search("images", settings, "IMAGE_WORKERS", AUTOTUNE_IMAGE_WORKERS)
+            if image_result is not None:
+                settings["IMAGE_TIMEOUT_SECONDS"] = _timeouts(
+                    image_result["p99"], IMAGE_TIMEOUT_SECONDS, AUTOTUNE_MIN_IMAGE_TIMEOUT_SECONDS
+                )[0]
+
+        return {
+            "created": datetime.now().isoformat(),
+            "sample": {"location": location, "village": village_no, "sheet": sheet_no,
+                       "plots": calibration.plots, "repeats": calibration.repeats, "overrides": calibration.overrides,
+                       "limits": calibration.limits},
+            "note": "Measured with the request limiter at sample.limits; crawls stay capped by RATE_LIMIT",
+            "baseline_rate": baseline["rate"],
+            "tuned_rate": result["rate"] if result else None,
+            "settings": settings,
+            "trials": calibration.trials
+        }
+    finally:
+        calibration.close()
+
+def save_profile(name, profile, path=TUNING_PROFILE_FILE):
+    """Add or replace a named profile in the profiles file"""
+    profiles = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            profiles = json.load(f)
+    profiles[name] = profile
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(json.dumps(run_trial(json.loads(sys.argv[2]))))
+        return
+
+    parser = argparse.ArgumentParser(description="Calibrate scraper settings against a sample sheet")
+    parser.add_argument("village", help='Sample village number or "d,t,r,v" path')
+    parser.add_argument("sheet", help="Sample sheet number")
+    parser.add_argument("--name", default="default", help="Profile name, selected later with SCRAPER_PROFILE")
+    parser.add_argument("--plots", type=int, default=AUTOTUNE_SAMPLE_PLOTS, help="Plots probed per trial")
+    parser.add_argument("--images", type=int, default=AUTOTUNE_SAMPLE_IMAGES, help="Images per image trial")
+    parser.add_argument("--repeats", type=int, default=AUTOTUNE_REPEATS, help="Trials per candidate setting")
+    parser.add_argument("--no-images", action="store_true", help="Skip the image download trials")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Config override for every trial (not saved in the profile), e.g. RATE_LIMIT=500 "
+                             "to measure under a rate cap instead of with the limiter lifted")
+    args = parser.parse_args()
+
+    from hierarchy import resolve_location
+    location, village_no = resolve_location(args.village)
+    overrides = {}
+    for override in args.set:
+        key, value = override.split("=", 1)
+        try:
+            overrides[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[key] = value
+
+    profile = autotune(village_no, args.sheet, location, tune_images=not args.no_images,
+                       plots=args.plots, images=args.images, overrides=overrides, repeats=args.repeats)
+    save_profile(args.name, profile)
+    print(f"Saved profile '{args.name}' to {TUNING_PROFILE_FILE}: {profile['settings']}")
+    if profile["tuned_rate"] and profile["tuned_rate"] > RATE_LIMIT:
+        print(f"Tuned for {profile['tuned_rate']:.0f} plots/s, but crawls are capped at RATE_LIMIT={RATE_LIMIT} requests/s")
+    print(f"Use it with: SCRAPER_PROFILE={args.name}")
+
+if __name__ == "__main__":
+    main()
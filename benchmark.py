@@ -0,0 +1,206 @@
+# benchmark.py
+
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from mock_server import MockBhuNaksha
+
+SCENARIOS = ("hierarchy", "crawl", "images")
+CRAWL_LOCATION = "1,1,1"
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _apply_overrides(overrides):
+    """Set config constants (KEY=VALUE) before any scraper module reads them"""
+    import config
+    for override in overrides:
+        key, value = override.split("=", 1)
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        setattr(config, key, value)
+
+def run_scenario(name, options):
+    """Child side: run one scenario in the current directory and return its result"""
+    _apply_overrides([f"CACHE_ENABLED={options['cache']}"] + options["set"])
+    villages = [str(v) for v in range(1, options["crawl_villages"] + 1)]
+    items = 0
+
+    if name == "hierarchy":
+        from hierarchy import HierarchyIndex
+        index = HierarchyIndex()
+        try:
+            items = index.expand(max_level=4).get("village", 0)
+        finally:
+            index.close()
+
+    elif name == "crawl":
+        from utils import setup_logging, ensure_directories
+        from scraper import VillageScraper
+        setup_logging()
+        ensure_directories()
+        scraper = VillageScraper(fetch_mode=options["fetch_mode"], location=CRAWL_LOCATION)
+        try:
+            for village_no in villages:
+                data = scraper.scrape_village(village_no)
+                items += len(data) if data else 0
+        finally:
+            scraper.close()
+
+    elif name == "images":
+        from plot_image_scraper import download_village_plots
+        from utils import village_key
+        for village_no in villages:
+            # Downloads the plots the crawl scenario wrote to the shared scratch directory
+            with contextlib.redirect_stdout(io.StringIO()):
+                counts = download_village_plots(village_key(CRAWL_LOCATION, village_no),
+                                                max_workers=options["image_workers"])
+            if not counts["total_plots"]:
+                raise RuntimeError(f"No plots to download for village {CRAWL_LOCATION},{village_no}; "
+                                   "run the crawl scenario first")
+            items += counts["successful"]
+
+    return {"items": items, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def summarize(name, elapsed, child, stats):
+    requests = sum(stats["requests"].values())
+    probes = stats["plot_hits"] + stats["plot_misses"]
+    return {
+        "scenario": name,
+        "elapsed_s": round(elapsed, 3),
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(stats["latency"], 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(stats["latency"], 0.99) * 1000, 2),
+        "wasted_probe_ratio": round(stats["plot_misses"] / probes, 3) if probes else 0.0,
+        "errors": stats["errors"],
+        "mb_served": round(stats["bytes"] / 1e6, 2),
+        "items": child["items"],
+        "peak_rss_mb": round(child["peak_rss_kb"] / 1024, 1)
+    }
+
+def run_benchmark(args):
+    mock = MockBhuNaksha(villages=args.villages, sheets=args.sheets, plots_per_sheet=args.plots_per_sheet,
+                         sparsity=args.sparsity, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                         image_kb=args.image_kb)
+    server = mock.serve()
+    env = dict(os.environ, BHUNAKSHA_URL=f"http://127.0.0.1:{server.server_address[1]}/bhunaksha")
+    options = {
+        "cache": args.cache,
+        "fetch_mode": args.fetch_mode,
+        "crawl_villages": min(args.crawl_villages, args.villages),
+        "image_workers": args.image_workers,
+        "set": args.set
+    }
+    workdir = tempfile.mkdtemp(prefix="scraper-bench-")
+    results = []
+
+    try:
+        for name in args.scenarios:
+            mock.reset_stats()
+            start = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", name, json.dumps(options)],
+                cwd=workdir, env=env, capture_output=True, text=True
+            )
+            elapsed = time.perf_counter() - start
+            if proc.returncode != 0:
+                print(f"Scenario {name} failed:\n{proc.stderr[-2000:]}", file=sys.stderr)
+                continue
+            child = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(summarize(name, elapsed, child, mock.snapshot_stats()))
+    finally:
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"Scratch directory kept at {workdir}")
+
+    return results
+
+def print_table(results):
+    columns = ["scenario", "elapsed_s", "requests", "requests_per_s", "p50_ms", "p99_ms",
+               "wasted_probe_ratio", "errors", "mb_served", "items", "peak_rss_mb"]
+    widths = [max(len(col), *(len(str(r[col])) for r in results)) for col in columns]
+    print("  ".join(col.ljust(w) for col, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[col]).ljust(w) for col, w in zip(columns, widths)))
+
+def compare(results, baseline_path, tolerance):
+    """Flag scenarios whose throughput fell or whose waste rose beyond tolerance"""
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None:
+            continue
+        if result["requests_per_s"] < before["requests_per_s"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: requests/s {before['requests_per_s']} -> {result['requests_per_s']}")
+        if result["wasted_probe_ratio"] > before["wasted_probe_ratio"] + tolerance:
+            regressions.append(f"{result['scenario']}: wasted probes {before['wasted_probe_ratio']} -> {result['wasted_probe_ratio']}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: peak RSS {before['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+    return regressions
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        print(json.dumps(run_scenario(sys.argv[2], json.loads(sys.argv[3]))))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local mock BhuNaksha server")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--villages", type=int, default=3, help="Villages per RI in the mock hierarchy")
+    parser.add_argument("--crawl-villages", type=int, default=2, help="Villages crawled/downloaded")
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--plots-per-sheet", type=int, default=300)
+    parser.add_argument("--sparsity", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-kb", type=int, default=0)
+    parser.add_argument("--image-workers", type=int, default=20)
+    parser.add_argument("--fetch-mode", default="thread", choices=["thread", "async"])
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache enabled")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a config constant, e.g. --set RATE_LIMIT=500")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    if results:
+        print_table(results)
+    failed = len(args.scenarios) - len(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+    if failed:
+        sys.exit(f"{failed} scenario(s) failed")
+
+if __name__ == "__main__":
+    main()
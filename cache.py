@@ -0,0 +1,180 @@
+# cache.py
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import logging
+from metrics import get_metrics
+from config import CACHE_ENABLED, CACHE_DB, CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_FLUSH_EVERY, CACHE_FLUSH_SECONDS
+
+EVICTION_INTERVAL = 1000  # Puts between LRU eviction passes
+
+class ResponseCache:
+    """
+    On-disk cache of decoded portal responses, keyed by URL and normalized params.
+
+    Each entry is tagged with a kind ("hierarchy", "sheets", "plot_pos",
+    "plot_neg") that selects its TTL. Entries beyond max_entries are evicted
+    least-recently-used first.
+
+    Lookups read through a connection per thread without taking the cache
+    lock. New entries and the access times of hits are buffered in memory
+    and written in one transaction every CACHE_FLUSH_EVERY changes or
+    CACHE_FLUSH_SECONDS, so the probe hot path never waits on a commit.
+    """
+
+    def __init__(self, path=CACHE_DB, max_entries=CACHE_MAX_ENTRIES, ttls=CACHE_TTL,
+                 flush_every=CACHE_FLUSH_EVERY, flush_seconds=CACHE_FLUSH_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.hits = {kind: 0 for kind in ttls}
+        self.misses = 0
+        self._puts = 0
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()  # Guards the buffers and counters
+        self._write_lock = threading.Lock()  # Serializes flushes on the writer connection
+        self._pending = {}  # key -> (kind, value, created) not yet written
+        self._touched = {}  # key -> last_access of hits not yet written
+        self._last_flush = time.monotonic()
+        self._local = threading.local()
+        self._readers = []
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Normalize a request into a cache key"""
+        normalized = {str(key): str(value) for key, value in (params or {}).items()}
+        return url + "?" + json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+    def _reader(self):
+        """This thread's read connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def get(self, url, params=None):
+        """Return the cached value for a request, or None on a miss or expired entry"""
+        key = self.make_key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._pending.get(key)
+        if row is None:
+            row = self._reader().execute(
+                "SELECT kind, value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None or now - row[2] > self.ttls.get(row[0], 0):
+            with self._lock:
+                self.misses += 1
+            self.metrics.inc("cache_misses_total")
+            return None
+
+        with self._lock:
+            self._touched[key] = now
+            self.hits[row[0]] = self.hits.get(row[0], 0) + 1
+            due = self._flush_due()
+        self.metrics.inc("cache_hits_total", kind=row[0])
+        if due:
+            self.flush()
+        return json.loads(row[1])
+
+    def put(self, kind, url, params, value):
+        """Store a decoded response under the given kind"""
+        key = self.make_key(url, params)
+        with self._lock:
+            self._pending[key] = (kind, json.dumps(value, ensure_ascii=False), time.time())
+            self._touched.pop(key, None)
+            due = self._flush_due()
+        if due:
+            self.flush()
+
+    def _flush_due(self):
+        return (len(self._pending) + len(self._touched) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_seconds)
+
+    def flush(self):
+        """Write buffered entries and access times in one transaction"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                touched, self._touched = self._touched, {}
+                self._last_flush = time.monotonic()
+            if not pending and not touched:
+                return
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, kind, value, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                [(key, kind, value, created, created) for key, (kind, value, created) in pending.items()]
+            )
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in touched.items()]
+            )
+            previous = self._puts
+            self._puts += len(pending)
+            if self._puts // EVICTION_INTERVAL != previous // EVICTION_INTERVAL:
+                self._evict(time.time())
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drop expired entries, then least-recently-used ones above max_entries"""
+        for kind, ttl in self.ttls.items():
+            self._conn.execute("DELETE FROM responses WHERE kind = ? AND created < ?", (kind, now - ttl))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        """Hit/miss counters and current entry count"""
+        self.flush()
+        with self._write_lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._lock:
+            return {"hits": dict(self.hits), "misses": self.misses, "entries": entries}
+
+    def close(self):
+        self.flush()
+        with self._write_lock, self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self._conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, or None when caching is disabled"""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache()
+                atexit.register(_cache.flush)
+            except sqlite3.Error as e:
+                logging.error(f"Error opening response cache: {e}")
+                return None
+    return _cache
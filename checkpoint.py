@@ -0,0 +1,204 @@
+# checkpoint.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from config import CHECKPOINT_DB, DP_STATE_FILE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_progress (
+    village TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    max_plot INTEGER NOT NULL DEFAULT 0,
+    next_plot INTEGER NOT NULL DEFAULT 1,
+    consecutive_empty INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    PRIMARY KEY (village, sheet)
+);
+CREATE TABLE IF NOT EXISTS probed_ranges (
+    village TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS probed_ranges_sheet ON probed_ranges (village, sheet);
+CREATE TABLE IF NOT EXISTS plot_priors (
+    village TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    max_plot INTEGER NOT NULL,
+    PRIMARY KEY (village, sheet)
+);
+"""
+
+def _runs(plot_nos):
+    """Collapse plot numbers into sorted (start, end) runs, inclusive"""
+    runs = []
+    for plot_no in sorted(set(plot_nos)):
+        if runs and plot_no == runs[-1][1] + 1:
+            runs[-1][1] = plot_no
+        else:
+            runs.append([plot_no, plot_no])
+    return [tuple(run) for run in runs]
+
+class CheckpointStore:
+    """
+    Transactional crawl checkpoints in SQLite (WAL mode).
+
+    Progress is recorded per probed plot range and per sheet, each write in
+    its own small transaction, so a killed process loses at most the batch
+    in flight and villages resume independently of each other. Several
+    processes can share one database file.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if is_new:
+            self._import_legacy_state()
+
+    def _import_legacy_state(self):
+        """Carry processed sheets and priors over from scraper_state.json"""
+        try:
+            with open(DP_STATE_FILE, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            for village_no, sheets in state.get("plot_priors", {}).items():
+                for sheet_no, max_plot in sheets.items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO plot_priors VALUES (?, ?, ?)",
+                        (village_no, sheet_no, max_plot)
+                    )
+            for village_no, sheets in state.get("processed_sheets", {}).items():
+                for sheet_no, max_plot in sheets.items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sheet_progress VALUES (?, ?, ?, ?, 0, 1, ?)",
+                        (village_no, sheet_no, max_plot, max_plot + 1, now)
+                    )
+        logging.info(f"Imported legacy state from {DP_STATE_FILE}")
+
+    def processed_sheets(self, village_no):
+        """Completed sheets of a village mapped to their max_plot_found"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sheet, max_plot FROM sheet_progress WHERE village = ? AND done = 1",
+                (village_no,)
+            ).fetchall()
+        return dict(rows)
+
+    def is_sheet_done(self, village_no, sheet_no):
+        return sheet_no in self.processed_sheets(village_no)
+
+    def has_progress(self, village_no):
+        """True if any sheet of the village has been started"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sheet_progress WHERE village = ? LIMIT 1", (village_no,)
+            ).fetchone()
+        return row is not None
+
+    def sheet_progress(self, village_no, sheet_no):
+        """
+        Partial progress of an unfinished sheet.
+
+        Returns:
+            dict: max_plot, next_plot and consecutive_empty, or None if the
+            sheet has not been started
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT max_plot, next_plot, consecutive_empty FROM sheet_progress "
+                "WHERE village = ? AND sheet = ?",
+                (village_no, sheet_no)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"max_plot": row[0], "next_plot": row[1], "consecutive_empty": row[2]}
+
+    def probed_plots(self, village_no, sheet_no):
+        """Plot numbers already probed on an unfinished sheet"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start, end FROM probed_ranges WHERE village = ? AND sheet = ?",
+                (village_no, sheet_no)
+            ).fetchall()
+        return {plot_no for start, end in rows for plot_no in range(start, end + 1)}
+
+    def record_probes(self, village_no, sheet_no, plot_nos, max_plot, next_plot=None, consecutive_empty=0):
+        """Atomically record a finished batch of probes and the sheet's running totals"""
+        runs = _runs(plot_nos)
+        if next_plot is None:
+            next_plot = runs[-1][1] + 1 if runs else 1
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO probed_ranges VALUES (?, ?, ?, ?)",
+                [(village_no, sheet_no, start, end) for start, end in runs]
+            )
+            self._conn.execute(
+                "INSERT INTO sheet_progress VALUES (?, ?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT (village, sheet) DO UPDATE SET max_plot = excluded.max_plot, "
+                "next_plot = excluded.next_plot, consecutive_empty = excluded.consecutive_empty, "
+                "updated = excluded.updated",
+                (village_no, sheet_no, max_plot, next_plot, consecutive_empty, time.time())
+            )
+
+    def mark_sheet_done(self, village_no, sheet_no, max_plot):
+        """Mark a sheet complete and drop its per-range records"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sheet_progress VALUES (?, ?, ?, ?, 0, 1, ?) "
+                "ON CONFLICT (village, sheet) DO UPDATE SET max_plot = excluded.max_plot, "
+                "done = 1, updated = excluded.updated",
+                (village_no, sheet_no, max_plot, max_plot + 1, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM probed_ranges WHERE village = ? AND sheet = ?", (village_no, sheet_no)
+            )
+
+    def prior(self, village_no, sheet_no):
+        """max_plot_found from an earlier crawl of the sheet, 0 if unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT max_plot FROM plot_priors WHERE village = ? AND sheet = ?",
+                (village_no, sheet_no)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def priors(self, village_no):
+        """Sheets of a village with a max_plot_found from an earlier crawl, mapped to it"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sheet, max_plot FROM plot_priors WHERE village = ?", (village_no,)
+            ).fetchall()
+        return dict(rows)
+
+    def reset(self, village_no=None):
+        """
+        Forget crawl progress for one village (or all villages when None).
+        Bounds of completed sheets are kept as priors for the next crawl.
+        """
+        where, args = ("WHERE village = ?", (village_no,)) if village_no is not None else ("", ())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plot_priors SELECT village, sheet, max_plot "
+                f"FROM sheet_progress {where} {'AND' if where else 'WHERE'} done = 1",
+                args
+            )
+            self._conn.execute(f"DELETE FROM sheet_progress {where}", args)
+            self._conn.execute(f"DELETE FROM probed_ranges {where}", args)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
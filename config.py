@@ -1,16 +1,155 @@
 # config.py
 
-API_URL = "https://app1bhunakshaodisha.nic.in/bhunaksha/ScalarDatahandler"
+import json
+import os
+
+# SCRAPER_PROFILE names a profile written by autotune.py; its measured settings
+# replace the defaults of the constants marked "tuned" below
+TUNING_PROFILE_FILE = os.environ.get("SCRAPER_PROFILE_FILE", "tuning_profiles.json")
+TUNING_PROFILE = os.environ.get("SCRAPER_PROFILE")
+_tuned = {}
+if TUNING_PROFILE:
+    try:
+        with open(TUNING_PROFILE_FILE, encoding="utf-8") as _f:
+            _tuned = json.load(_f)[TUNING_PROFILE]["settings"]
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"SCRAPER_PROFILE={TUNING_PROFILE} but {TUNING_PROFILE_FILE} does not exist; "
+            f"run autotune.py --name {TUNING_PROFILE} or unset SCRAPER_PROFILE"
+        ) from None
+    except KeyError:
+        raise RuntimeError(
+            f"SCRAPER_PROFILE={TUNING_PROFILE} is not a profile in {TUNING_PROFILE_FILE}"
+        ) from None
+    except ValueError as e:
+        raise RuntimeError(f"Cannot read tuning profiles from {TUNING_PROFILE_FILE}: {e}") from None
+
+# BHUNAKSHA_URL points every request path at another server (e.g. the benchmark mock)
+BASE_URL = os.environ.get("BHUNAKSHA_URL", "https://app1bhunakshaodisha.nic.in/bhunaksha")
+API_URL = f"{BASE_URL}/ScalarDatahandler"
+WMS_URL = f"{BASE_URL}/WMS"
 BASE_PARAMS = {"OP": "5", "state": "21"}
 SHEET_PARAMS = {"OP": "2", "level": "5", "state": "21"}
 
+DEFAULT_LOCATION = "1,1,2"  # district,tehsil,RI prefix of the villages being scraped
+
 # Scraping Configuration
 MAX_CONSECUTIVE_EMPTY = 1000
-TIMEOUT_SECONDS = 10
-BATCH_SIZE = 200
-MAX_WORKERS = 200
+TIMEOUT_SECONDS = _tuned.get("TIMEOUT_SECONDS", 10)  # tuned
+BATCH_SIZE = 200  # Plots per checkpoint and per scheduler turn
+MAX_WORKERS = _tuned.get("MAX_WORKERS", 200)  # tuned
+PIPELINE_WINDOW = 400  # Plot probes kept in flight by the thread engine
+
+# Fetch Engine Configuration
+FETCH_MODE = "thread"  # "thread" (requests + thread pool) or "async" (aiohttp on one event loop)
+ASYNC_MAX_CONNECTIONS = 64  # Keep-alive connections shared by all in-flight probes
+ASYNC_MAX_IN_FLIGHT = 2000  # Plot probes kept in flight in async mode, across batch boundaries
+
+# Rate Limiting Configuration (shared by every request path)
+RATE_LIMIT = 100  # Ceiling on requests/sec from one process
+RATE_BURST = 20
+CONCURRENCY_INITIAL = 32  # Requests in flight, adjusted AIMD-style between the bounds below
+CONCURRENCY_MIN = 2
+CONCURRENCY_MAX = 1000
+LATENCY_TARGET_SECONDS = 2.0  # Successful responses faster than this let the limits ramp up
+BACKOFF_FACTOR = 0.5  # Multiplier applied to rate and concurrency on timeouts / non-200s
+BACKOFF_COOLDOWN_SECONDS = 1.0
+
+# Retry Configuration
+RETRY_MAX_ATTEMPTS = 4  # Tries per plot before it goes to the dead-letter file
+RETRY_BASE_DELAY = 0.5  # Seconds; doubled per attempt with full jitter
+RETRY_MAX_DELAY = 30
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+MAX_CONSECUTIVE_FAILED = 100  # Dead-lettered plots in a row that abort a sheet (left unfinished for a rerun)
+
+# Plot Range Discovery
+DISCOVERY_MODE = "adaptive"  # "adaptive" (dense fill + sampled gap scan) or "linear" (fixed sweep)
+DISCOVERY_CLUSTER = 2  # Consecutive plots probed at each sample point
+DISCOVERY_GAP_SCAN = MAX_CONSECUTIVE_EMPTY  # Plots past the last plot found that are scanned before a sheet ends
+DISCOVERY_DENSE_GAP = 100  # Of those, the first this many are probed one by one
+DISCOVERY_SAMPLE_STRIDE = 20  # The rest are sampled, one cluster every this many plots
+
+# Auto-Tuning (autotune.py)
+AUTOTUNE_SAMPLE_PLOTS = 600  # Plots of the sample sheet probed per trial
+AUTOTUNE_SAMPLE_IMAGES = 60  # Images downloaded per image trial
+AUTOTUNE_REPEATS = 3  # Trials per candidate; candidates are compared on their median throughput
+AUTOTUNE_MAX_ERROR_RATE = 0.01  # Candidates failing more requests than this are rejected
+AUTOTUNE_TOLERANCE = 0.05  # A lighter setting within this fraction of the best throughput wins
+AUTOTUNE_WORKERS = [25, 50, 100, 200, 400]
+AUTOTUNE_TIMEOUT_FACTORS = [2, 4, 8]  # Timeout candidates as multiples of the measured p99 latency
+AUTOTUNE_MIN_TIMEOUT_SECONDS = 5  # Floor under the plot timeout candidates; a fast sample says little about slow hours
+AUTOTUNE_MIN_IMAGE_TIMEOUT_SECONDS = 15
+AUTOTUNE_IMAGE_WORKERS = [5, 10, 20, 40]
+AUTOTUNE_TRIAL_RATE_LIMIT = 100000  # Limiter lifted during trials (concurrency starts at CONCURRENCY_MAX) so only the searched settings bind
+
+# Yield-Prioritised Scheduling (scheduler.py)
+SCHEDULER_SLOTS = 4  # Probe chunks in flight across all scheduled sheets
+SCHEDULER_ACTIVE_SHEETS = 16  # Sheets crawled at once, waiting on the slots
+SCHEDULER_DEFAULT_YIELD = 0.5  # Expected plots per request of a sheet with no history
+SCHEDULER_OCCUPANCY = 0.8  # Share of a known plot range expected to be occupied
+SCHEDULER_PRIOR_WEIGHT = 50  # Probes of evidence the prior estimate counts as
+SCHEDULER_AGING = 0.01  # Priority gained per second spent waiting for a slot
+
+# Incremental Refresh
+REFRESH_SAMPLE_RATE = 0.05  # Fraction of a known sheet's plot range re-probed on refresh
+REFRESH_MIN_SAMPLE = 20
+REFRESH_FRONTIER = 50  # Plots probed just past a sheet's last known plot
+
+# Response Cache Configuration
+CACHE_ENABLED = True
+CACHE_DB = "response_cache.db"
+CACHE_MAX_ENTRIES = 2000000
+CACHE_FLUSH_EVERY = 500  # Buffered writes and hit timestamps committed together
+CACHE_FLUSH_SECONDS = 5  # Longest a buffered write waits for its commit
+CACHE_TTL = {  # Seconds each kind of response stays valid
+    "hierarchy": 30 * 24 * 3600,
+    "sheets": 7 * 24 * 3600,
+    "plot_pos": 30 * 24 * 3600,
+    "plot_neg": 24 * 3600
+}
+
+# Orchestrator Configuration
+QUEUE_DB = "work_queue.db"
+ORCHESTRATOR_WORKERS = 4
+GLOBAL_RATE_LIMIT = 100  # Requests per second shared by every active worker
+CLAIM_TIMEOUT_SECONDS = 3600  # Claimed units older than this are handed to another worker
+WORKER_HEARTBEAT_SECONDS = 30
+
+# Hierarchy Index Configuration
+HIERARCHY_DB = "hierarchy.db"  # district -> tehsil -> RI -> village -> sheet tree; build with hierarchy.py
+HIERARCHY_WORKERS = 10  # Concurrent page fetches while expanding one level
+HIERARCHY_MAX_AGE = 7 * 24 * 3600  # Seconds before an expanded node's children are refetched
+
+# Plot Image Configuration
+IMAGE_DIR = "images"  # village_N/ holds per-plot links into the content-addressed blobs/
+IMAGE_CHUNK_SIZE = 64 * 1024  # Bytes read per chunk when streaming an image to disk
+IMAGE_MODE = "plot"  # "sheet" (full sheet per plot), "plot" (padded plot bbox) or "tiled" (crop cached sheet tiles)
+# "tiled" crops are cut from tiles shared by every plot of a sheet, so they lack the portal's gis_code highlight
+IMAGE_PLOT_PADDING = 0.1  # Fraction of a plot's width/height added on every side in "plot" / "tiled" modes
+IMAGE_TILE_SIZE = 1024  # Tile width and height in pixels for "tiled" mode
+IMAGE_WORKERS = _tuned.get("IMAGE_WORKERS", 20)  # tuned; concurrent image downloads
+IMAGE_TIMEOUT_SECONDS = _tuned.get("IMAGE_TIMEOUT_SECONDS", 30)  # tuned
+PIPELINE_QUEUE_SIZE = 5000  # Found plots buffered between the crawl and the image downloads
+
+# Metrics Configuration
+METRICS_ENABLED = True
+METRICS_SNAPSHOT_FILE = "metrics.json"  # Rewritten every METRICS_SNAPSHOT_SECONDS during a run
+METRICS_SNAPSHOT_SECONDS = 10
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None  # e.g. 9108 to serve Prometheus text at http://127.0.0.1:9108/metrics
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]  # Histogram bounds, seconds
+PROFILE_SAMPLE_RATE = 0  # Fraction of fetch_plot_data / download_single_plot calls run under cProfile
+PROFILE_OUTPUT = "profile.pstats"
 
 # File and Directory Configuration
 OUTPUT_DIR = "village_data"
-DP_STATE_FILE = "scraper_state.json"  # Added this line
-LOG_FILE = "scraper.log"
\ No newline at end of file
+CHECKPOINT_DB = "scraper_state.db"
+SPATIAL_INDEX_DB = "spatial_index.db"
+EXPORT_DIR = "export"  # Parquet partitions by district/tehsil/village plus the state-wide plots.arrow
+EXPORT_COMPRESSION = "zstd"  # Parquet codec for the partitions
+DP_STATE_FILE = "scraper_state.json"  # Legacy state, imported into CHECKPOINT_DB on first run
+LOG_FILE = "scraper.log"
+LOG_LEVEL = "INFO"
+PLOT_LOGGER = "scraper.plots"  # Per-plot detail; a summary line per sheet is logged at INFO
+PLOT_LOG_LEVEL = "INFO"  # "DEBUG" to log individual plots
+PLOT_LOG_SAMPLE_EVERY = 100  # Keep one per-plot line in every N
@@ -0,0 +1,128 @@
+# discovery.py
+
+import logging
+from config import (MAX_CONSECUTIVE_EMPTY, BATCH_SIZE, DISCOVERY_CLUSTER, DISCOVERY_GAP_SCAN, DISCOVERY_DENSE_GAP,
+                    DISCOVERY_SAMPLE_STRIDE)
+from plot_store import PlotBitmap
+
+def linear_sweep_cost(max_plot_found):
+    """Plots the fixed linear sweep probes on a sheet ending at max_plot_found, not counting its in-flight overshoot"""
+    return max_plot_found + MAX_CONSECUTIVE_EMPTY
+
+def gap_scan_cost(gap_scan=DISCOVERY_GAP_SCAN, dense_gap=DISCOVERY_DENSE_GAP, stride=DISCOVERY_SAMPLE_STRIDE,
+                  cluster=DISCOVERY_CLUSTER):
+    """Probes spent past the last plot found before a sheet ends"""
+    dense_gap = min(dense_gap, gap_scan)
+    return dense_gap + max(0, gap_scan - dense_gap - cluster + 1) // stride * cluster
+
+class PlotRangeDiscovery:
+    """
+    Find the occupied plot range of a sheet with as few probes as possible.
+
+    Plots 1..last found + dense_gap are probed one by one; the rest of the
+    gap_scan plots past the last plot found are only sampled, a cluster
+    every `stride` plots, so ending a sheet costs gap_scan_cost() probes
+    instead of gap_scan. A sample or dense probe that finds a plot moves the
+    end of the sheet out and the fill continues from there. The sample from
+    an earlier run's last plot (prior) lets the first fill go out at once.
+
+    Unlike the linear sweep, a run of fewer than `stride` plots lying
+    entirely in the sampled part of the gap can be missed; the linear
+    sweep's rule is kept when dense_gap >= gap_scan.
+
+    Args:
+        probe (callable): Takes a list of plot numbers and yields fetch results
+            ({"success", "has_data", "plot_no"}) for each of them, in any
+            order; it keeps its own window of probes in flight
+        prior (int): max_plot_found from an earlier run of the same sheet
+        probed (set): Plots already probed by an interrupted run, skipped here
+        max_plot_found (int): Highest plot found by that interrupted run
+        on_probed (callable): Called with (plot_nos, max_plot_found) after every
+            BATCH_SIZE finished plots, e.g. to checkpoint progress
+    """
+
+    def __init__(self, probe, prior=0, probed=None, max_plot_found=0, on_probed=None, cluster=DISCOVERY_CLUSTER,
+                 gap_scan=DISCOVERY_GAP_SCAN, dense_gap=DISCOVERY_DENSE_GAP, stride=DISCOVERY_SAMPLE_STRIDE):
+        self.probe = probe
+        self.prior = prior or 0
+        self.on_probed = on_probed
+        self.cluster = cluster
+        self.gap_scan = gap_scan
+        self.dense_gap = min(dense_gap, gap_scan)
+        self.stride = max(stride, cluster)
+        self.probed = PlotBitmap()
+        for plot_no in probed or ():
+            self.probed.add(plot_no)
+        self.max_plot_found = max_plot_found
+        self.requests = 0
+
+    def _probe(self, plot_nos):
+        """
+        Probe plots not seen yet in a single call, so the probe function's
+        window stays full across checkpoint boundaries; True if any of them
+        has data.
+        """
+        pending = sorted({plot_no for plot_no in plot_nos if plot_no >= 1 and plot_no not in self.probed})
+        for plot_no in pending:
+            self.probed.add(plot_no)
+        self.requests += len(pending)
+        found = False
+        finished = []
+
+        for result in self.probe(pending) if pending else ():
+            finished.append(result["plot_no"])
+            if result["success"] and result["has_data"] == "Y":
+                found = True
+                self.max_plot_found = max(self.max_plot_found, result["plot_no"])
+            if len(finished) >= BATCH_SIZE:
+                self._report(finished)
+                finished = []
+        if finished:
+            self._report(finished)
+
+        return found
+
+    def _report(self, plot_nos):
+        if self.on_probed is not None:
+            self.on_probed(plot_nos, self.max_plot_found)
+
+    def _cluster(self, start):
+        return range(start, start + self.cluster)
+
+    def _gap_plots(self):
+        """Dense fill up to dense_gap past the last plot found, then sample clusters to gap_scan past it"""
+        end = self.max_plot_found + self.dense_gap
+        plot_nos = list(range(1, end + 1))
+        for start in range(end + self.stride, self.max_plot_found + self.gap_scan - self.cluster + 2, self.stride):
+            plot_nos.extend(self._cluster(start))
+        return plot_nos
+
+    def run(self):
+        """
+        Discover and fill the occupied range of the sheet.
+
+        Returns:
+            dict: max_plot_found, requests made, the linear sweep's cost and
+            the number of requests saved against it
+        """
+        if self.prior:
+            self._probe(self._cluster(self.prior))
+        # A plot found in the gap moves the end of the sheet further out
+        while True:
+            last = self.max_plot_found
+            self._probe(self._gap_plots())
+            if self.max_plot_found == last:
+                break
+
+        linear_estimate = linear_sweep_cost(self.max_plot_found)
+        stats = {
+            "max_plot_found": self.max_plot_found,
+            "requests": self.requests,
+            "linear_estimate": linear_estimate,
+            "saved": linear_estimate - self.requests
+        }
+        logging.info(
+            f"Discovery finished at plot {self.max_plot_found} with {self.requests} requests "
+            f"(linear sweep: {linear_estimate}, saved {stats['saved']})"
+        )
+        return stats
@@ -0,0 +1,239 @@
+# export.py
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from config import OUTPUT_DIR, EXPORT_DIR, EXPORT_COMPRESSION, HIERARCHY_DB
+from hierarchy import HierarchyIndex
+from plot_store import COORD_FIELDS
+from utils import load_village_file, village_key, village_keys, split_village_key
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+MANIFEST_FILE = "_manifest.json"
+MANIFEST_VERSION = 2  # 2: partitions under ri=R, villages keyed by their full "d,t,r,v" path
+STATE_FILE = "plots.arrow"
+
+# Columns of a village partition; district, tehsil, RI and village are in its path
+PARTITION_SCHEMA = pa.schema(
+    [("sheet", pa.int16()), ("plot_no", pa.int32()), ("gisCode", pa.dictionary(pa.int32(), pa.string()))]
+    + [(field, pa.float64()) for field in COORD_FIELDS]
+)
+LOCATION_SCHEMA = pa.schema(
+    [("district", pa.int16()), ("tehsil", pa.int16()), ("ri", pa.int16()), ("village", pa.int32())]
+)
+
+def _village_file(village_no, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, f"village_{village_no}.json")
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+def _sheet_of(gis_code):
+    suffix = str(gis_code)[-2:]
+    return int(suffix) if suffix.isdigit() else None
+
+def _path_order(path):
+    return [int(part) for part in path.split(",")]
+
+def village_table(plots):
+    """Typed columns for one village's plots, sorted by plot_no"""
+    plots = sorted(plots, key=lambda plot: int(plot["plot_no"]))
+    columns = {
+        "sheet": [_sheet_of(plot["gisCode"]) for plot in plots],
+        "plot_no": [int(plot["plot_no"]) for plot in plots],
+        "gisCode": [plot["gisCode"] for plot in plots],
+    }
+    for field in COORD_FIELDS:
+        columns[field] = [plot[field] for plot in plots]
+    return pa.table(columns, schema=PARTITION_SCHEMA)
+
+class ColumnarExport:
+    """
+    Village outputs compacted into Parquet partitions under
+    EXPORT_DIR/district=D/tehsil=T/ri=R/village=V/plots.parquet.
+
+    A manifest records the source file signature each partition was built
+    from, so a merge only rewrites the villages whose JSON changed.
+    compact() concatenates the partitions into one uncompressed Arrow IPC
+    file that state-wide readers memory-map instead of parsing JSON.
+    """
+
+    def __init__(self, root=EXPORT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.manifest = {"version": MANIFEST_VERSION, "generation": 0, "compacted": None, "villages": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.manifest = manifest
+            else:
+                # Older layouts merged same-numbered villages of different RIs; rebuild from scratch
+                logging.warning(f"Export in {root} uses an older layout; every village is rewritten on the next merge")
+                for entry in manifest["villages"].values():
+                    self._drop_partition(entry)
+                self.manifest["generation"] = manifest["generation"] + 1
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def partition_dir(self, location, village_no):
+        district, tehsil, ri = location.split(",")
+        return os.path.join(
+            self.root, f"district={district}", f"tehsil={tehsil}", f"ri={ri}", f"village={village_no}"
+        )
+
+    def _drop_partition(self, entry):
+        shutil.rmtree(os.path.dirname(os.path.join(self.root, entry["path"])), ignore_errors=True)
+
+    def export_village(self, village_no, location, source):
+        """Write one village partition from its JSON file atomically and return its manifest entry"""
+        table = village_table(load_village_file(source).values())
+        directory = self.partition_dir(location, village_no)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "plots.parquet")
+        pq.write_table(table, f"{path}.tmp", compression=EXPORT_COMPRESSION)
+        os.replace(f"{path}.tmp", path)
+        return {
+            "location": location,
+            "village": village_no,
+            "source": _source_signature(source),
+            "rows": table.num_rows,
+            "path": os.path.relpath(path, self.root)
+        }
+
+    def merge(self, output_dir=OUTPUT_DIR, force=False):
+        """
+        Bring the partitions up to date with the village JSON files in
+        output_dir: (re)write new or changed villages and drop villages
+        whose file is gone. Untouched partitions are left as they are.
+
+        Returns:
+            dict: "written" village path -> rows, and the "removed" village paths
+        """
+        # The file's village key carries its location (see utils.village_key); nothing is guessed
+        index = HierarchyIndex() if os.path.exists(HIERARCHY_DB) else None
+        villages = {}
+        try:
+            for key in village_keys(output_dir):
+                location, village_no = split_village_key(key)
+                path = f"{location},{village_no}"
+                if index is not None and index.children(location) and index.name(path) is None:
+                    logging.error(f"Village {path} is not in the hierarchy index; not exporting {key}")
+                    continue
+                if key != village_key(location, village_no):
+                    # e.g. village_1_1_2_3.json beside village_3.json under the default location
+                    logging.error(f"Village file key {key} should be {village_key(location, village_no)}; not exporting it")
+                    continue
+                villages[path] = (location, village_no, _village_file(key, output_dir))
+        finally:
+            if index is not None:
+                index.close()
+
+        known = self.manifest["villages"]
+        written = {}
+        for path, (location, village_no, source) in villages.items():
+            entry = known.get(path)
+            if not force and entry is not None and entry["source"] == _source_signature(source):
+                continue
+            try:
+                known[path] = self.export_village(village_no, location, source)
+            except Exception as e:
+                logging.error(f"Error exporting village {path}: {e}")
+                continue
+            written[path] = known[path]["rows"]
+
+        removed = [path for path in known if path not in villages]
+        for path in removed:
+            self._drop_partition(known.pop(path))
+
+        if written or removed:
+            self.manifest["generation"] += 1
+        self._save_manifest()
+        logging.info(f"Export merge: {len(written)} partitions written, {len(removed)} removed")
+        return {"written": written, "removed": removed}
+
+    def read_partition(self, path):
+        """One village's plots, with its location columns"""
+        entry = self.manifest["villages"][path]
+        table = pq.read_table(os.path.join(self.root, entry["path"]), memory_map=True)
+        values = _path_order(path)
+        for position, (field, value) in enumerate(zip(LOCATION_SCHEMA, values)):
+            table = table.add_column(position, field, pa.array([value] * table.num_rows, field.type))
+        return table
+
+    def compact(self, force=False):
+        """
+        Rewrite the state-wide Arrow file from the partitions, unless it
+        already reflects the current manifest generation.
+
+        Returns:
+            str: Path of the state-wide file
+        """
+        path = os.path.join(self.root, STATE_FILE)
+        if not force and self.manifest["compacted"] == self.manifest["generation"] and os.path.exists(path):
+            return path
+
+        schema = pa.unify_schemas([LOCATION_SCHEMA, PARTITION_SCHEMA])
+        villages = sorted(self.manifest["villages"], key=_path_order)
+        tables = [self.read_partition(path) for path in villages]
+        table = pa.concat_tables(tables) if tables else schema.empty_table()
+        # The IPC file format holds a single dictionary per column
+        table = table.unify_dictionaries().combine_chunks()
+
+        with ipc.new_file(f"{path}.tmp", table.schema) as writer:
+            writer.write_table(table)
+        os.replace(f"{path}.tmp", path)
+        self.manifest["compacted"] = self.manifest["generation"]
+        self._save_manifest()
+        logging.info(f"Compacted {len(villages)} villages ({table.num_rows} plots) into {path}")
+        return path
+
+def open_state_table(root=EXPORT_DIR):
+    """Memory-map the state-wide Arrow file; columns are read from the page cache on access"""
+    return ipc.open_file(pa.memory_map(os.path.join(root, STATE_FILE), "r")).read_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export scraped villages to partitioned columnar files")
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge = commands.add_parser("merge", help="Rewrite the partitions of new or changed villages")
+    merge.add_argument("--output-dir", default=OUTPUT_DIR)
+    merge.add_argument("--force", action="store_true", help="Rewrite every partition")
+    merge.add_argument("--compact", action="store_true", help="Also rebuild the state-wide Arrow file")
+
+    compact = commands.add_parser("compact", help="Rebuild the state-wide Arrow file from the partitions")
+    compact.add_argument("--force", action="store_true")
+
+    commands.add_parser("stats", help="Exported villages and plots")
+    args = parser.parse_args()
+
+    from utils import setup_logging
+    setup_logging()
+    export = ColumnarExport(args.export_dir)
+    if args.command == "merge":
+        result = export.merge(args.output_dir, force=args.force)
+        print(f"Wrote {len(result['written'])} partitions ({sum(result['written'].values())} plots), "
+              f"removed {len(result['removed'])}")
+        if args.compact:
+            print(export.compact())
+    elif args.command == "compact":
+        print(export.compact(force=args.force))
+    else:
+        villages = export.manifest["villages"]
+        print({"villages": len(villages), "plots": sum(entry["rows"] for entry in villages.values()),
+               "generation": export.manifest["generation"], "compacted": export.manifest["compacted"]})
+
+if __name__ == "__main__":
+    main()
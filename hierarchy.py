@@ -0,0 +1,259 @@
+# hierarchy.py
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (BASE_URL, API_URL, SHEET_PARAMS, DEFAULT_LOCATION, HIERARCHY_DB, HIERARCHY_WORKERS,
+                    HIERARCHY_MAX_AGE)
+
+LEVELS = {1: "district", 2: "tehsil", 3: "ri", 4: "village", 5: "sheet"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT PRIMARY KEY,
+    level INTEGER NOT NULL,
+    parent TEXT NOT NULL,
+    value TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent);
+CREATE INDEX IF NOT EXISTS nodes_value ON nodes (level, value);
+CREATE TABLE IF NOT EXISTS expansions (
+    path TEXT PRIMARY KEY,
+    fetched REAL NOT NULL,
+    children INTEGER NOT NULL
+);
+"""
+
+def _level_of(path):
+    return len(path.split(",")) if path else 0
+
+def _request_for(path):
+    """(url, params, level) of the page listing the children of path"""
+    level = _level_of(path) + 1
+    if level == 1:
+        return BASE_URL + "/", None, 1
+    if level == 5:
+        params = SHEET_PARAMS.copy()
+        params["selections"] = f"{path},"
+        return API_URL, params, 5
+    return API_URL, {"OP": "2", "level": str(level), "selections": path, "state": "21"}, level
+
+class HierarchyIndex:
+    """
+    Persisted district -> tehsil -> RI -> village -> sheet tree.
+
+    Nodes are keyed by their comma-joined path ("1,1,2,14" is village 14 of
+    RI 2, tehsil 1, district 1), which is also the prefix the portal's
+    levels/selections parameters expect. Each expanded node records when
+    its children were fetched, so a re-run only refreshes stale branches.
+    """
+
+    def __init__(self, path=HIERARCHY_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _fetch_children(self, path):
+        # Imported here: main imports runner, which imports this module
+        from main import fetch_options
+        url, params, level = _request_for(path)
+        options = fetch_options(url, params, level)
+        return {value: name.strip() for value, name in options.items() if value.isdigit()}
+
+    def _store_children(self, path, children):
+        level = _level_of(path) + 1
+        prefix = f"{path}," if path else ""
+        with self._lock, self._conn:
+            old = {row[0] for row in self._conn.execute("SELECT path FROM nodes WHERE parent = ?", (path,))}
+            new = {prefix + value for value in children}
+            # Branches the portal dropped go with all of their descendants
+            for gone in old - new:
+                self._conn.execute("DELETE FROM nodes WHERE path = ? OR path LIKE ?", (gone, gone + ",%"))
+                self._conn.execute("DELETE FROM expansions WHERE path = ? OR path LIKE ?", (gone, gone + ",%"))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO nodes (path, level, parent, value, name) VALUES (?, ?, ?, ?, ?)",
+                [(prefix + value, level, path, value, name) for value, name in children.items()]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO expansions (path, fetched, children) VALUES (?, ?, ?)",
+                (path, time.time(), len(children))
+            )
+
+    def _is_fresh(self, path, max_age):
+        with self._lock:
+            row = self._conn.execute("SELECT fetched FROM expansions WHERE path = ?", (path,)).fetchone()
+        return row is not None and (max_age is None or time.time() - row[0] <= max_age)
+
+    def expand(self, root="", max_level=5, workers=HIERARCHY_WORKERS, max_age=HIERARCHY_MAX_AGE):
+        """
+        Breadth-first expansion below root ("" for the whole state), one
+        level at a time with the level's fetches run concurrently.
+        Branches expanded within max_age seconds are read from the index
+        instead of the portal (max_age=0 refetches everything).
+
+        Returns:
+            dict: Number of pages fetched and nodes known per level
+        """
+        frontier = [root]
+        fetched = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while frontier and _level_of(frontier[0]) < max_level:
+                stale = [path for path in frontier if not self._is_fresh(path, max_age)]
+                for path, children in zip(stale, executor.map(self._safe_fetch, stale)):
+                    if children is not None:
+                        self._store_children(path, children)
+                        fetched += 1
+
+                frontier = [child for path in frontier for child in self.children(path)]
+                if frontier:
+                    logging.info(f"Hierarchy: {len(frontier)} {LEVELS[_level_of(frontier[0])]} nodes below {root or 'state'}")
+
+        return {"fetched": fetched, **self.stats()}
+
+    def _safe_fetch(self, path):
+        """Children of a node, or None when the fetch failed; a failed fetch never prunes the index"""
+        try:
+            children = self._fetch_children(path)
+        except Exception as e:
+            logging.error(f"Error expanding hierarchy node {path or 'state'}: {e}")
+            return None
+        if not children:
+            # Throttled or error pages parse to no options; keep what is indexed and retry next run
+            logging.error(f"No options returned for hierarchy node {path or 'state'}; keeping its indexed children")
+            return None
+        return children
+
+    def children(self, path=""):
+        """Paths of the known children of a node, in numeric order"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, value FROM nodes WHERE parent = ?", (path,)).fetchall()
+        return [row[0] for row in sorted(rows, key=lambda row: int(row[1]))]
+
+    def name(self, path):
+        with self._lock:
+            row = self._conn.execute("SELECT name FROM nodes WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def villages(self, root=""):
+        """Paths of every known village below root"""
+        like = f"{root},%" if root else "%"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM nodes WHERE level = 4 AND (path = ? OR path LIKE ?)", (root, like)
+            ).fetchall()
+        return sorted((row[0] for row in rows), key=lambda path: [int(part) for part in path.split(",")])
+
+    def sheets(self, village_path):
+        """Sheet numbers of a village, or None if its sheets were never fetched"""
+        if not self._is_fresh(village_path, None):
+            return None
+        return [path.rsplit(",", 1)[1] for path in self.children(village_path)]
+
+    def resolve_prefix(self, village):
+        """
+        Find the district,tehsil,RI prefix of a village.
+
+        Args:
+            village (str): A bare village number, or a full "d,t,r,v" path
+
+        Returns:
+            tuple: (prefix, village number)
+
+        Raises:
+            LookupError: If the village is unknown or its number occurs in
+                more than one RI (pass the full path then)
+        """
+        village = str(village)
+        if "," in village:
+            prefix, village_no = village.rsplit(",", 1)
+            return prefix, village_no
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT parent FROM nodes WHERE level = 4 AND value = ?", (village,)
+            ).fetchall()
+        if not rows:
+            raise LookupError(f"Village {village} is not in the hierarchy index")
+        if len(rows) > 1:
+            candidates = ", ".join(sorted(f"{row[0]},{village}" for row in rows))
+            raise LookupError(f"Village {village} is ambiguous; use one of: {candidates}")
+        return rows[0][0], village
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT level, COUNT(*) FROM nodes GROUP BY level").fetchall()
+        return {LEVELS[level]: count for level, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def resolve_location(village, path=HIERARCHY_DB):
+    """
+    (location, village number) for a bare village number or a "d,t,r,v"
+    path, looked up in the hierarchy index when one has been built.
+    Falls back to DEFAULT_LOCATION when the index is missing or cannot
+    place the village.
+    """
+    village = str(village)
+    if "," in village:
+        return tuple(village.rsplit(",", 1))
+    if not os.path.exists(path):
+        return DEFAULT_LOCATION, village
+
+    index = HierarchyIndex(path)
+    try:
+        return index.resolve_prefix(village)
+    except LookupError as e:
+        logging.warning(f"{e}; using default location {DEFAULT_LOCATION}")
+        return DEFAULT_LOCATION, village
+    finally:
+        index.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the administrative hierarchy index")
+    parser.add_argument("--db", default=HIERARCHY_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Expand the hierarchy below a node")
+    build.add_argument("--root", default="", help='Path to expand below, e.g. "1" or "1,1,2" (default: state)')
+    build.add_argument("--max-level", type=int, default=5, choices=range(1, 6),
+                       help="Deepest level to fetch: 1 district .. 5 sheet")
+    build.add_argument("--max-age-days", type=float, help="Refetch branches older than this")
+    build.add_argument("--workers", type=int, default=HIERARCHY_WORKERS)
+
+    show = commands.add_parser("show", help="List the children of a node")
+    show.add_argument("path", nargs="?", default="")
+
+    resolve = commands.add_parser("resolve", help="Print the prefix of a village")
+    resolve.add_argument("village")
+    args = parser.parse_args()
+
+    from utils import setup_logging
+    setup_logging()
+    index = HierarchyIndex(args.db)
+    try:
+        if args.command == "build":
+            max_age = args.max_age_days * 86400 if args.max_age_days is not None else HIERARCHY_MAX_AGE
+            print(index.expand(args.root, args.max_level, args.workers, max_age))
+        elif args.command == "show":
+            for path in index.children(args.path):
+                print(f"{path}\t{index.name(path)}")
+        else:
+            try:
+                print(",".join(index.resolve_prefix(args.village)))
+            except LookupError as e:
+                print(e)
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    main()
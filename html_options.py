@@ -0,0 +1,84 @@
+# html_options.py
+
+from html.parser import HTMLParser
+
+class _StopParsing(Exception):
+    pass
+
+class OptionScanner(HTMLParser):
+    """
+    Collects the <option>s of one <select id=...> and stops feeding as soon
+    as that select closes, without building a document tree.
+    """
+
+    def __init__(self, select_id):
+        super().__init__(convert_charrefs=True)
+        self.select_id = select_id
+        self.found = False
+        self.options = {}
+        self._in_select = False
+        self._value = None
+        self._text = []
+
+    def _finish_option(self):
+        if self._value is not None:
+            text = "".join(self._text)
+            # Like an HTML form, an option without a value attribute submits its text
+            self.options[text.strip() if self._value is True else self._value] = text
+        self._value = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if not self._in_select:
+            if tag == "select" and dict(attrs).get("id") == self.select_id:
+                self._in_select = self.found = True
+            return
+        if tag == "option":
+            self._finish_option()
+            value = dict(attrs).get("value")
+            self._value = True if value is None else value
+
+    def handle_endtag(self, tag):
+        if not self._in_select:
+            return
+        if tag == "option":
+            self._finish_option()
+        elif tag == "select":
+            self._finish_option()
+            raise _StopParsing()
+
+    def handle_data(self, data):
+        if self._value is not None:
+            self._text.append(data)
+
+def _extract_with_soup(html, select_id):
+    from bs4 import BeautifulSoup
+    select_tag = BeautifulSoup(html, "html.parser").find("select", {"id": select_id})
+    if select_tag is None:
+        return None
+    return {option.get("value", option.text.strip()): option.text for option in select_tag.find_all("option")}
+
+def extract_options(html, select_id):
+    """
+    Map each option value of <select id=select_id> in html to its text.
+
+    Scans with html.parser up to the end of that select only; markup the
+    scanner cannot make sense of is handed to BeautifulSoup (imported only
+    then). Returns None when the page has no such select.
+    """
+    scanner = OptionScanner(select_id)
+    try:
+        scanner.feed(html)
+        scanner.close()
+    except _StopParsing:
+        return scanner.options
+    except Exception:
+        return _extract_with_soup(html, select_id)
+
+    if scanner.found:
+        # Unclosed select: keep what was collected up to the end of the page
+        scanner._finish_option()
+        return scanner.options
+    if f'"{select_id}"' in html or f"'{select_id}'" in html or f"={select_id}" in html:
+        return _extract_with_soup(html, select_id)
+    return None
@@ -0,0 +1,147 @@
+# image_store.py
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from config import IMAGE_DIR, IMAGE_CHUNK_SIZE
+
+PNG_TRAILER = b"IEND\xaeB`\x82"
+
+def is_complete_png(path):
+    """Cheap truncation check: a whole PNG ends with its IEND chunk"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(-len(PNG_TRAILER), os.SEEK_END)
+            return f.read() == PNG_TRAILER
+    except OSError:
+        return False
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(IMAGE_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class ImageStore:
+    """
+    Content-addressed image blobs under IMAGE_DIR/blobs/<aa>/<sha256>.png.
+
+    Images are streamed to a temp file while hashed, then renamed into
+    place, so a crash never leaves a partial blob. Per-plot files are
+    hardlinks to their blob: identical renders are stored once.
+    """
+
+    def __init__(self, root=IMAGE_DIR):
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.png")
+
+    def has_blob(self, digest, size=None):
+        path = self.blob_path(digest)
+        return os.path.exists(path) and (size is None or os.path.getsize(path) == size)
+
+    def save_stream(self, chunks):
+        """
+        Write an iterable of byte chunks into the store.
+
+        Returns:
+            tuple: (sha256 hex digest, size in bytes)
+        """
+        sha = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.blob_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        sha.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            digest = sha.hexdigest()
+            blob = self.blob_path(digest)
+            # A blob of the wrong size was damaged through one of its links; replace it
+            if self.has_blob(digest, size):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp_path, blob)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, size
+
+    def save_bytes(self, data):
+        return self.save_stream([data])
+
+    def adopt(self, path):
+        """Move an existing image into the store, leaving a link in its place"""
+        with open(path, "rb") as f:
+            digest, size = self.save_stream(iter(lambda: f.read(IMAGE_CHUNK_SIZE), b""))
+        self.link(digest, path)
+        return digest, size
+
+    def link(self, digest, dest):
+        """Atomically point dest at a blob (hardlink, or a copy where links are unsupported)"""
+        blob = self.blob_path(digest)
+        if os.path.exists(dest) and os.path.samefile(blob, dest):
+            return
+        tmp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob, tmp_path)
+        except OSError:
+            shutil.copyfile(blob, tmp_path)
+        os.replace(tmp_path, dest)
+
+class ImageManifest:
+    """
+    Append-only JSON Lines record of the images in one directory: gisCode,
+    sha256, size and the request that rendered it. Later lines win, and the
+    file is appended with single O_APPEND writes like the plot stream.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "manifest.jsonl")
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["gis_code"]] = entry
+
+    def get(self, gis_code):
+        with self._lock:
+            return self.entries.get(gis_code)
+
+    def add(self, gis_code, digest, size, **request):
+        entry = {"gis_code": gis_code, "sha256": digest, "size": size, "time": time.time(), **request}
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self.entries[gis_code] = entry
+        return entry
+
+    def is_intact(self, gis_code, path, verify=False):
+        """
+        True when path holds the image recorded for gis_code. Checks the
+        size by default; verify=True re-hashes the file.
+        """
+        entry = self.get(gis_code)
+        if entry is None or not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            return False
+        return not verify or file_digest(path) == entry["sha256"]
@@ -0,0 +1,105 @@
+# image_tiles.py
+
+import hashlib
+import math
+import os
+import threading
+from config import IMAGE_TILE_SIZE, IMAGE_PLOT_PADDING
+
+def sheet_resolution(sheet_bbox, width, height):
+    """Map units per pixel of the full-sheet render (width x height over sheet_bbox)"""
+    xmin, ymin, xmax, ymax = sheet_bbox
+    return (xmax - xmin) / width, (ymax - ymin) / height
+
+def padded_bbox(bbox, padding=IMAGE_PLOT_PADDING):
+    """Grow (xmin, ymin, xmax, ymax) by `padding` of its width/height on every side"""
+    xmin, ymin, xmax, ymax = bbox
+    dx = (xmax - xmin) * padding
+    dy = (ymax - ymin) * padding
+    return xmin - dx, ymin - dy, xmax + dx, ymax + dy
+
+def bbox_size(bbox, resolution):
+    """Pixel size of a bbox rendered at the given (x, y) resolution"""
+    xmin, ymin, xmax, ymax = bbox
+    return max(1, math.ceil((xmax - xmin) / resolution[0])), max(1, math.ceil((ymax - ymin) / resolution[1]))
+
+class SheetTiles:
+    """
+    A sheet's WMS map cut into a grid of fixed-size tiles, each fetched once
+    and cached on disk, from which per-plot images are cropped locally.
+
+    The grid is anchored at the sheet's top-left corner at the resolution of
+    the full-sheet render, so a crop matches the same region of the sheet
+    image pixel for pixel. Tiles are shared by every plot on the sheet and
+    so are fetched without a gis_code: crops do not carry the portal's
+    highlight of the plot.
+    """
+
+    def __init__(self, sheet_bbox, resolution, fetch, cache_dir, tile_size=IMAGE_TILE_SIZE):
+        """
+        Args:
+            sheet_bbox (tuple): (xmin, ymin, xmax, ymax) of the sheet
+            resolution (tuple): Map units per pixel along x and y
+            fetch (callable): fetch(bbox_str, width, height, path) writes
+                the rendered PNG to path atomically
+            cache_dir (str): Directory holding this sheet's tiles
+            tile_size (int): Tile width and height in pixels
+        """
+        self.origin_x = sheet_bbox[0]
+        self.origin_y = sheet_bbox[3]
+        self.res_x, self.res_y = resolution
+        self.fetch = fetch
+        self.tile_size = tile_size
+        # Tiles of a different grid (moved bbox, new resolution) never share a directory
+        grid = f"{self.origin_x},{self.origin_y},{self.res_x},{self.res_y},{tile_size}"
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha1(grid.encode()).hexdigest()[:12])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.fetched = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def tile_bbox(self, i, j):
+        span_x = self.tile_size * self.res_x
+        span_y = self.tile_size * self.res_y
+        x0 = self.origin_x + i * span_x
+        y1 = self.origin_y - j * span_y
+        return f"{x0},{y1 - span_y},{x0 + span_x},{y1}"
+
+    def tile_path(self, i, j):
+        """Path of tile (i, j), fetching it first if it is not cached yet"""
+        path = os.path.join(self.cache_dir, f"{i}_{j}.png")
+        if os.path.exists(path):
+            return path
+
+        with self._locks_guard:
+            lock = self._locks.setdefault((i, j), threading.Lock())
+        with lock:
+            # Another plot on the same tile may have fetched it while we waited
+            if not os.path.exists(path):
+                self.fetch(self.tile_bbox(i, j), self.tile_size, self.tile_size, path)
+                with self._locks_guard:
+                    self.fetched += 1
+        return path
+
+    def crop(self, bbox):
+        """Return a PIL image of bbox, stitched from the tiles it overlaps"""
+        from PIL import Image
+
+        xmin, ymin, xmax, ymax = bbox
+        left = math.floor((xmin - self.origin_x) / self.res_x)
+        top = math.floor((self.origin_y - ymax) / self.res_y)
+        right = max(left + 1, math.ceil((xmax - self.origin_x) / self.res_x))
+        bottom = max(top + 1, math.ceil((self.origin_y - ymin) / self.res_y))
+
+        image = Image.new("RGBA", (right - left, bottom - top))
+        size = self.tile_size
+        for j in range(top // size, (bottom - 1) // size + 1):
+            for i in range(left // size, (right - 1) // size + 1):
+                with Image.open(self.tile_path(i, j)) as tile:
+                    region = (
+                        max(left, i * size) - i * size, max(top, j * size) - j * size,
+                        min(right, (i + 1) * size) - i * size, min(bottom, (j + 1) * size) - j * size
+                    )
+                    image.paste(tile.convert("RGBA").crop(region),
+                                (max(left, i * size) - left, max(top, j * size) - top))
+        return image
@@ -1,31 +1,27 @@
 # init.py
 
 import os
-import json
-from config import OUTPUT_DIR, DP_STATE_FILE, LOG_FILE
+from config import OUTPUT_DIR, LOG_FILE
+from checkpoint import CheckpointStore
 
-def initialize_scraper():
+def initialize_scraper(village_no=None):
     """
     Initialize fresh files and directories for the scraper.
-    Creates new state file and village data directory.
+    Resets crawl checkpoints for the given village key (or every village
+    when None), keeping completed sheet bounds as priors for the next crawl.
     """
     # Create fresh output directory
     if not os.path.exists(OUTPUT_DIR):
         # Remove old village data files
         os.makedirs(OUTPUT_DIR)
 
-    # Create fresh state file
-    initial_state = {
-        "processed_sheets": {},
-        "last_village": None,
-        "last_sheet": None
-    }
-    
-    with open(DP_STATE_FILE, 'w') as f:
-        json.dump(initial_state, f, indent=4)
+    # Reset checkpoints without touching other villages
+    checkpoints = CheckpointStore()
+    checkpoints.reset(village_no)
+    checkpoints.close()
 
     # Create fresh log file
     with open(LOG_FILE, 'w') as f:
         f.write("")
 
-    print("Initialized fresh scraper files and directories.")
\ No newline at end of file
+    print("Initialized fresh scraper files and directories.")
@@ -1,37 +1,56 @@
 import requests
 import json
 import time
-from bs4 import BeautifulSoup
+from html_options import extract_options
 from runner import extract_village_data
-api_url = "https://app1bhunakshaodisha.nic.in/bhunaksha/ScalarDatahandler"
+from cache import get_cache
+from rate_limiter import get_limiter
+from config import BASE_URL, API_URL, TIMEOUT_SECONDS
+api_url = API_URL
 base_params = {"OP": "5", "state": "21"}
 
+def fetch_options(api, params, level):
+    """
+    Fetch a hierarchy page (served from the response cache when fresh) and
+    return its level_N options. Raises requests.HTTPError on a non-200
+    answer rather than parsing an error page as an empty list.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(api, params)
+        if cached is not None:
+            return cached
+
+    with get_limiter().request("hierarchy") as ticket:
+        response = requests.get(api, params, timeout=TIMEOUT_SECONDS)
+        ticket.ok = response.status_code == 200
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Status {response.status_code} from {api}")
+    options = extract_options(response.text, f"level_{level}") or {}
+    if options and cache is not None:
+        cache.put("hierarchy", api, params, options)
+    return options
+
 def find_districts():
-    api = "https://app1bhunakshaodisha.nic.in/bhunaksha/"
-    response = requests.get(api)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    select_tag = soup.find("select", {"id": "level_1"})
-    districts = {option["value"]: option.text for option in select_tag.find_all("option")}
+    api = BASE_URL + "/"
+    districts = fetch_options(api, None, 1)
     print(districts)
     return districts
 
 def find_tehsils(selections):
-    api = "https://app1bhunakshaodisha.nic.in/bhunaksha/ScalarDatahandler"
+    api = API_URL
     params = {
         "OP":"2",
         "level":"2",
         "selections":selections,
         "state":"21"
     }
-    response = requests.get(api,params)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    select_tag = soup.find("select", {"id": "level_2"})
-    tehsils = {option["value"]: option.text for option in select_tag.find_all("option")}
+    tehsils = fetch_options(api, params, 2)
     print(tehsils)
     return tehsils
 
 def find_RI(district_no, tehsil_no):
-    api = "https://app1bhunakshaodisha.nic.in/bhunaksha/ScalarDatahandler"
+    api = API_URL
     district_no = str(district_no)
     tehsil_no = str(tehsil_no)
     params = {
@@ -40,15 +59,12 @@ def find_RI(district_no, tehsil_no):
         "selections":district_no + "," + tehsil_no,
         "state":"21"
     }
-    response = requests.get(api,params)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    select_tag = soup.find("select", {"id": "level_3"})
-    RIs = {option["value"]: option.text for option in select_tag.find_all("option")}
+    RIs = fetch_options(api, params, 3)
     print(RIs)
     return RIs
 
 def find_villages(district_no, tehsil_no, RI_no):
-    api = "https://app1bhunakshaodisha.nic.in/bhunaksha/ScalarDatahandler"
+    api = API_URL
     district_no = str(district_no)
     tehsil_no = str(tehsil_no)
     RI_no = str(RI_no)
@@ -59,10 +75,7 @@ def find_villages(district_no, tehsil_no, RI_no):
         "selections":district_no + "," + tehsil_no + "," + RI_no,
         "state":"21"
     }
-    response = requests.get(api,params)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    select_tag = soup.find("select", {"id": "level_4"})
-    villages = {option["value"]: option.text for option in select_tag.find_all("option")}
+    villages = fetch_options(api, params, 4)
     print(villages)
     return villages
 
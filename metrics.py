@@ -0,0 +1,294 @@
+# metrics.py
+
+import bisect
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (METRICS_ENABLED, METRICS_SNAPSHOT_FILE, METRICS_SNAPSHOT_SECONDS, METRICS_HOST, METRICS_PORT,
+                    LATENCY_BUCKETS, PROFILE_SAMPLE_RATE, PROFILE_OUTPUT)
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + [(k, str(v)) for k, v in extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters, gauges and histograms.
+
+    Values are kept per (name, labels) pair and exported either as a JSON
+    snapshot or in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register_collector(self, collector):
+        """Call collector() before every export, e.g. to refresh gauges it owns"""
+        self._collectors.append(collector)
+
+    def _collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Metrics collector failed: {e}")
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def add_gauge(self, name, delta, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(value)
+
+    def snapshot(self):
+        """Plain-dict view of every metric, with p50/p99 estimates for histograms"""
+        def render(key):
+            return ",".join(f"{k}={v}" for k, v in key[1])
+
+        self._collect()
+        with self._lock:
+            counters, gauges = {}, {}
+            for key, value in self._counters.items():
+                counters.setdefault(key[0], {})[render(key)] = value
+            for key, value in self._gauges.items():
+                gauges.setdefault(key[0], {})[render(key)] = value
+            histograms = {}
+            for key, hist in self._histograms.items():
+                histograms.setdefault(key[0], {})[render(key)] = {
+                    "count": hist.count, "sum": round(hist.sum, 6),
+                    "p50": hist.quantile(0.5), "p99": hist.quantile(0.99)
+                }
+        return {
+            "timestamp": time.time(), "uptime": round(time.time() - self.started, 3), "pid": os.getpid(),
+            "counters": counters, "gauges": gauges, "histograms": histograms
+        }
+
+    def render_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        self._collect()
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (name, key), value in sorted(series.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE scraper_{name} {kind}")
+                        typed.add(name)
+                    lines.append(f"scraper_{name}{_format_labels(key)} {value}")
+
+            typed = set()
+            for (name, key), hist in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE scraper_{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ["+Inf"], hist.counts):
+                    cumulative += count
+                    lines.append(f"scraper_{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"scraper_{name}_sum{_format_labels(key)} {hist.sum}")
+                lines.append(f"scraper_{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path=METRICS_SNAPSHOT_FILE):
+        """Atomically replace the snapshot file with the current metrics"""
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f, indent=4)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Error writing metrics snapshot: {e}")
+
+class _NullMetrics:
+    """Stand-in used when METRICS_ENABLED is off; every update is a no-op"""
+
+    def inc(self, *args, **labels):
+        pass
+
+    set_gauge = add_gauge = observe = register_collector = inc
+
+_metrics = Metrics() if METRICS_ENABLED else _NullMetrics()
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _metrics
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporters_started = False
+_snapshot_path = METRICS_SNAPSHOT_FILE
+_exporters_lock = threading.Lock()
+
+def start_exporters(snapshot_path=METRICS_SNAPSHOT_FILE, port=METRICS_PORT, interval=METRICS_SNAPSHOT_SECONDS):
+    """
+    Start the background snapshot writer and, when a port is given, the
+    /metrics endpoint on METRICS_HOST. Safe to call more than once.
+    """
+    global _exporters_started, _snapshot_path
+    if not METRICS_ENABLED:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        _snapshot_path = snapshot_path
+
+    def snapshot_loop():
+        while True:
+            time.sleep(interval)
+            _metrics.write_snapshot(snapshot_path)
+
+    if snapshot_path:
+        threading.Thread(target=snapshot_loop, name="metrics-snapshot", daemon=True).start()
+
+    if port:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, port), _MetricsHandler)
+        except OSError as e:
+            logging.error(f"Error starting metrics endpoint on port {port}: {e}")
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Serving metrics on http://{METRICS_HOST}:{port}/metrics")
+
+class SamplingProfiler:
+    """
+    Runs cProfile around a random sample of calls, one call at a time.
+
+    Calls that arrive while another is being profiled just run unprofiled,
+    so sampling never serializes the worker threads.
+    """
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, output=PROFILE_OUTPUT):
+        self.sample_rate = sample_rate
+        self.output = output
+        self.stats = None
+        self.sampled = 0
+        self._busy = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self._busy.release()
+            with self._stats_lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+                self.sampled += 1
+
+    def dump(self, path=None):
+        """Write the merged profile (readable with pstats / snakeviz)"""
+        with self._stats_lock:
+            if self.stats is None:
+                return
+            self.stats.dump_stats(path or self.output)
+            logging.info(f"Wrote profile of {self.sampled} sampled calls to {path or self.output}")
+
+_profiler = SamplingProfiler()
+
+def get_profiler():
+    return _profiler
+
+def profiled(name):
+    """
+    Decorator timing every call into the call_seconds histogram and, when
+    PROFILE_SAMPLE_RATE is set, profiling a sample of calls with cProfile.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                if _profiler.sample_rate > 0:
+                    return _profiler.call(func, *args, **kwargs)
+                return func(*args, **kwargs)
+            finally:
+                _metrics.observe("call_seconds", time.perf_counter() - start, function=name)
+        return wrapper
+    return decorate
+
+def flush():
+    """Write the final snapshot and profile at the end of a run"""
+    if METRICS_ENABLED and _snapshot_path:
+        _metrics.write_snapshot(_snapshot_path)
+    _profiler.dump()
@@ -0,0 +1,196 @@
+# mock_server.py
+
+import argparse
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+def _png(width, height, pad_bytes=0):
+    """Blank 1-bit grayscale PNG of the given size, padded with an ancillary chunk"""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b"\x00" + b"\xff" * ((width + 7) // 8)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height, 6))
+        + (chunk(b"paDd", random.Random(pad_bytes).randbytes(pad_bytes)) if pad_bytes else b"")
+        + chunk(b"IEND", b"")
+    )
+
+class MockBhuNaksha:
+    """
+    Deterministic stand-in for the BhuNaksha portal.
+
+    The hierarchy is districts x tehsils x RIs x villages, numbered from 1.
+    Each village has `sheets` sheets; plot numbers run on across the sheets
+    of a village, `plots_per_sheet` numbers per sheet, each number occupied
+    with probability 1 - sparsity.
+
+    Args:
+        latency_ms (float): Mean added service time per request (exponential)
+        error_rate (float): Fraction of requests answered with a 503
+        image_kb (int): Incompressible padding added to each WMS image, to
+            approach the size of real renders
+    """
+
+    def __init__(self, districts=1, tehsils=1, ris=2, villages=3, sheets=3, plots_per_sheet=300,
+                 sparsity=0.2, latency_ms=0.0, error_rate=0.0, image_kb=0, seed=1):
+        self.districts = districts
+        self.tehsils = tehsils
+        self.ris = ris
+        self.villages = villages
+        self.sheets = sheets
+        self.plots_per_sheet = plots_per_sheet
+        self.sparsity = sparsity
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.image_kb = image_kb
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._png_cache = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": {}, "latency": [], "plot_hits": 0, "plot_misses": 0, "errors": 0, "bytes": 0}
+
+    def snapshot_stats(self):
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _record(self, endpoint, latency, size):
+        with self._lock:
+            self.stats["requests"][endpoint] = self.stats["requests"].get(endpoint, 0) + 1
+            self.stats["latency"].append(latency)
+            self.stats["bytes"] += size
+
+    def plot_exists(self, location, village_no, sheet_no, plot_no):
+        """Occupancy is a pure function of the plot's coordinates in the hierarchy"""
+        first = (sheet_no - 1) * self.plots_per_sheet + 1
+        if not first <= plot_no < first + self.plots_per_sheet:
+            return False
+        key = f"{self.seed}:{location}:{village_no}:{plot_no}"
+        return random.Random(key).random() >= self.sparsity
+
+    def plot_response(self, levels, plot_no):
+        district, tehsil, ri, village_no, sheet_no = [int(part) for part in levels.strip(",").split(",")]
+        location = f"{district},{tehsil},{ri}"
+        if not self.plot_exists(location, village_no, sheet_no, plot_no):
+            return {"has_data": "N"}
+        x = village_no * 10000.0 + plot_no * 10.0
+        y = sheet_no * 10000.0 + (plot_no % 97) * 10.0
+        return {
+            "has_data": "Y",
+            "xmin": x, "xmax": x + 8.0, "ymin": y, "ymax": y + 8.0,
+            "center_x": x + 4.0, "center_y": y + 4.0,
+            "gisCode": f"21{district:02d}{tehsil:02d}{ri:03d}{village_no:04d}{plot_no:06d}{sheet_no:02d}"
+        }
+
+    def options_page(self, level, selections):
+        counts = {1: self.districts, 2: self.tehsils, 3: self.ris, 4: self.villages, 5: self.sheets}
+        options = "".join(f'<option value="{i}">Level {level} #{i}</option>' for i in range(1, counts[level] + 1))
+        return (
+            f'<html><body><select id="level_{level}" name="level_{level}">'
+            f'<option value="">--Select--</option>{options}</select></body></html>'
+        )
+
+    def png(self, width, height):
+        key = (width, height)
+        if key not in self._png_cache:
+            self._png_cache[key] = _png(width, height, self.image_kb * 1024)
+        return self._png_cache[key]
+
+    def handle(self, path, query):
+        """Return (status, content_type, body, endpoint) for a request"""
+        if self.error_rate and self._random.random() < self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            return 503, "text/plain", b"Service Unavailable", "error"
+
+        if path.endswith("/WMS"):
+            width = int(query.get("WIDTH", 256))
+            height = int(query.get("HEIGHT", 256))
+            return 200, "image/png", self.png(width, height), "wms"
+
+        if path.endswith("/ScalarDatahandler"):
+            if query.get("OP") == "5":
+                data = self.plot_response(query["levels"], int(query["plotno"]))
+                with self._lock:
+                    self.stats["plot_hits" if data["has_data"] == "Y" else "plot_misses"] += 1
+                return 200, "application/json", json.dumps(data).encode(), "plot"
+            level = int(query.get("level", 1))
+            return 200, "text/html", self.options_page(level, query.get("selections", "")).encode(), f"level_{level}"
+
+        return 200, "text/html", self.options_page(1, "").encode(), "level_1"
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                start = time.perf_counter()
+                parsed = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                if mock.latency_ms:
+                    time.sleep(random.expovariate(1.0 / mock.latency_ms) / 1000.0)
+                status, content_type, body, endpoint = mock.handle(parsed.path, query)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                mock._record(endpoint, time.perf_counter() - start, len(body))
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Start serving on a background thread.
+
+        Returns:
+            ThreadingHTTPServer: The running server; its base URL is
+            http://host:server_address[1]/bhunaksha
+        """
+        server = ThreadingHTTPServer((host, port), self.make_handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="mock-bhunaksha", daemon=True).start()
+        return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the BhuNaksha portal")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--villages", type=int, default=3)
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--plots-per-sheet", type=int, default=300)
+    parser.add_argument("--sparsity", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-kb", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockBhuNaksha(villages=args.villages, sheets=args.sheets, plots_per_sheet=args.plots_per_sheet,
+                         sparsity=args.sparsity, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                         image_kb=args.image_kb)
+    server = mock.serve(port=args.port)
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}/bhunaksha (set BHUNAKSHA_URL to use it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
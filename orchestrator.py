@@ -0,0 +1,379 @@
+# orchestrator.py
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import (QUEUE_DB, ORCHESTRATOR_WORKERS, GLOBAL_RATE_LIMIT, CLAIM_TIMEOUT_SECONDS,
+                    WORKER_HEARTBEAT_SECONDS, FETCH_MODE, HIERARCHY_MAX_AGE)
+from hierarchy import HierarchyIndex
+from scraper import VillageScraper
+from cache import get_cache
+from checkpoint import CheckpointStore
+from plot_stream import stream_path
+from rate_limiter import get_limiter
+import metrics
+from utils import setup_logging, ensure_directories, finalize_village_data, village_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    location TEXT NOT NULL,
+    village TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    plots INTEGER NOT NULL DEFAULT 0,
+    probes INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (location, village, sheet)
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL,
+    units_done INTEGER NOT NULL DEFAULT 0,
+    plots INTEGER NOT NULL DEFAULT 0,
+    probes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class WorkQueue:
+    """
+    Shared queue of (village, sheet) work units in a SQLite file.
+
+    Any number of worker processes on this host claim units atomically.
+    SQLite's WAL mode needs shared memory, so the file must be on a local
+    disk: workers on other machines cannot share it over a network
+    filesystem. Claims are leases renewed by the worker's heartbeat; a unit
+    whose lease lapses goes back to the pool.
+    """
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction taken up front, so concurrent claims never race"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def add_units(self, location, village_no, sheet_nos, reset=False):
+        """
+        Enqueue a village's sheets. Units already queued keep their status
+        (done, claimed or failed) unless reset is set.
+        """
+        verb = "INSERT OR REPLACE" if reset else "INSERT OR IGNORE"
+        with self._lock, self._transaction() as conn:
+            conn.executemany(
+                f"{verb} INTO units (location, village, sheet) VALUES (?, ?, ?)",
+                [(location, village_no, sheet_no) for sheet_no in sheet_nos]
+            )
+
+    def claim(self, worker_id):
+        """Claim the next pending (or abandoned) unit, or None when the queue is drained"""
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            row = conn.execute(
+                "SELECT rowid, location, village, sheet FROM units "
+                "WHERE status = 'pending' OR (status = 'claimed' AND claimed_at < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (now - CLAIM_TIMEOUT_SECONDS,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE units SET status = 'claimed', worker = ?, claimed_at = ?, started_at = ? WHERE rowid = ?",
+                (worker_id, now, now, row[0])
+            )
+        return {"rowid": row[0], "location": row[1], "village": row[2], "sheet": row[3]}
+
+    def complete(self, worker_id, unit, plots, probes):
+        """
+        Mark a unit done.
+
+        Returns:
+            bool: True if this was the last unfinished unit of its village
+        """
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                "UPDATE units SET status = 'done', finished_at = ?, plots = ?, probes = ?, error = NULL "
+                "WHERE rowid = ?",
+                (time.time(), plots, probes, unit["rowid"])
+            )
+            conn.execute(
+                "UPDATE workers SET units_done = units_done + 1, plots = plots + ?, probes = probes + ? "
+                "WHERE worker_id = ?",
+                (plots, probes, worker_id)
+            )
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM units WHERE location = ? AND village = ? AND status != 'done'",
+                (unit["location"], unit["village"])
+            ).fetchone()[0]
+        return remaining == 0
+
+    def fail(self, unit, error):
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                "UPDATE units SET status = 'failed', finished_at = ?, error = ? WHERE rowid = ?",
+                (time.time(), str(error), unit["rowid"])
+            )
+
+    def retry_failed(self):
+        with self._lock, self._transaction() as conn:
+            return conn.execute("UPDATE units SET status = 'pending' WHERE status = 'failed'").rowcount
+
+    def heartbeat(self, worker_id):
+        """Record that a worker is alive and renew the lease on its claimed units"""
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, heartbeat) VALUES (?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (worker_id, now)
+            )
+            conn.execute(
+                "UPDATE units SET claimed_at = ? WHERE worker = ? AND status = 'claimed'",
+                (now, worker_id)
+            )
+
+    def set_global_rate(self, rate):
+        with self._lock, self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('global_rate', ?)", (str(rate),))
+
+    def worker_budget(self):
+        """Requests/sec each live worker may use: the global rate split evenly"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'global_rate'").fetchone()
+            active = self._conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat > ?",
+                (time.time() - 3 * WORKER_HEARTBEAT_SECONDS,)
+            ).fetchone()[0]
+        global_rate = float(row[0]) if row else GLOBAL_RATE_LIMIT
+        return global_rate / max(1, active)
+
+    def progress(self):
+        """Aggregated progress over every unit and worker"""
+        with self._lock:
+            by_status = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM units GROUP BY status"
+            ).fetchall())
+            plots, probes, started, finished = self._conn.execute(
+                "SELECT COALESCE(SUM(plots), 0), COALESCE(SUM(probes), 0), MIN(started_at), MAX(finished_at) "
+                "FROM units WHERE status = 'done'"
+            ).fetchone()
+            active = self._conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat > ?",
+                (time.time() - 3 * WORKER_HEARTBEAT_SECONDS,)
+            ).fetchone()[0]
+        elapsed = (finished - started) if started and finished else 0
+        return {
+            "units": by_status,
+            "plots": plots,
+            "probes": probes,
+            "active_workers": active,
+            "probes_per_sec": probes / elapsed if elapsed else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def expand_selection(queue, district_no, tehsil_no=None, ri_no=None, fresh=False, max_age=HIERARCHY_MAX_AGE):
+    """
+    Expand the hierarchy index below a district (optionally narrowed to a
+    tehsil/RI), refreshing only branches older than max_age, and enqueue
+    one unit per (village, sheet). Queued units keep their progress unless
+    fresh is set. Villages whose sheets could not be fetched are logged and
+    left out.
+
+    Returns:
+        int: Number of units enqueued
+    """
+    if ri_no is not None and tehsil_no is None:
+        raise ValueError("An RI can only be selected together with its tehsil")
+    root = ",".join(str(part) for part in (district_no, tehsil_no, ri_no) if part is not None)
+
+    index = HierarchyIndex()
+    checkpoints = CheckpointStore() if fresh else None
+    enqueued = 0
+    skipped = 0
+
+    try:
+        index.expand(root, max_level=5, max_age=max_age)
+        for village_path in index.villages(root):
+            location, village_no = village_path.rsplit(",", 1)
+            sheet_nos = index.sheets(village_path)
+            if sheet_nos is None:
+                logging.error(f"Sheets of village {village_no} ({location}) could not be fetched; not enqueued")
+                skipped += 1
+                continue
+            if fresh:
+                key = village_key(location, village_no)
+                checkpoints.reset(key)
+                if os.path.exists(stream_path(key)):
+                    os.remove(stream_path(key))
+            queue.add_units(location, village_no, sheet_nos, reset=fresh)
+            enqueued += len(sheet_nos)
+            logging.info(f"Enqueued village {village_no} ({location}): {len(sheet_nos)} sheets")
+    finally:
+        index.close()
+        if checkpoints is not None:
+            checkpoints.close()
+    if skipped:
+        logging.error(f"{skipped} villages were not enqueued; rerun the selection once the portal answers")
+    return enqueued
+
+def _heartbeat_loop(queue, worker_id, limiter, stop):
+    while not stop.wait(WORKER_HEARTBEAT_SECONDS):
+        try:
+            queue.heartbeat(worker_id)
+            limiter.set_rate(queue.worker_budget())
+        except sqlite3.Error as e:
+            logging.error(f"Heartbeat failed for {worker_id}: {e}")
+
+def run_worker(queue_path=QUEUE_DB, fetch_mode=FETCH_MODE):
+    """Claim and scrape units until the queue is drained"""
+    setup_logging()
+    ensure_directories()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    # One snapshot per worker process; the HTTP endpoint is left to single-process runs
+    metrics.start_exporters(snapshot_path=f"metrics_{os.getpid()}.json", port=None)
+    queue = WorkQueue(queue_path)
+    queue.heartbeat(worker_id)
+    limiter = get_limiter()
+    limiter.set_rate(queue.worker_budget())
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue, worker_id, limiter, stop), daemon=True)
+    heartbeat.start()
+
+    scrapers = {}
+    try:
+        while True:
+            unit = queue.claim(worker_id)
+            if unit is None:
+                break
+
+            location = unit["location"]
+            if location not in scrapers:
+                scrapers[location] = VillageScraper(fetch_mode=fetch_mode, location=location)
+            scraper = scrapers[location]
+
+            logging.info(f"[{worker_id}] Village {unit['village']}, sheet {unit['sheet']}")
+            probes_before = scraper.probe_count
+            try:
+                plots = scraper.scrape_sheet(unit["village"], unit["sheet"])
+            except Exception as e:
+                logging.error(f"[{worker_id}] Unit failed: {unit}: {e}")
+                queue.fail(unit, e)
+                continue
+
+            if queue.complete(worker_id, unit, plots, scraper.probe_count - probes_before):
+                finalize_village_data(village_key(location, unit["village"]))
+    finally:
+        stop.set()
+        for scraper in scrapers.values():
+            scraper.close()
+        queue.close()
+        cache = get_cache()
+        if cache is not None:
+            cache.flush()
+        metrics.flush()
+
+def run_pool(workers=ORCHESTRATOR_WORKERS, queue_path=QUEUE_DB, fetch_mode=FETCH_MODE, report_every=30):
+    """Run a pool of worker processes on this machine, printing aggregated progress"""
+    # Spawned, not forked: the parent already holds the cache's SQLite connections and the
+    # limiter from expanding the selection, and neither may be shared across a fork
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(queue_path, fetch_mode), name=f"crawl-worker-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    queue = WorkQueue(queue_path)
+    try:
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(timeout=report_every / len(processes))
+            print(format_progress(queue.progress()))
+    finally:
+        queue.close()
+
+def format_progress(progress):
+    units = progress["units"]
+    total = sum(units.values())
+    return (
+        f"units {units.get('done', 0)}/{total} done, {units.get('claimed', 0)} running, "
+        f"{units.get('failed', 0)} failed | plots {progress['plots']} | probes {progress['probes']} "
+        f"({progress['probes_per_sec']:.1f}/s) | workers {progress['active_workers']}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl many villages across a pool of worker processes")
+    parser.add_argument("--queue", default=QUEUE_DB, help="Shared work queue database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_selection(command):
+        command.add_argument("--district", required=True)
+        command.add_argument("--tehsil")
+        command.add_argument("--ri")
+        command.add_argument("--fresh", action="store_true", help="Discard earlier progress for these villages")
+        command.add_argument("--rate", type=float, help="Global requests/sec shared by all workers")
+        command.add_argument("--max-age-days", type=float, help="Refetch hierarchy branches older than this")
+
+    def add_workers(command):
+        command.add_argument("--workers", type=int, default=ORCHESTRATOR_WORKERS)
+        command.add_argument("--fetch-mode", default=FETCH_MODE, choices=["thread", "async"])
+        command.add_argument("--retry-failed", action="store_true", help="Requeue failed units first")
+
+    add_selection(commands.add_parser("enqueue", help="Expand a selection into work units"))
+    add_workers(commands.add_parser("work", help="Process queued units (more pools on this host may join)"))
+    run = commands.add_parser("run", help="Enqueue a selection and process it here")
+    add_selection(run)
+    add_workers(run)
+    commands.add_parser("status", help="Show aggregated progress")
+
+    args = parser.parse_args()
+    setup_logging()
+    queue = WorkQueue(args.queue)
+
+    if args.command in ("enqueue", "run"):
+        if args.rate is not None:
+            queue.set_global_rate(args.rate)
+        max_age = args.max_age_days * 86400 if args.max_age_days is not None else HIERARCHY_MAX_AGE
+        count = expand_selection(queue, args.district, args.tehsil, args.ri, fresh=args.fresh, max_age=max_age)
+        print(f"Enqueued {count} units")
+
+    if args.command in ("work", "run"):
+        if args.retry_failed:
+            print(f"Requeued {queue.retry_failed()} failed units")
+        run_pool(args.workers, args.queue, args.fetch_mode)
+
+    print(format_progress(queue.progress()))
+    queue.close()
+
+if __name__ == "__main__":
+    main()
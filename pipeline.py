@@ -0,0 +1,114 @@
+# pipeline.py
+
+import argparse
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from config import FETCH_MODE, IMAGE_MODE, IMAGE_WORKERS, PIPELINE_QUEUE_SIZE
+from runner import extract_village_data
+from hierarchy import resolve_location
+from refresh import plot_sheet
+from utils import iter_village_plots, village_key
+from plot_image_scraper import PlotImageDownloader
+
+def _download_stage(plot_queue, downloader):
+    """Collect found plots per sheet and hand each finished sheet to the downloader"""
+    sheets = defaultdict(list)
+    while True:
+        item = plot_queue.get()
+        if item is None:
+            return
+        kind, sheet_no, payload = item
+        if kind == "plot":
+            sheets[sheet_no].append(payload)
+            continue
+
+        plots = sheets.pop(sheet_no, [])
+        # A resumed sheet's earlier plots are only on disk; its BBOX waits for the catch-up pass
+        if plots and not payload:
+            downloader.submit_sheet(sheet_no, plots)
+
+def _enqueue(plot_queue, item, stage):
+    """Put an item on the bounded queue, raising instead of waiting forever once the download stage has died"""
+    while stage.is_alive():
+        try:
+            plot_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+    raise RuntimeError("Download stage stopped; abandoning the crawl")
+
+def run_village_pipeline(village_number, fresh_start=True, fetch_mode=FETCH_MODE, location=None,
+                         image_workers=IMAGE_WORKERS, mode=IMAGE_MODE, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Crawl a village and download its plot images in one overlapping run.
+
+    Found plots flow through a bounded queue into the download stage, which
+    starts on a sheet as soon as the crawl finishes it (a sheet's BBOX needs
+    all of its plots). The crawl keeps its own probe workers and the
+    downloads image_workers threads; a full queue blocks the crawl until
+    downloads catch up, and fails it if the download stage has died. Plots from sheets finished by an earlier run are
+    picked up from the saved village data at the end.
+
+    Returns:
+        dict: "plots" found by the crawl (None if it failed) and the image
+        download counts
+    """
+    if location is None or "," in str(village_number):
+        location, village_number = resolve_location(village_number)
+
+    plot_queue = queue.Queue(maxsize=queue_size)
+    key = village_key(location, village_number)
+    downloader = PlotImageDownloader(key, max_workers=image_workers, mode=mode)
+    stage = threading.Thread(target=_download_stage, args=(plot_queue, downloader), name="download-stage")
+    stage.start()
+
+    start = time.monotonic()
+    try:
+        data = extract_village_data(
+            village_number, fresh_start=fresh_start, fetch_mode=fetch_mode, location=location,
+            on_plot=lambda village_no, sheet_no, plot: _enqueue(plot_queue, ("plot", sheet_no, plot), stage),
+            on_sheet_done=lambda village_no, sheet_no, resumed: _enqueue(plot_queue, ("sheet", sheet_no, resumed), stage)
+        )
+    finally:
+        if stage.is_alive():
+            _enqueue(plot_queue, None, stage)
+        stage.join()
+    logging.info(f"Crawl of village {village_number} finished in {time.monotonic() - start:.1f}s")
+
+    try:
+        # Keyed like the crawl's sheet numbers ("1", not "01"), so streamed sheets are not submitted again
+        sheet_plots = defaultdict(list)
+        for plot in iter_village_plots(key):
+            sheet_plots[plot_sheet(plot)].append(plot)
+        for sheet_no, plots in sheet_plots.items():
+            if sheet_no is not None:
+                downloader.submit_sheet(sheet_no, plots)
+    finally:
+        images = downloader.finish()
+    logging.info(f"Village {village_number} crawled and downloaded in {time.monotonic() - start:.1f}s: {images}")
+
+    return {"plots": len(data) if data is not None else None, "images": images}
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl villages and download their plot images in one pipeline")
+    parser.add_argument("villages", nargs="+", help="Village numbers")
+    parser.add_argument("--location", help="district,tehsil,RI prefix (default: from the hierarchy index)")
+    parser.add_argument("--fetch-mode", default=FETCH_MODE, choices=["thread", "async"])
+    parser.add_argument("--image-mode", default=IMAGE_MODE, choices=["sheet", "plot", "tiled"],
+                        help='"tiled" is cheapest but its images do not highlight the plot')
+    parser.add_argument("--image-workers", type=int, default=IMAGE_WORKERS)
+    parser.add_argument("--resume", action="store_true", help="Keep checkpoints instead of starting fresh")
+    args = parser.parse_args()
+
+    for village_no in args.villages:
+        results = run_village_pipeline(
+            village_no, fresh_start=not args.resume, fetch_mode=args.fetch_mode, location=args.location,
+            image_workers=args.image_workers, mode=args.image_mode
+        )
+        print(f"Village {village_no}: {results}")
+
+if __name__ == "__main__":
+    main()
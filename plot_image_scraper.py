@@ -1,10 +1,18 @@
 import requests
+import io
 import os
-import time
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Union, Tuple, Iterable
 from main import find_villages
+from utils import iter_village_plots
+from rate_limiter import get_limiter
+from metrics import get_metrics, profiled
+from plot_store import PlotStore
+from image_tiles import SheetTiles, sheet_resolution, padded_bbox, bbox_size
+from image_store import ImageStore, ImageManifest, is_complete_png
+from config import WMS_URL, IMAGE_MODE, IMAGE_DIR, IMAGE_CHUNK_SIZE, IMAGE_WORKERS, IMAGE_TIMEOUT_SECONDS
 from collections import defaultdict
 
 def get_sheet_number(gis_code: str) -> str:
@@ -14,163 +22,241 @@ def get_sheet_number(gis_code: str) -> str:
     except:
         return "00"  # Default sheet number if extraction fails
 
-def calculate_sheet_bboxes(village_data: Dict) -> Dict[str, str]:
+def calculate_sheet_bboxes(plots: Iterable[Dict]) -> Dict[str, str]:
     """
     Calculate BBOX parameters for each sheet in the village.
+    Takes an iterable of plot dicts (or a PlotStore), loaded into columnar
+    arrays and aggregated per sheet in one vectorized pass.
     Returns dict of sheet numbers to BBOX strings.
     """
-    # Group plots by sheet number
-    sheet_plots = defaultdict(list)
-    
-    for plot in village_data['plots'].values():
-        sheet_num = get_sheet_number(plot['gisCode'])
-        sheet_plots[sheet_num].append(plot)
-    
-    # Calculate BBOX for each sheet
-    sheet_bboxes = {}
-    for sheet_num, plots in sheet_plots.items():
-        if not plots:
-            continue
-            
-        # Initialize with first plot's values
-        xmin = plots[0]['xmin']
-        ymin = plots[0]['ymin']
-        xmax = plots[0]['xmax']
-        ymax = plots[0]['ymax']
-        
-        # Find min/max coordinates for this sheet
-        for plot in plots:
-            xmin = min(xmin, plot['xmin'])
-            ymin = min(ymin, plot['ymin'])
-            xmax = max(xmax, plot['xmax'])
-            ymax = max(ymax, plot['ymax'])
-        
-        sheet_bboxes[sheet_num] = f"{xmin},{ymin},{xmax},{ymax}"
-    
-    return sheet_bboxes
+    store = plots if isinstance(plots, PlotStore) else PlotStore.from_plots(plots)
+    return {
+        sheet_num: f"{xmin},{ymin},{xmax},{ymax}"
+        for sheet_num, (xmin, ymin, xmax, ymax) in store.sheet_bboxes(get_sheet_number).items()
+    }
+
+def plot_bboxes(store: PlotStore) -> Dict[str, Tuple[float, float, float, float]]:
+    """gisCode -> (xmin, ymin, xmax, ymax) of every plot, read from the store's columns"""
+    columns = [store.column(field).tolist() for field in ("xmin", "ymin", "xmax", "ymax")]
+    return dict(zip(store.gis_codes(), zip(*columns)))
+
+WMS_PARAMS = {
+    "SERVICE": "WMS",
+    "VERSION": "1.3.0",
+    "REQUEST": "GetMap",
+    "FORMAT": "image/png",
+    "TRANSPARENT": "true",
+    "LAYERS": "VILLAGE_MAP",
+    "transparent": "true",
+    "state": "21",
+    "overlay_codes": "",
+    "CRS": "EPSG:3857",
+    "STYLES": "VILLAGE_MAP",
+    "FORMAT_OPTIONS": "dpi:180",
+    "WIDTH": "4698",
+    "HEIGHT": "4086"
+}
 
-def download_village_plots(village_no: Union[str, int], max_workers: int = 20) -> Dict[str, int]:
+class PlotImageDownloader:
     """
-    Downloads plot images for a given village number using sheet-specific BBOXes.
-    
-    Args:
-        village_no: Village number to process
-        max_workers: Maximum number of concurrent downloads (default: 20)
-    
-    Returns:
-        Dict with counts of successful and failed downloads
+    Downloads the plot images of one village, a sheet at a time.
+
+    Sheets are submitted with their plots as they become available, either
+    all at once from the saved village data or one by one while a crawl is
+    still running. At most 2 * max_workers plots are queued at a time, so
+    submit_sheet blocks when downloads fall behind.
     """
-    # Initialize session and parameters
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    })
-    
-    # Load and process village data
-    try:
-        with open(f"village_data/village_{village_no}.json") as f:
-            village_data = json.load(f)
-            
-        # Calculate BBOXes for each sheet
-        sheet_bboxes = calculate_sheet_bboxes(village_data)
-        print(f"Calculated BBOXes for {len(sheet_bboxes)} sheets in village {village_no}")
-        
-        # Group GIS codes by sheet
-        sheet_gis_codes = defaultdict(list)
-        for plot in village_data['plots'].values():
-            sheet_num = get_sheet_number(plot['gisCode'])
-            sheet_gis_codes[sheet_num].append(plot['gisCode'])
-        
-    except Exception as e:
-        print(f"Error processing village data: {e}")
-        return {"successful": 0, "failed": 0, "total_plots": 0}
 
-    base_params = {
-        "SERVICE": "WMS",
-        "VERSION": "1.3.0",
-        "REQUEST": "GetMap",
-        "FORMAT": "image/png",
-        "TRANSPARENT": "true",
-        "LAYERS": "VILLAGE_MAP",
-        "transparent": "true",
-        "state": "21",
-        "overlay_codes": "",
-        "CRS": "EPSG:3857",
-        "STYLES": "VILLAGE_MAP",
-        "FORMAT_OPTIONS": "dpi:180",
-        "WIDTH": "4698",
-        "HEIGHT": "4086"
-    }
-    
-    # Prepare output directory
-    output_dir = f"images/village_{village_no}"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    def download_single_plot(gis_code: str, bbox: str) -> bool:
+    def __init__(self, village_no: Union[str, int], max_workers: int = IMAGE_WORKERS,
+                 mode: str = IMAGE_MODE, verify: bool = False):
+        """
+        Args:
+            village_no: Village key to process (see utils.village_key)
+            max_workers: Maximum number of concurrent downloads (default: IMAGE_WORKERS)
+            mode: "sheet" renders the whole sheet for every plot, "plot" renders
+                each plot's padded bbox, and "tiled" fetches each sheet once as
+                cached tiles and crops the plots locally (needs Pillow). Tiles
+                are rendered without a gis_code, so tiled images do not show
+                the plot highlighted; use "sheet" or "plot" where it matters
+            verify: Re-hash existing images against the manifest instead of
+                only checking their size
+        """
+        self.mode = mode
+        self.verify = verify
+        self.sheet_size = (int(WMS_PARAMS["WIDTH"]), int(WMS_PARAMS["HEIGHT"]))
+
+        # Initialize session and parameters
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Prepare output directory
+        self.output_dir = f"{IMAGE_DIR}/village_{village_no}"
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.store = ImageStore()
+        self.manifest = ImageManifest(self.output_dir)
+        self.limiter = get_limiter()
+        self.metrics = get_metrics()
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.slots = threading.BoundedSemaphore(2 * max_workers)
+        self.futures = []
+        self.submitted = set()
+
+    def fetch_map(self, bbox: str, width: int, height: int, gis_code: str = "") -> Tuple[str, int]:
+        """Stream one map render into the image store, returning its (sha256, size)"""
+        params = WMS_PARAMS.copy()
+        params['gis_code'] = gis_code
+        params['BBOX'] = bbox
+        params['WIDTH'] = str(width)
+        params['HEIGHT'] = str(height)
+
+        # The slot is held until the body is on disk, so slow transfers count as load
+        with self.limiter.request("wms") as ticket:
+            with self.session.get(WMS_URL, params=params, timeout=IMAGE_TIMEOUT_SECONDS, stream=True) as response:
+                ticket.ok = response.ok
+                response.raise_for_status()
+                digest, size = self.store.save_stream(response.iter_content(IMAGE_CHUNK_SIZE))
+        self.metrics.inc("bytes_total", size, endpoint="wms")
+        return digest, size
+
+    def fetch_tile(self, bbox: str, width: int, height: int, path: str) -> None:
+        self.store.link(self.fetch_map(bbox, width, height)[0], path)
+
+    @profiled("download_single_plot")
+    def download_single_plot(self, gis_code: str, bbox: str, width: int, height: int,
+                             plot_bbox: Tuple[float, float, float, float], tiles=None) -> bool:
         """Helper function to download a single plot image with specific BBOX"""
         try:
-            # Skip if file exists
-            output_file = f"{output_dir}/{gis_code}.png"
-            if os.path.exists(output_file):
+            output_file = f"{self.output_dir}/{gis_code}.png"
+            request = {"mode": self.mode, "bbox": bbox, "width": width, "height": height}
+            entry = self.manifest.get(gis_code)
+            current = entry is not None and all(entry.get(key) == value for key, value in request.items())
+
+            # Skip if the recorded image is intact, relink it if only the file was lost
+            if current and self.manifest.is_intact(gis_code, output_file, self.verify):
                 print(f"File exists: {gis_code}.png")
                 return True
-                
-            # Prepare parameters and download
-            params = base_params.copy()
-            params['gis_code'] = gis_code
-            params['BBOX'] = bbox
-            
-            time.sleep(0.2)  # Rate limiting
-            response = session.get(
-                "https://app1bhunakshaodisha.nic.in/bhunaksha/WMS",
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            # Save image
-            with open(output_file, "wb") as f:
-                f.write(response.content)
+            if current and self.store.has_blob(entry["sha256"], entry["size"]):
+                self.store.link(entry["sha256"], output_file)
+                print(f"Restored: {gis_code}.png")
+                return True
+            # Whole sheet renders from before the manifest are kept
+            if entry is None and self.mode == "sheet" and is_complete_png(output_file):
+                self.manifest.add(gis_code, *self.store.adopt(output_file), **request)
+                print(f"File exists: {gis_code}.png")
+                return True
+
+            if tiles is not None:
+                buffer = io.BytesIO()
+                tiles.crop(padded_bbox(plot_bbox)).save(buffer, format="PNG")
+                digest, size = self.store.save_bytes(buffer.getvalue())
+            else:
+                digest, size = self.fetch_map(bbox, width, height, gis_code)
+            self.store.link(digest, output_file)
+            self.manifest.add(gis_code, digest, size, **request)
             print(f"Downloaded: {gis_code}.png (Sheet: {get_sheet_number(gis_code)})")
             return True
             
         except Exception as e:
             print(f"Failed to download {gis_code}: {e}")
             return False
-    
-    # Download plots using thread pool, grouped by sheet
-    successful = 0
-    failed = 0
-    total_plots = sum(len(codes) for codes in sheet_gis_codes.values())
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        
-        # Submit downloads for each sheet with its specific BBOX
-        for sheet_num, gis_codes in sheet_gis_codes.items():
-            if sheet_num not in sheet_bboxes:
-                print(f"Warning: No BBOX found for sheet {sheet_num}")
-                continue
-                
-            bbox = sheet_bboxes[sheet_num]
-            print(f"Processing sheet {sheet_num} with BBOX: {bbox}")
-            
-            for gis_code in gis_codes:
-                futures.append(
-                    executor.submit(download_single_plot, gis_code, bbox)
-                )
-        
-        for future in as_completed(futures):
+
+    def _run_job(self, *job) -> bool:
+        try:
+            return self.download_single_plot(*job)
+        finally:
+            self.slots.release()
+
+    def submit_sheet(self, sheet_num: str, plots: Iterable[Dict]) -> int:
+        """
+        Queue downloads for one sheet's plots, using the sheet's BBOX.
+        Plots already submitted are skipped. Returns the number queued.
+        """
+        store = plots if isinstance(plots, PlotStore) else PlotStore.from_plots(plots)
+        bboxes = plot_bboxes(store)
+        pending = [gis_code for gis_code in bboxes if gis_code not in self.submitted]
+        if not pending:
+            return 0
+
+        sheet_bbox = next(iter(store.sheet_bboxes(lambda gis_code: sheet_num).values()))
+        bbox = ",".join(str(value) for value in sheet_bbox)
+        print(f"Processing sheet {sheet_num} with BBOX: {bbox}")
+        resolution = sheet_resolution(sheet_bbox, *self.sheet_size)
+        tiles = None
+        if self.mode == "tiled":
+            tiles = SheetTiles(sheet_bbox, resolution, self.fetch_tile, f"{self.output_dir}/tiles/sheet_{sheet_num}")
+
+        for gis_code in pending:
+            if self.mode == "plot":
+                plot_bbox = padded_bbox(bboxes[gis_code])
+                job = (",".join(str(value) for value in plot_bbox), *bbox_size(plot_bbox, resolution))
+            else:
+                job = (bbox, *self.sheet_size)
+            self.slots.acquire()
+            self.submitted.add(gis_code)
+            self.futures.append(
+                self.executor.submit(self._run_job, gis_code, *job, bboxes[gis_code], tiles)
+            )
+        return len(pending)
+
+    def finish(self) -> Dict[str, int]:
+        """Wait for every queued download and return the counts"""
+        successful = 0
+        failed = 0
+        for future in as_completed(self.futures):
             if future.result():
                 successful += 1
             else:
                 failed += 1
+        self.executor.shutdown()
+        self.session.close()
+        return {
+            "successful": successful,
+            "failed": failed,
+            "total_plots": len(self.futures)
+        }
+
+def download_village_plots(village_no: Union[str, int], max_workers: int = IMAGE_WORKERS,
+                           mode: str = IMAGE_MODE, verify: bool = False) -> Dict[str, int]:
+    """
+    Downloads plot images for a given village number using sheet-specific BBOXes.
     
-    return {
-        "successful": successful,
-        "failed": failed,
-        "total_plots": total_plots
-    }
+    Args:
+        village_no: Village key to process (see utils.village_key)
+        max_workers: Maximum number of concurrent downloads (default: IMAGE_WORKERS)
+        mode: "sheet", "plot" or "tiled" (see PlotImageDownloader)
+        verify: Re-hash existing images against the manifest
+    
+    Returns:
+        Dict with counts of successful and failed downloads
+    """
+    # Load and process village data
+    try:
+        store = PlotStore.from_plots(iter_village_plots(village_no))
+
+        # Group plots by sheet
+        sheet_plots = defaultdict(list)
+        for plot_no in store:
+            plot = store[plot_no]
+            sheet_plots[get_sheet_number(plot["gisCode"])].append(plot)
+        print(f"Calculated BBOXes for {len(sheet_plots)} sheets in village {village_no}")
+        
+    except Exception as e:
+        print(f"Error processing village data: {e}")
+        return {"successful": 0, "failed": 0, "total_plots": 0}
+
+    downloader = PlotImageDownloader(village_no, max_workers=max_workers, mode=mode, verify=verify)
+    try:
+        for sheet_num, plots in sheet_plots.items():
+            downloader.submit_sheet(sheet_num, plots)
+    finally:
+        results = downloader.finish()
+    return results
 
 if __name__ == "__main__":
     village_list = find_villages(1,1,2)
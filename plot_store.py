@@ -0,0 +1,162 @@
+# plot_store.py
+
+import threading
+from collections.abc import Mapping
+import numpy as np
+
+COORD_FIELDS = ("xmax", "xmin", "ymin", "ymax", "center_x", "center_y")  # JSON output order
+
+class PlotBitmap:
+    """Set of plot numbers stored as one bit per plot number"""
+
+    def __init__(self):
+        self._bits = bytearray()
+        self._lock = threading.Lock()
+
+    def add(self, plot_no):
+        byte, bit = divmod(plot_no, 8)
+        with self._lock:
+            if byte >= len(self._bits):
+                self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits))))
+            self._bits[byte] |= 1 << bit
+
+    def __contains__(self, plot_no):
+        byte, bit = divmod(plot_no, 8)
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << bit))
+
+    def __len__(self):
+        return int(np.unpackbits(np.frombuffer(bytes(self._bits), dtype=np.uint8)).sum())
+
+class PlotStore(Mapping):
+    """
+    Columnar store of one village's plots.
+
+    plot_no and the bbox/centre coordinates live in contiguous NumPy arrays
+    and gisCodes in an interned table, instead of one dict per plot. It reads
+    like the old {str(plot_no): plot_dict} mapping; dicts are built only
+    when a plot is looked up.
+    """
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._plot_no = np.zeros(capacity, dtype=np.int64)
+        self._coords = np.zeros((capacity, len(COORD_FIELDS)), dtype=np.float64)
+        self._gis_idx = np.zeros(capacity, dtype=np.int32)
+        self._gis_codes = []
+        self._gis_lookup = {}
+        self._row_of = np.full(1024, -1, dtype=np.int64)  # plot_no -> row
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_plots(cls, plots):
+        store = cls()
+        for plot in plots:
+            store.add(plot)
+        return store
+
+    def _grow(self, size):
+        capacity = len(self._plot_no)
+        if size > capacity:
+            capacity = max(size, capacity * 2)
+            self._plot_no = np.resize(self._plot_no, capacity)
+            self._coords = np.resize(self._coords, (capacity, len(COORD_FIELDS)))
+            self._gis_idx = np.resize(self._gis_idx, capacity)
+
+    def _intern(self, gis_code):
+        idx = self._gis_lookup.get(gis_code)
+        if idx is None:
+            idx = self._gis_lookup[gis_code] = len(self._gis_codes)
+            self._gis_codes.append(gis_code)
+        return idx
+
+    def add(self, plot):
+        """Insert a plot dict, replacing any earlier record with the same plot_no"""
+        plot_no = int(plot["plot_no"])
+        with self._lock:
+            if plot_no >= len(self._row_of):
+                grown = np.full(max(plot_no + 1, 2 * len(self._row_of)), -1, dtype=np.int64)
+                grown[:len(self._row_of)] = self._row_of
+                self._row_of = grown
+
+            row = self._row_of[plot_no]
+            if row < 0:
+                row = self._size
+                self._grow(row + 1)
+                self._size += 1
+                self._row_of[plot_no] = row
+
+            self._plot_no[row] = plot_no
+            self._coords[row] = [plot[field] for field in COORD_FIELDS]
+            self._gis_idx[row] = self._intern(plot["gisCode"])
+
+    def _plot(self, row):
+        plot = {"plot_no": int(self._plot_no[row])}
+        plot.update(zip(COORD_FIELDS, self._coords[row].tolist()))
+        plot["gisCode"] = self._gis_codes[self._gis_idx[row]]
+        return plot
+
+    def __getitem__(self, key):
+        plot_no = int(key)
+        row = self._row_of[plot_no] if 0 <= plot_no < len(self._row_of) else -1
+        if row < 0:
+            raise KeyError(key)
+        return self._plot(row)
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield str(self._plot_no[row])
+
+    def __len__(self):
+        return self._size
+
+    def to_dict(self):
+        """Materialize the {str(plot_no): plot} form used by the JSON output"""
+        return {str(self._plot_no[row]): self._plot(row) for row in range(self._size)}
+
+    def gis_codes(self):
+        """gisCode of every plot, in insertion order"""
+        return [self._gis_codes[idx] for idx in self._gis_idx[:self._size].tolist()]
+
+    def column(self, field):
+        """Read-only view of one coordinate column, or of plot_no"""
+        if field == "plot_no":
+            return self._plot_no[:self._size]
+        return self._coords[:self._size, COORD_FIELDS.index(field)]
+
+    def sheet_bboxes(self, sheet_of=lambda gis_code: gis_code[-2:]):
+        """
+        Bounding box of every sheet in one vectorized pass.
+
+        Args:
+            sheet_of (callable): Maps a gisCode to its sheet number
+
+        Returns:
+            dict: sheet number -> (xmin, ymin, xmax, ymax)
+        """
+        if not self._size:
+            return {}
+
+        # Sheet id per interned gisCode, then per row
+        sheet_names = sorted({sheet_of(code) for code in self._gis_codes})
+        sheet_ids = {name: i for i, name in enumerate(sheet_names)}
+        code_sheet = np.array([sheet_ids[sheet_of(code)] for code in self._gis_codes], dtype=np.int32)
+        row_sheet = code_sheet[self._gis_idx[:self._size]]
+
+        order = np.argsort(row_sheet, kind="stable")
+        sorted_sheets = row_sheet[order]
+        starts = np.flatnonzero(np.r_[True, sorted_sheets[1:] != sorted_sheets[:-1]])
+
+        coords = self._coords[:self._size][order]
+        xmin = np.minimum.reduceat(coords[:, COORD_FIELDS.index("xmin")], starts)
+        ymin = np.minimum.reduceat(coords[:, COORD_FIELDS.index("ymin")], starts)
+        xmax = np.maximum.reduceat(coords[:, COORD_FIELDS.index("xmax")], starts)
+        ymax = np.maximum.reduceat(coords[:, COORD_FIELDS.index("ymax")], starts)
+
+        return {
+            sheet_names[sorted_sheets[start]]: (xmin[i].item(), ymin[i].item(), xmax[i].item(), ymax[i].item())
+            for i, start in enumerate(starts)
+        }
+
+    def nbytes(self):
+        """Approximate memory held by the columns (excluding the gisCode strings)"""
+        return self._plot_no.nbytes + self._coords.nbytes + self._gis_idx.nbytes + self._row_of.nbytes
@@ -0,0 +1,78 @@
+# plot_stream.py
+
+import json
+import os
+import threading
+import logging
+from config import OUTPUT_DIR
+
+def stream_path(village_no):
+    """Path of the append-only plot log for a village"""
+    return os.path.join(OUTPUT_DIR, f"village_{village_no}.jsonl")
+
+class PlotStreamWriter:
+    """
+    Appends one JSON line per plot to village_N.jsonl as plots are found.
+
+    Each line goes out in a single write() on an O_APPEND descriptor, so
+    worker threads and separate worker processes can append to the same
+    village log without interleaving. A plot may appear more than once
+    (e.g. after a resumed crawl); readers keep the first record for each
+    plot_no.
+    """
+
+    def __init__(self, village_no, fresh=False):
+        self.village_no = village_no
+        self.path = stream_path(village_no)
+        self._lock = threading.Lock()
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if fresh else 0)
+        self._fd = os.open(self.path, flags, 0o644)
+
+    def write(self, plot):
+        line = (json.dumps(plot, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            os.write(self._fd, line)
+
+    def flush(self):
+        """fsync the log so everything written so far survives a crash"""
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+def rewrite_stream(village_no, plots):
+    """
+    Replace village_N.jsonl with `plots`, one record each. The new log is
+    written to a temporary file, fsynced and renamed over the old one, so a
+    crash leaves either log whole.
+    """
+    path = stream_path(village_no)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for plot in plots:
+            f.write(json.dumps(plot, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def iter_stream(village_no):
+    """
+    Lazily yield plots from village_N.jsonl, one record per line.
+
+    Duplicate plot numbers are yielded as they appear; a truncated final
+    line left by a crash is skipped.
+    """
+    path = stream_path(village_no)
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.warning(f"Skipping malformed line in {path}")
@@ -0,0 +1,198 @@
+# rate_limiter.py
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from metrics import get_metrics
+from config import (RATE_LIMIT, RATE_BURST, CONCURRENCY_INITIAL, CONCURRENCY_MIN, CONCURRENCY_MAX,
+                    LATENCY_TARGET_SECONDS, BACKOFF_FACTOR, BACKOFF_COOLDOWN_SECONDS)
+
+ASYNC_SLOT_POLL_SECONDS = 0.005
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    reserve() books a token and returns how long the caller must wait before
+    using it, so the same bucket can pace threads (acquire) and coroutines
+    (await asyncio.sleep(bucket.reserve())).
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, burst=None):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.burst = float(burst if burst is not None else max(1.0, rate))
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take one token, returning the seconds to wait until it is valid"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+class RequestTicket:
+    """Handed to the body of a limited request; set ok = False to report a failure"""
+
+    def __init__(self):
+        self.ok = True
+
+class RateLimiter:
+    """
+    Shared throttle for every request to the portal.
+
+    A token bucket caps requests/sec and an AIMD controller caps requests in
+    flight. Healthy responses (ok and faster than latency_target) raise the
+    concurrency limit by about one per window and the rate back towards its
+    ceiling; timeouts, errors and non-200s cut both multiplicatively, at most
+    once per cooldown.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, concurrency=CONCURRENCY_INITIAL,
+                 min_concurrency=CONCURRENCY_MIN, max_concurrency=CONCURRENCY_MAX,
+                 latency_target=LATENCY_TARGET_SECONDS, backoff=BACKOFF_FACTOR,
+                 cooldown=BACKOFF_COOLDOWN_SECONDS):
+        self.ceiling = float(rate)
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+        self.metrics = get_metrics()
+        self.metrics.register_collector(self.snapshot)
+
+    def set_rate(self, rate):
+        """Change the requests/sec ceiling (e.g. a worker's share of a global budget)"""
+        with self._cond:
+            self.ceiling = float(rate)
+            self.bucket.set_rate(min(self.bucket.rate, self.ceiling) or self.ceiling, self.bucket.burst)
+
+    def _try_enter(self):
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        """Block until both a token and a concurrency slot are available"""
+        self.bucket.acquire()
+        with self._cond:
+            while not self._try_enter():
+                self._cond.wait()
+
+    async def acquire_async(self):
+        """Coroutine form of acquire() for the async fetch engine"""
+        wait = self.bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while True:
+            with self._cond:
+                if self._try_enter():
+                    return
+            await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+
+    def release(self, latency, ok):
+        """Free the slot and feed the outcome into the AIMD controller"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                if self.bucket.rate < self.ceiling:
+                    self.bucket.set_rate(min(self.ceiling, self.bucket.rate + 1.0 / max(1.0, self.bucket.rate)),
+                                         self.bucket.burst)
+            elif not ok and now - self._last_backoff >= self.cooldown:
+                self._last_backoff = now
+                self.limit = max(self.min_concurrency, self.limit * self.backoff)
+                self.bucket.set_rate(max(1.0, self.bucket.rate * self.backoff), self.bucket.burst)
+                logging.warning(
+                    f"Backing off: concurrency {int(self.limit)}, rate {self.bucket.rate:.1f}/s"
+                )
+                self.metrics.inc("limiter_backoffs_total")
+            self._cond.notify_all()
+
+    def _record(self, endpoint, start, ok):
+        """Release the slot and count the request against its endpoint"""
+        latency = time.monotonic() - start
+        self.release(latency, ok)
+        self.metrics.add_gauge("in_flight", -1, endpoint=endpoint)
+        self.metrics.inc("requests_total", endpoint=endpoint, outcome="ok" if ok else "error")
+        self.metrics.observe("request_seconds", latency, endpoint=endpoint)
+
+    @contextmanager
+    def request(self, endpoint="portal"):
+        """
+        Wrap one request. The body may set ticket.ok = False for a bad
+        response; an exception escaping the body also counts as a failure.
+        """
+        self.acquire()
+        self.metrics.add_gauge("in_flight", 1, endpoint=endpoint)
+        ticket = RequestTicket()
+        start = time.monotonic()
+        try:
+            yield ticket
+        except BaseException:
+            self._record(endpoint, start, False)
+            raise
+        self._record(endpoint, start, ticket.ok)
+
+    @asynccontextmanager
+    async def request_async(self, endpoint="portal"):
+        await self.acquire_async()
+        self.metrics.add_gauge("in_flight", 1, endpoint=endpoint)
+        ticket = RequestTicket()
+        start = time.monotonic()
+        try:
+            yield ticket
+        except BaseException:
+            self._record(endpoint, start, False)
+            raise
+        self._record(endpoint, start, ticket.ok)
+
+    def snapshot(self):
+        with self._cond:
+            snapshot = {"rate": self.bucket.rate, "concurrency": int(self.limit), "in_flight": self.in_flight}
+        self.metrics.set_gauge("limiter_rate", snapshot["rate"])
+        self.metrics.set_gauge("limiter_concurrency", snapshot["concurrency"])
+        return snapshot
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """Return the process-wide rate limiter shared by every request path"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+    return _limiter
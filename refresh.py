@@ -0,0 +1,243 @@
+# refresh.py
+
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from config import FETCH_MODE, OUTPUT_DIR, REFRESH_SAMPLE_RATE, REFRESH_MIN_SAMPLE, REFRESH_FRONTIER
+from discovery import PlotRangeDiscovery, linear_sweep_cost
+from hierarchy import resolve_location
+from plot_store import PlotStore, COORD_FIELDS
+from plot_stream import rewrite_stream
+from scraper import VillageScraper
+from utils import setup_logging, ensure_directories, load_village_data, finalize_village_data
+
+def plot_sheet(plot):
+    """Sheet number of a saved plot; its gisCode ends with the two-digit sheet number"""
+    suffix = str(plot["gisCode"])[-2:]
+    return str(int(suffix)) if suffix.isdigit() else None
+
+def same_plot(old, new):
+    return old["gisCode"] == new["gisCode"] and all(old[field] == new[field] for field in COORD_FIELDS)
+
+def diff_plots(old, new):
+    """Added, removed and changed plots between two {plot_no: plot} maps"""
+    return {
+        "added": [new[key] for key in sorted(new.keys() - old.keys(), key=int)],
+        "removed": [old[key] for key in sorted(old.keys() - new.keys(), key=int)],
+        "changed": [
+            {"old": old[key], "new": new[key]}
+            for key in sorted(old.keys() & new.keys(), key=int) if not same_plot(old[key], new[key])
+        ]
+    }
+
+class VillageRefresher:
+    """
+    Cheap re-crawl of an already scraped village.
+
+    Each known sheet gets a random sample of its plot range plus the
+    frontier just past its last known plot, fetched fresh from the portal.
+    Only a sheet whose sample disagrees with the saved data, or whose
+    frontier holds new plots, is re-discovered in full. Sheets the portal
+    lists that were never crawled are discovered from scratch.
+
+    A re-scan probes every plot up to the highest one known before or
+    found now, so a saved plot is only reported removed once the portal has
+    answered for it; plots whose probes failed are kept as they were.
+    """
+
+    def __init__(self, scraper, sample_rate=REFRESH_SAMPLE_RATE, min_sample=REFRESH_MIN_SAMPLE,
+                 frontier=REFRESH_FRONTIER, seed=None):
+        self.scraper = scraper
+        self.sample_rate = sample_rate
+        self.min_sample = min_sample
+        self.frontier = frontier
+        self._random = random.Random(seed)
+
+    def _probe(self, village_no, sheet_no, plot_nos, found, failed):
+        """Probe plots fresh, collecting the ones found into `found` (a PlotStore) and failed ones into `failed`"""
+        results = list(self.scraper._fetch_batch(village_no, sheet_no, plot_nos, found))
+        failed.update(result["plot_no"] for result in results if result.get("failed"))
+        return {result["plot_no"]: result for result in results}
+
+    def refresh_sheet(self, village_no, sheet_no, old_plots, max_plot):
+        """
+        Refresh one sheet.
+
+        Args:
+            old_plots (dict): Saved plots of the sheet, keyed by str(plot_no)
+            max_plot (int): Stored max_plot_found of the sheet (0 if never crawled)
+
+        Returns:
+            dict: The sheet's current plots (old_plots when no drift was seen),
+            its max_plot_found and the probing stats
+        """
+        found = PlotStore()
+        failed = set()
+        probed = set()
+        drift = max_plot == 0
+
+        if not drift:
+            sample_size = min(max_plot, max(self.min_sample, int(max_plot * self.sample_rate)))
+            sample = self._random.sample(range(1, max_plot + 1), sample_size)
+            frontier = range(max_plot + 1, max_plot + 1 + self.frontier)
+            results = self._probe(village_no, sheet_no, sample + list(frontier), found, failed)
+            probed.update(results)
+
+            for plot_no in sample:
+                result = results[plot_no]
+                if result.get("failed"):
+                    continue
+                old = old_plots.get(str(plot_no))
+                if (plot_no in found) != (old is not None) or (old is not None and not same_plot(old, found[plot_no])):
+                    drift = True
+                    break
+            drift = drift or any(plot_no in found for plot_no in frontier)
+
+        stats = {"sampled": len(probed), "escalated": drift, "requests": len(probed), "failed": len(failed)}
+        if not drift:
+            return {"plots": old_plots, "max_plot": max_plot, "stats": stats}
+
+        logging.info(f"Sheet {sheet_no} in Village {village_no} drifted; re-scanning it")
+        probe = lambda plot_nos: self._probe(village_no, sheet_no, plot_nos, found, failed).values()
+        discovery = PlotRangeDiscovery(probe, prior=max_plot, probed=probed)
+        discovery_stats = discovery.run()
+        stats["requests"] += discovery_stats["requests"]
+
+        # Discovery only scans the gap past the new last plot; a sheet that shrank needs the rest of its old range
+        known_max = max([max_plot] + [int(plot_no) for plot_no in old_plots])
+        rest = [plot_no for plot_no in range(1, known_max + 1) if plot_no not in discovery.probed]
+        if rest:
+            probe(rest)
+            stats["requests"] += len(rest)
+
+        plots = found.to_dict()
+        for plot_no in failed:
+            if str(plot_no) in old_plots:
+                plots[str(plot_no)] = old_plots[str(plot_no)]
+        stats["failed"] = len(failed)
+        max_found = max([discovery.max_plot_found] + [int(plot_no) for plot_no in plots])
+        return {"plots": plots, "max_plot": max_found, "stats": stats}
+
+    def refresh_village(self, village_no):
+        """
+        Refresh a village, rewrite its output and return the diff.
+
+        Returns:
+            dict: added / removed / changed plots, per-sheet stats, and the
+            requests spent against a full crawl's estimate
+        """
+        checkpoints = self.scraper.checkpoints
+        key = self.scraper.village_key(village_no)
+        old = load_village_data(key)
+        by_sheet = {}
+        for plot_key, plot in old.items():
+            by_sheet.setdefault(plot_sheet(plot), {})[plot_key] = plot
+
+        sheet_nos = self.scraper.get_sheet_numbers(village_no)
+        done = checkpoints.processed_sheets(key)
+        new = {}
+        sheets = {}
+        full_estimate = 0
+
+        for sheet_no in sheet_nos:
+            max_plot = done.get(sheet_no) or checkpoints.prior(key, sheet_no)
+            result = self.refresh_sheet(village_no, sheet_no, by_sheet.get(sheet_no, {}), max_plot)
+            new.update(result["plots"])
+            sheets[sheet_no] = result["stats"]
+            full_estimate += linear_sweep_cost(result["max_plot"])
+            if result["stats"]["escalated"]:
+                checkpoints.mark_sheet_done(key, sheet_no, result["max_plot"])
+
+        # Plots on sheets the portal no longer lists are kept, not reported as removed
+        for sheet_no, plots in by_sheet.items():
+            if sheet_no not in sheet_nos:
+                new.update(plots)
+
+        diff = diff_plots(old, new)
+        if diff["added"] or diff["removed"] or diff["changed"]:
+            # Unchanged sheets are merged in above; the log is swapped whole, never truncated in place
+            rewrite_stream(key, (new[plot_key] for plot_key in sorted(new, key=int)))
+            finalize_village_data(key)
+
+        requests = sum(stats["requests"] for stats in sheets.values())
+        diff["metadata"] = {
+            "village_number": village_no,
+            "timestamp": datetime.now().isoformat(),
+            "requests": requests,
+            "full_crawl_estimate": full_estimate,
+            "sheets": sheets
+        }
+        logging.info(
+            f"Refreshed village {village_no} with {requests} requests (full crawl ~{full_estimate}): "
+            f"{len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed"
+        )
+        return diff
+
+def save_diff(village_no, diff):
+    """Write the refresh diff next to the village data (village_no is its village key)"""
+    filename = os.path.join(OUTPUT_DIR, f"village_{village_no}_diff.json")
+    try:
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(diff, f, indent=4, ensure_ascii=False)
+        return filename
+    except Exception as e:
+        logging.error(f"Error saving diff for village {village_no}: {e}")
+        return None
+
+def refresh_villages(villages, fetch_mode=FETCH_MODE, location=None, seed=None):
+    """
+    Refresh several villages, saving a diff for each. Villages are numbers
+    under `location`, or placed through the hierarchy index when it is
+    None, or "d,t,r,v" paths.
+
+    Returns:
+        dict: village as given -> its diff
+    """
+    setup_logging()
+    ensure_directories()
+    refreshers = {}
+    diffs = {}
+    try:
+        for village in villages:
+            if location is None or "," in str(village):
+                village_location, village_no = resolve_location(village)
+            else:
+                village_location, village_no = location, village
+            if village_location not in refreshers:
+                scraper = VillageScraper(fetch_mode=fetch_mode, location=village_location, read_cache=False)
+                refreshers[village_location] = VillageRefresher(scraper, seed=seed)
+            refresher = refreshers[village_location]
+
+            start = time.monotonic()
+            try:
+                diffs[village] = refresher.refresh_village(village_no)
+            except Exception as e:
+                logging.error(f"Error refreshing village {village_location},{village_no}: {e}")
+                continue
+            save_diff(refresher.scraper.village_key(village_no), diffs[village])
+            logging.info(f"Village {village_location},{village_no} refreshed in {time.monotonic() - start:.1f}s")
+    finally:
+        for refresher in refreshers.values():
+            refresher.scraper.close()
+    return diffs
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh scraped villages")
+    parser.add_argument("villages", nargs="+", help='Village numbers or "d,t,r,v" paths')
+    parser.add_argument("--location", help="district,tehsil,RI prefix (default: from the hierarchy index)")
+    parser.add_argument("--fetch-mode", default=FETCH_MODE, choices=["thread", "async"])
+    args = parser.parse_args()
+
+    for village_no, diff in refresh_villages(args.villages, args.fetch_mode, args.location).items():
+        meta = diff["metadata"]
+        print(
+            f"Village {village_no}: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+            f"{len(diff['changed'])} changed ({meta['requests']} requests, full crawl ~{meta['full_crawl_estimate']})"
+        )
+
+if __name__ == "__main__":
+    main()
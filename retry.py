@@ -0,0 +1,141 @@
+# retry.py
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import requests
+from contextlib import closing
+from config import RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, DEAD_LETTER_FILE, MAX_CONSECUTIVE_FAILED
+
+# Statuses worth retrying: the server is overloaded or briefly unavailable. Other
+# 4xx answers will not change on a retry; 429 is throttling, not a bad request
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+class SheetAborted(Exception):
+    """Too many plots of a sheet failed in a row; the sheet is left unfinished"""
+
+def is_transient_status(status_code):
+    return status_code in TRANSIENT_STATUSES
+
+def is_transient_exception(exc):
+    """
+    Timeouts and dropped connections are transient; anything else, including
+    an undecodable body, is permanent.
+    """
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                        asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import aiohttp
+    except ImportError:
+        return False
+    return isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Exponential backoff with full jitter for the given 0-based attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def should_retry(attempt, transient, max_attempts=RETRY_MAX_ATTEMPTS):
+    return transient and attempt + 1 < max_attempts
+
+def abort_on_failures(results, limit=MAX_CONSECUTIVE_FAILED):
+    """
+    Pass fetch results through, raising SheetAborted once `limit` of them in
+    a row were dead-lettered. `results` (a generator) is closed either way.
+    """
+    failed = 0
+    with closing(results):
+        for result in results:
+            failed = failed + 1 if result.get("failed") else 0
+            if failed >= limit:
+                raise SheetAborted(f"{failed} plots in a row failed")
+            yield result
+
+class DeadLetterLog:
+    """
+    Append-only JSON Lines record of plot probes that kept failing.
+    Entries are written with a single O_APPEND write, so threads and worker
+    processes can share the file.
+    """
+
+    def __init__(self, path=DEAD_LETTER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def add(self, location, village_no, sheet_no, plot_no, error, attempts):
+        entry = {
+            "location": location,
+            "village": village_no,
+            "sheet": sheet_no,
+            "plot_no": plot_no,
+            "error": str(error),
+            "attempts": attempts,
+            "time": time.time()
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def take(self):
+        """
+        Move current entries aside for replay and return them, including any
+        left over from an interrupted replay. Plots that fail again during
+        the replay are dead-lettered afresh.
+        """
+        replaying = self.path + ".replaying"
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as src, open(replaying, "ab") as dst:
+                dst.write(src.read())
+            os.remove(self.path)
+
+        entries = []
+        if os.path.exists(replaying):
+            with open(replaying, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return entries
+
+    def finish_replay(self):
+        """Drop the entries taken by take() once the replay has run"""
+        replaying = self.path + ".replaying"
+        if os.path.exists(replaying):
+            os.remove(replaying)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dead-letter tools for failed plot probes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="Re-probe only the plots in the dead-letter file")
+    replay.add_argument("--fetch-mode", default=None, choices=["thread", "async"])
+    commands.add_parser("show", help="Count dead-lettered plots per village and sheet")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        counts = {}
+        if os.path.exists(DEAD_LETTER_FILE):
+            with open(DEAD_LETTER_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    key = (entry["location"], entry["village"], entry["sheet"])
+                    counts[key] = counts.get(key, 0) + 1
+        for (location, village_no, sheet_no), count in sorted(counts.items()):
+            print(f"{location} village {village_no} sheet {sheet_no}: {count} plots")
+        return
+
+    from runner import replay_failed_plots
+    results = replay_failed_plots(**({"fetch_mode": args.fetch_mode} if args.fetch_mode else {}))
+    print(f"Replayed {results['replayed']} plots: {results['recovered']} recovered, "
+          f"{results['found']} with data, {results['still_failing']} still failing")
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,45 @@
 # runner.py
 
-from utils import setup_logging, ensure_directories
+from utils import setup_logging, ensure_directories, finalize_village_data, village_key
 from scraper import VillageScraper
 from init import initialize_scraper
+from retry import DeadLetterLog
+from hierarchy import resolve_location
+import metrics
+from config import FETCH_MODE
+from collections import defaultdict
 import logging
 
-def extract_village_data(village_number, fresh_start=True):
+def extract_village_data(village_number, fresh_start=True, fetch_mode=FETCH_MODE, location=None,
+                         on_plot=None, on_sheet_done=None):
     """
     Extract plot details for a specific village and save to JSON file.
     
     Args:
-        village_number (str): The village number to scrape
+        village_number (str): The village number to scrape, or a "d,t,r,v" path
         fresh_start (bool): Whether to initialize fresh files before starting
+        fetch_mode (str): "thread" or "async" fetch engine
+        location (str): district,tehsil,RI prefix of the village (default:
+            looked up in the hierarchy index)
+        on_plot, on_sheet_done (callable): Crawl hooks (see VillageScraper)
         
     Returns:
         dict: The scraped data if successful, None if failed
     """
+    if location is None or "," in str(village_number):
+        location, village_number = resolve_location(village_number)
+
     if fresh_start:
         # Initialize fresh files
-        initialize_scraper()
+        initialize_scraper(village_key(location, village_number))
     
     # Setup logging and directories
     setup_logging()
     ensure_directories()
+    metrics.start_exporters()
     
     # Initialize scraper
-    scraper = VillageScraper()
+    scraper = VillageScraper(fetch_mode=fetch_mode, location=location, on_plot=on_plot, on_sheet_done=on_sheet_done)
     logging.info(f"Starting scrape for village {village_number}")
     
     try:
@@ -43,3 +57,57 @@ def extract_village_data(village_number, fresh_start=True):
     except Exception as e:
         logging.error(f"Error while scraping village {village_number}: {e}")
         return None
+
+    finally:
+        scraper.close()
+        metrics.flush()
+
+def replay_failed_plots(fetch_mode=FETCH_MODE):
+    """
+    Re-probe only the plots recorded in the dead-letter file.
+
+    Recovered plots are appended to their village's plot log and the village
+    JSON is rebuilt; plots that fail again are dead-lettered afresh.
+
+    Returns:
+        dict: Counts of replayed, recovered, found and still failing plots
+    """
+    setup_logging()
+    ensure_directories()
+    metrics.start_exporters()
+
+    dead_letters = DeadLetterLog()
+    groups = defaultdict(set)
+    for entry in dead_letters.take():
+        groups[(entry["location"], entry["village"], entry["sheet"])].add(entry["plot_no"])
+
+    results = {"replayed": 0, "recovered": 0, "found": 0, "still_failing": 0}
+    scrapers = {}
+    villages = set()
+
+    try:
+        for (location, village_no, sheet_no), plot_nos in groups.items():
+            if location not in scrapers:
+                scrapers[location] = VillageScraper(fetch_mode=fetch_mode, location=location)
+            logging.info(f"Replaying {len(plot_nos)} plots of village {village_no}, sheet {sheet_no}")
+
+            for result in scrapers[location].probe_plots(village_no, sheet_no, sorted(plot_nos)):
+                results["replayed"] += 1
+                if result.get("failed"):
+                    results["still_failing"] += 1
+                else:
+                    results["recovered"] += 1
+                    if result["has_data"] == "Y":
+                        results["found"] += 1
+            villages.add(village_key(location, village_no))
+
+        for key in villages:
+            finalize_village_data(key)
+        dead_letters.finish_replay()
+
+    finally:
+        for scraper in scrapers.values():
+            scraper.close()
+        metrics.flush()
+
+    return results
@@ -0,0 +1,238 @@
+# scheduler.py
+
+import argparse
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from config import (FETCH_MODE, DISCOVERY_CLUSTER, SCHEDULER_SLOTS,
+                    SCHEDULER_ACTIVE_SHEETS, SCHEDULER_DEFAULT_YIELD, SCHEDULER_OCCUPANCY,
+                    SCHEDULER_PRIOR_WEIGHT, SCHEDULER_AGING)
+from hierarchy import resolve_location
+from discovery import gap_scan_cost
+from refresh import plot_sheet
+from retry import SheetAborted
+from scraper import VillageScraper
+import metrics
+from utils import setup_logging, ensure_directories, finalize_village_data, iter_village_plots
+
+class BudgetExhausted(Exception):
+    """The crawl's request budget cannot cover another probe chunk"""
+
+def expected_yield(prior_max, prior_found=None):
+    """
+    Plots per request expected from a sheet whose earlier crawl ended at
+    prior_max, having found prior_found plots (assumed SCHEDULER_OCCUPANCY
+    of the range when unknown). Discovery probes 1..prior_max densely, plus
+    its prior sample and the sampled gap scan past the last plot.
+    """
+    overhead = DISCOVERY_CLUSTER + gap_scan_cost()
+    if prior_found is None:
+        prior_found = SCHEDULER_OCCUPANCY * prior_max
+    return prior_found / (prior_max + overhead)
+
+class SheetEstimate:
+    """Running plots-per-request estimate of a sheet, starting from its prior"""
+
+    def __init__(self, prior_rate, weight=SCHEDULER_PRIOR_WEIGHT):
+        self.prior_rate = prior_rate
+        self.weight = weight
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def rate(self):
+        return (self.hits + self.weight * self.prior_rate) / (self.probes + self.weight)
+
+    def record(self, probes, hits):
+        self.probes += probes
+        self.hits += hits
+
+class YieldScheduler:
+    """
+    Hands out probe-chunk turns to sheets crawled concurrently.
+
+    At most `slots` chunks are in flight. A free slot goes to the waiting
+    sheet with the highest expected plots per request, plus `aging` per
+    second it has waited, so a cold sheet is deferred but never starved.
+    Once `budget` requests have been granted, further chunks raise
+    BudgetExhausted.
+    """
+
+    def __init__(self, slots=SCHEDULER_SLOTS, budget=None, aging=SCHEDULER_AGING):
+        self.slots = slots
+        self.budget = budget
+        self.aging = aging
+        self.spent = 0
+        self.estimates = {}
+        self._waiting = {}
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def register(self, key, prior_rate):
+        with self._cond:
+            self.estimates[key] = SheetEstimate(prior_rate)
+        return self.estimates[key]
+
+    def _best(self, now):
+        return max(
+            self._waiting,
+            key=lambda ticket: self._waiting[ticket][0].rate + self.aging * (now - self._waiting[ticket][1])
+        )
+
+    def probe(self, key, plot_nos, probe):
+        """
+        Run probe(plot_nos) for a sheet once it is granted a turn.
+
+        Returns:
+            list: The probe results
+        """
+        estimate = self.estimates.get(key) or self.register(key, SCHEDULER_DEFAULT_YIELD)
+        ticket = object()
+        with self._cond:
+            self._waiting[ticket] = (estimate, time.monotonic())
+            try:
+                while True:
+                    if self.budget is not None and self.spent + len(plot_nos) > self.budget:
+                        raise BudgetExhausted()
+                    if self._running < self.slots and self._best(time.monotonic()) is ticket:
+                        break
+                    # Timed wait: priorities age even when nothing finishes
+                    self._cond.wait(timeout=1.0)
+            finally:
+                del self._waiting[ticket]
+                self._cond.notify_all()
+            self._running += 1
+            self.spent += len(plot_nos)
+
+        try:
+            results = list(probe(plot_nos))
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+        hits = sum(1 for result in results if result["success"] and result["has_data"] == "Y")
+        with self._cond:
+            estimate.record(len(results), hits)
+        metrics.get_metrics().inc("scheduled_probes_total", len(results))
+        return results
+
+def _sheet_priors(scraper, village_no, sheet_nos):
+    """Expected yield of each sheet: from its earlier crawl, else the village's mean, else the default"""
+    key = scraper.village_key(village_no)
+    priors = scraper.checkpoints.priors(key)
+    found = Counter(plot_sheet(plot) for plot in iter_village_plots(key)) if priors else Counter()
+    known = {
+        sheet_no: expected_yield(priors[sheet_no], found[sheet_no] if found else None)
+        for sheet_no in sheet_nos if sheet_no in priors
+    }
+    fallback = sum(known.values()) / len(known) if known else SCHEDULER_DEFAULT_YIELD
+    return {sheet_no: known.get(sheet_no, fallback) for sheet_no in sheet_nos}
+
+def crawl_scheduled(village_nos, budget=None, active_sheets=SCHEDULER_ACTIVE_SHEETS, slots=SCHEDULER_SLOTS,
+                    fetch_mode=FETCH_MODE):
+    """
+    Crawl the unfinished sheets of several villages together, probe chunks
+    going to the sheets with the highest expected yield per request first.
+
+    Sheets start in order of expected yield, active_sheets at a time, and
+    run adaptive discovery with every chunk scheduled. When the budget runs
+    out, unfinished sheets keep their checkpoints for the next run; a
+    village is finalized once all of its sheets are done.
+
+    Returns:
+        dict: Requests spent, sheets done, deferred and aborted, and the "d,t,r,v" paths of finalized villages
+    """
+    setup_logging()
+    ensure_directories()
+    metrics.start_exporters()
+    scheduler = YieldScheduler(slots=slots, budget=budget)
+    scrapers = {}
+    tasks = []
+    villages = {}
+
+    try:
+        with ExitStack() as stack:
+            for village in village_nos:
+                location, village_no = resolve_location(village)
+                if location not in scrapers:
+                    scrapers[location] = VillageScraper(
+                        fetch_mode=fetch_mode, discovery_mode="adaptive", location=location, scheduler=scheduler
+                    )
+                scraper = scrapers[location]
+                sheet_nos = scraper.get_sheet_numbers(village_no)
+                if not sheet_nos:
+                    logging.error(f"No sheets found for village {village_no}; skipping it")
+                    continue
+                done = scraper.checkpoints.processed_sheets(scraper.village_key(village_no))
+                # Priors read the earlier output, before a fresh plot log replaces it
+                for sheet_no, rate in _sheet_priors(scraper, village_no, sheet_nos).items():
+                    if sheet_no not in done:
+                        # Village numbers repeat across RIs, so sheets are keyed by location too
+                        scheduler.register((location, village_no, sheet_no), rate)
+                        tasks.append((rate, location, village_no, sheet_no))
+
+                fresh = not scraper.checkpoints.has_progress(scraper.village_key(village_no))
+                stack.enter_context(scraper._village_writer(village_no, fresh=fresh))
+                villages[location, village_no] = (scraper, sheet_nos)
+
+            tasks.sort(key=lambda task: -task[0])
+            logging.info(f"Scheduling {len(tasks)} sheets across {len(villages)} villages (budget: {budget})")
+            deferred = []
+            aborted = []
+
+            def run_sheet(location, village_no, sheet_no):
+                scraper, _ = villages[location, village_no]
+                try:
+                    scraper.process_sheet(village_no, sheet_no)
+                except BudgetExhausted:
+                    deferred.append((location, village_no, sheet_no))
+                    logging.info(f"Request budget spent; deferring sheet {sheet_no} in Village {location},{village_no}")
+                except SheetAborted as e:
+                    aborted.append((location, village_no, sheet_no))
+                    logging.error(
+                        f"Sheet {sheet_no} in Village {location},{village_no} aborted ({e}); it resumes on the next run"
+                    )
+
+            with ThreadPoolExecutor(max_workers=active_sheets) as executor:
+                for future in [executor.submit(run_sheet, *task[1:]) for task in tasks]:
+                    future.result()
+
+        finalized = []
+        for (location, village_no), (scraper, sheet_nos) in villages.items():
+            key = scraper.village_key(village_no)
+            if all(sheet_no in scraper.checkpoints.processed_sheets(key) for sheet_no in sheet_nos):
+                finalize_village_data(key)
+                finalized.append(f"{location},{village_no}")
+
+        results = {
+            "requests": scheduler.spent,
+            "sheets_done": len(tasks) - len(deferred) - len(aborted),
+            "sheets_deferred": len(deferred),
+            "sheets_aborted": len(aborted),
+            "villages_finalized": finalized
+        }
+        logging.info(f"Scheduled crawl finished: {results}")
+        return results
+
+    finally:
+        for scraper in scrapers.values():
+            scraper.close()
+        metrics.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl villages with sheets prioritised by expected yield")
+    parser.add_argument("villages", nargs="+", help='Village numbers or "d,t,r,v" paths')
+    parser.add_argument("--budget", type=int, help="Plot requests to spend before deferring the remaining sheets")
+    parser.add_argument("--active-sheets", type=int, default=SCHEDULER_ACTIVE_SHEETS)
+    parser.add_argument("--slots", type=int, default=SCHEDULER_SLOTS, help="Probe chunks in flight")
+    parser.add_argument("--fetch-mode", default=FETCH_MODE, choices=["thread", "async"])
+    args = parser.parse_args()
+
+    print(crawl_scheduled(args.villages, args.budget, args.active_sheets, args.slots, args.fetch_mode))
+
+if __name__ == "__main__":
+    main()
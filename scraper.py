@@ -1,19 +1,167 @@
 # scraper.py
 
 import requests
+import asyncio
+import itertools
+import threading
 import time
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from html_options import extract_options
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing, contextmanager
 import logging
 from config import *
-from utils import save_village_data, save_state, load_state
+from utils import finalize_village_data, village_key
+from checkpoint import CheckpointStore
+from plot_stream import PlotStreamWriter
+from plot_store import PlotBitmap
+from discovery import PlotRangeDiscovery
+from cache import get_cache
+from rate_limiter import get_limiter
+from metrics import get_metrics, profiled
+from retry import (DeadLetterLog, SheetAborted, abort_on_failures, is_transient_status, is_transient_exception,
+                   should_retry, backoff_delay)
+
+plot_log = logging.getLogger(PLOT_LOGGER)
 
 class VillageScraper:
-    def __init__(self):
+    def __init__(self, fetch_mode=FETCH_MODE, discovery_mode=DISCOVERY_MODE, location=DEFAULT_LOCATION,
+                 limiter=None, on_plot=None, on_sheet_done=None, read_cache=True, scheduler=None):
+        """
+        on_plot(village_no, sheet_no, plot) is called for every plot found
+        and on_sheet_done(village_no, sheet_no, resumed) once a sheet is
+        finished, resumed being True when part of it was crawled by an
+        earlier run. on_plot runs on the probe workers (in async mode on an
+        executor thread, never on the event loop) and may block them, which
+        throttles the crawl; on_sheet_done runs on the thread crawling the
+        sheet.
+        read_cache=False makes every probe go to the portal (responses are
+        still written to the cache), as a refresh needs. With a scheduler
+        (see scheduler.YieldScheduler), every probe chunk of adaptive
+        discovery waits for a turn from it.
+        """
+        self.location = location
+        self.on_plot = on_plot
+        self.on_sheet_done = on_sheet_done
+        self.limiter = limiter or get_limiter()
+        self.probe_count = 0
         self.visited_plots = {}
-        self.state = load_state()
+        self.writers = {}
+        self.checkpoints = CheckpointStore()
+        self.fetch_mode = fetch_mode
+        self.discovery_mode = discovery_mode
+        self.discovery_stats = {"requests": 0, "linear_estimate": 0, "saved": 0}
+        self.cache = get_cache()
+        self.read_cache = read_cache
+        self.scheduler = scheduler
+        self.dead_letters = DeadLetterLog()
+        self.metrics = get_metrics()
+        self.sheet_tallies = {}
+        self._tally_lock = threading.Lock()
+
+        # Keep-alive connections shared by every worker thread
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Long-lived probe workers: an event loop in async mode, a thread pool otherwise
+        self.engine = None
+        self.executor = None
+        if fetch_mode == "async":
+            from async_engine import AsyncPlotFetcher
+            self.engine = AsyncPlotFetcher()
+            # The engine's semaphore and connector bound the probes actually in flight
+            self.probe_window = ASYNC_MAX_IN_FLIGHT
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            self.probe_window = PIPELINE_WINDOW
+
+    def close(self):
+        """Release pooled connections held by the scraper"""
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.session.close()
+        self.checkpoints.close()
+
+    def village_key(self, village_no):
+        """Key of a village's checkpoints and files (see utils.village_key)"""
+        return village_key(self.location, village_no)
+
+    def _plot_params(self, village_no, sheet_no, plot_no):
+        params = BASE_PARAMS.copy()
+        params["levels"] = f"{self.location},{village_no},{sheet_no},"
+        params["plotno"] = plot_no
+        return params
+
+    def _tally(self, village_no, sheet_no, outcome):
+        """Count a plot outcome towards its sheet's summary and metrics"""
+        with self._tally_lock:
+            tally = self.sheet_tallies.setdefault((village_no, sheet_no), {"found": 0, "empty": 0, "failed": 0})
+            tally[outcome] += 1
+        self.metrics.inc("plots_total", village=village_no, sheet=sheet_no, outcome=outcome)
 
-    def fetch_plot_data(self, village_no, sheet_no, plot_no, vil_json):
+    @staticmethod
+    def _parse_plot(plot_no, response_data):
+        """The plot record of a plot response, None if it has no data; raises KeyError if it is malformed"""
+        if response_data.get("has_data", "N") != "Y":
+            return None
+        return {
+            "plot_no": plot_no,
+            "xmax": response_data["xmax"],
+            "xmin": response_data["xmin"],
+            "ymin": response_data["ymin"],
+            "ymax": response_data["ymax"],
+            "center_x": response_data["center_x"],
+            "center_y": response_data["center_y"],
+            "gisCode": response_data["gisCode"]
+        }
+
+    def _handle_plot_response(self, village_no, sheet_no, plot_no, response_data, plot, found=None,
+                              from_cache=False):
+        """Record a parsed plot response in the plot log (and `found`, if given) and build the fetch result"""
+        has_data = response_data.get("has_data", "N")
+        self._tally(village_no, sheet_no, "found" if has_data == "Y" else "empty")
+
+        if plot is not None:
+            if found is not None:
+                found.add(plot)
+            if village_no in self.writers:
+                self.writers[village_no].write(plot)
+            if self.on_plot is not None:
+                self.on_plot(village_no, sheet_no, plot)
+            plot_log.debug("Found Plot %s in Village %s, Sheet %s", plot_no, village_no, sheet_no)
+
+            if village_no not in self.visited_plots:
+                self.visited_plots[village_no] = PlotBitmap()
+            self.visited_plots[village_no].add(plot_no)
+
+        if self.cache is not None and not from_cache:
+            params = self._plot_params(village_no, sheet_no, plot_no)
+            self.cache.put("plot_pos" if has_data == "Y" else "plot_neg", API_URL, params, response_data)
+
+        return {
+            "success": True, 
+            "has_data": has_data, 
+            "plot_no": plot_no, 
+            "max_plot": plot_no if has_data == "Y" else 0
+        }
+
+    def _give_up(self, village_no, sheet_no, plot_no, error, attempts):
+        """Dead-letter a plot that could not be fetched and build its failed result"""
+        logging.error(
+            f"Giving up on village {village_no}, sheet {sheet_no}, plot {plot_no} "
+            f"after {attempts} attempts: {error}"
+        )
+        self.dead_letters.add(self.location, village_no, sheet_no, plot_no, error, attempts)
+        self._tally(village_no, sheet_no, "failed")
+        return {"success": False, "has_data": "N", "plot_no": plot_no, "failed": True}
+
+    @profiled("fetch_plot_data")
+    def fetch_plot_data(self, village_no, sheet_no, plot_no, found=None):
         """
         Fetch data for a single plot
         
@@ -21,120 +169,335 @@ class VillageScraper:
             village_no (str): Village number
             sheet_no (str): Sheet number
             plot_no (int): Plot number
-            vil_json (dict): Dictionary to store plot data
+            found (PlotStore): Optionally collects the plot if it has data;
+                crawls leave it out and keep plots only in the plot log
             
         Returns:
-            dict: Result of the fetch operation
+            dict: Result of the fetch operation. "failed" is set when the plot
+            exhausted its retries and was dead-lettered rather than found empty.
         """
-        if plot_no in self.visited_plots.get(village_no, set()):
+        if plot_no in self.visited_plots.get(village_no, ()):
             return {"success": False, "has_data": "N", "plot_no": plot_no}
 
-        params = BASE_PARAMS.copy()
-        params["levels"] = f"1,1,2,{village_no},{sheet_no},"
-        params["plotno"] = plot_no
+        params = self._plot_params(village_no, sheet_no, plot_no)
+        cached = self.cache.get(API_URL, params) if self.cache is not None and self.read_cache else None
+        if cached is not None:
+            return self._handle_plot_response(
+                village_no, sheet_no, plot_no, cached, self._parse_plot(plot_no, cached), found, from_cache=True
+            )
+
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            try:
+                with self.limiter.request("plot") as ticket:
+                    response = self.session.get(API_URL, params=params, timeout=TIMEOUT_SECONDS)
+                    ticket.ok = response.status_code == 200
+                self.metrics.inc("bytes_total", len(response.content), endpoint="plot")
+                if response.status_code == 200:
+                    response_data = response.json()
+                    plot = self._parse_plot(plot_no, response_data)
+                    break
+                error = f"Status {response.status_code}"
+                transient = is_transient_status(response.status_code)
+
+            except Exception as e:
+                error = "Timeout" if isinstance(e, requests.exceptions.Timeout) else e
+                transient = is_transient_exception(e)
 
+            if not should_retry(attempt, transient):
+                return self._give_up(village_no, sheet_no, plot_no, error, attempt + 1)
+            self.metrics.inc("retries_total", endpoint="plot")
+            time.sleep(backoff_delay(attempt))
+
+        # Outside the retry loop: an error from the plot log or on_plot stops the crawl instead of dead-lettering
+        return self._handle_plot_response(village_no, sheet_no, plot_no, response_data, plot, found)
+
+    async def _off_loop(self, func, *args, **kwargs):
+        """Run blocking work (SQLite, file writes, hooks) on a worker thread, not the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def fetch_plot_data_async(self, village_no, sheet_no, plot_no, found=None):
+        """Async counterpart of fetch_plot_data, run on the engine's event loop"""
+        if plot_no in self.visited_plots.get(village_no, ()):
+            return {"success": False, "has_data": "N", "plot_no": plot_no}
+
+        params = self._plot_params(village_no, sheet_no, plot_no)
+        cached = None
+        if self.cache is not None and self.read_cache:
+            cached = await self._off_loop(self.cache.get, API_URL, params)
+        if cached is not None:
+            return await self._off_loop(
+                self._handle_plot_response, village_no, sheet_no, plot_no, cached,
+                self._parse_plot(plot_no, cached), found, from_cache=True
+            )
+
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            try:
+                async with self.limiter.request_async("plot") as ticket:
+                    status_code, size, response_data = await self.engine.get_json(params, API_URL)
+                    ticket.ok = status_code == 200
+                self.metrics.inc("bytes_total", size, endpoint="plot")
+                if status_code == 200:
+                    plot = self._parse_plot(plot_no, response_data)
+                    break
+                error = f"Status {status_code}"
+                transient = is_transient_status(status_code)
+
+            except Exception as e:
+                error = "Timeout" if isinstance(e, asyncio.TimeoutError) else e
+                transient = is_transient_exception(e)
+
+            if not should_retry(attempt, transient):
+                return await self._off_loop(self._give_up, village_no, sheet_no, plot_no, error, attempt + 1)
+            self.metrics.inc("retries_total", endpoint="plot")
+            await asyncio.sleep(backoff_delay(attempt))
+
+        return await self._off_loop(
+            self._handle_plot_response, village_no, sheet_no, plot_no, response_data, plot, found
+        )
+
+    def _submit_probe(self, village_no, sheet_no, plot_no, found=None):
+        """Start one plot probe on the long-lived workers, returning a concurrent Future"""
+        self.probe_count += 1
+        if self.engine is not None:
+            return self.engine.submit(self.fetch_plot_data_async(village_no, sheet_no, plot_no, found))
+        return self.executor.submit(self.fetch_plot_data, village_no, sheet_no, plot_no, found)
+
+    def _fetch_batch(self, village_no, sheet_no, plot_nos, found=None, window=None):
+        """
+        Yield fetch results for plot_nos as they complete.
+
+        Keeps `window` probes in flight (probe_window by default), submitting
+        the next plot as soon as any probe completes. Closing the generator
+        cancels queued probes and waits for running ones.
+        """
+        pending = iter(plot_nos)
+        in_flight = {
+            self._submit_probe(village_no, sheet_no, plot_no, found)
+            for plot_no in itertools.islice(pending, window or self.probe_window)
+        }
         try:
-            response = requests.get(API_URL, params=params, timeout=TIMEOUT_SECONDS)
-            
-            if response.status_code != 200:
-                logging.error(f"Request failed for village {village_no}, sheet {sheet_no}, plot {plot_no}: Status {response.status_code}")
-                return {"success": False, "has_data": "N", "plot_no": plot_no}
-            
-            response_data = response.json()
-            has_data = response_data.get("has_data", "N")
-            
-            if has_data == "Y":
-                if village_no not in vil_json:
-                    vil_json[village_no] = {}
-
-                vil_json[village_no][str(plot_no)] = {
-                    "plot_no": plot_no,
-                    "xmax": response_data["xmax"],
-                    "xmin": response_data["xmin"],
-                    "ymin": response_data["ymin"],
-                    "ymax": response_data["ymax"],
-                    "center_x": response_data["center_x"],
-                    "center_y": response_data["center_y"],
-                    "gisCode": response_data["gisCode"]
-                }
-                logging.info(f"Found Plot {plot_no} in Village {village_no}, Sheet {sheet_no}")
-
-                if village_no not in self.visited_plots:
-                    self.visited_plots[village_no] = set()
-                self.visited_plots[village_no].add(plot_no)
-
-            return {
-                "success": True, 
-                "has_data": has_data, 
-                "plot_no": plot_no, 
-                "max_plot": plot_no if has_data == "Y" else 0
-            }
-
-        except requests.exceptions.Timeout:
-            logging.error(f"Timeout for village {village_no}, sheet {sheet_no}, plot {plot_no}")
-        except Exception as e:
-            logging.error(f"Error processing plot: {e}")
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    plot_no = next(pending, None)
+                    if plot_no is not None:
+                        in_flight.add(self._submit_probe(village_no, sheet_no, plot_no, found))
+                    yield future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            wait(in_flight)
 
-        return {"success": False, "has_data": "N", "plot_no": plot_no}
+    def _fetch_ordered(self, village_no, sheet_no, start_plot, window=None):
+        """
+        Yield results for plots start_plot, start_plot + 1, ... in plot order.
 
-    def process_sheet(self, village_no, sheet_no, vil_json):
-        """Process all plots in a sheet"""
-        if sheet_no in self.state["processed_sheets"].get(village_no, {}):
-            logging.info(f"Sheet {sheet_no} in Village {village_no} already processed. Skipping...")
-            return
+        Keeps `window` probes in flight (probe_window by default), topping the
+        window up as soon as any probe completes, so one slow plot delays only
+        its own result. Closing the generator cancels queued probes and waits
+        for running ones.
+        """
+        window = window or self.probe_window
+        in_flight = {}
+        completed = {}
+        next_submit = start_plot
+        next_yield = start_plot
 
+        try:
+            while True:
+                while len(in_flight) < window:
+                    in_flight[self._submit_probe(village_no, sheet_no, next_submit)] = next_submit
+                    next_submit += 1
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    completed[in_flight.pop(future)] = future.result()
+
+                while next_yield in completed:
+                    yield completed.pop(next_yield)
+                    next_yield += 1
+        finally:
+            for future in in_flight:
+                future.cancel()
+            wait(in_flight)
+
+    def _checkpoint_probes(self, village_no, sheet_no, plot_nos, max_plot_found, next_plot=None, consecutive_empty=0):
+        """Persist a finished batch, making sure its plots are on disk first"""
+        if village_no in self.writers:
+            self.writers[village_no].flush()
+        self.checkpoints.record_probes(
+            self.village_key(village_no), sheet_no, plot_nos, max_plot_found,
+            next_plot=next_plot, consecutive_empty=consecutive_empty
+        )
+
+    def _sweep_sheet(self, village_no, sheet_no):
+        """Probe plots 1..N in order until MAX_CONSECUTIVE_EMPTY misses in a row"""
         consecutive_empty = 0
         current_plot = 1
         max_plot_found = 0
 
-        while consecutive_empty < MAX_CONSECUTIVE_EMPTY:
-            logging.info(f"Processing plots {current_plot} to {current_plot + BATCH_SIZE - 1}")
-            
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {
-                    executor.submit(
-                        self.fetch_plot_data, 
-                        village_no, 
-                        sheet_no, 
-                        plot_no, 
-                        vil_json
-                    ): plot_no 
-                    for plot_no in range(current_plot, current_plot + BATCH_SIZE)
-                }
-
-                for future in as_completed(futures):
-                    result = future.result()
-                    if result["success"]:
-                        if result["has_data"] == "Y":
-                            consecutive_empty = 0
-                            max_plot_found = max(max_plot_found, result["max_plot"])
-                        else:
-                            consecutive_empty += 1
-                    else:
-                        consecutive_empty += 1
-
-            if consecutive_empty >= MAX_CONSECUTIVE_EMPTY:
-                logging.info(f"Reached {MAX_CONSECUTIVE_EMPTY} consecutive empty plots. Moving to next sheet.")
-                break
-
-            current_plot += BATCH_SIZE
-            time.sleep(1)  # Rate limiting
-
-        if village_no not in self.state["processed_sheets"]:
-            self.state["processed_sheets"][village_no] = {}
-        self.state["processed_sheets"][village_no][sheet_no] = max_plot_found
-        save_state(self.state)
+        progress = self.checkpoints.sheet_progress(self.village_key(village_no), sheet_no)
+        if progress:
+            logging.info(f"Resuming sheet {sheet_no} in Village {village_no} at plot {progress['next_plot']}")
+            consecutive_empty = progress["consecutive_empty"]
+            current_plot = progress["next_plot"]
+            max_plot_found = progress["max_plot"]
+
+        checkpoint_from = current_plot
+        with closing(abort_on_failures(self._fetch_ordered(village_no, sheet_no, current_plot))) as results:
+            for result in results:
+                if result["success"] and result["has_data"] == "Y":
+                    consecutive_empty = 0
+                    max_plot_found = max(max_plot_found, result["max_plot"])
+                elif not result.get("failed"):
+                    # Dead-lettered plots are unknown, not empty
+                    consecutive_empty += 1
+
+                current_plot = result["plot_no"] + 1
+                finished = consecutive_empty >= MAX_CONSECUTIVE_EMPTY
+                if finished or current_plot - checkpoint_from >= BATCH_SIZE:
+                    logging.debug(f"Sheet {sheet_no}: probed plots {checkpoint_from} to {current_plot - 1}")
+                    self._checkpoint_probes(
+                        village_no, sheet_no, range(checkpoint_from, current_plot), max_plot_found,
+                        next_plot=current_plot, consecutive_empty=consecutive_empty
+                    )
+                    checkpoint_from = current_plot
+
+                if finished:
+                    logging.info(f"Reached {MAX_CONSECUTIVE_EMPTY} consecutive empty plots. Moving to next sheet.")
+                    break
+
+        return max_plot_found
+
+    def _scheduled_probe(self, key, plot_nos, fetch):
+        """Yield results for plot_nos in BATCH_SIZE chunks, each waiting for a turn from the scheduler"""
+        plot_nos = list(plot_nos)
+        for start in range(0, len(plot_nos), BATCH_SIZE):
+            yield from self.scheduler.probe(key, plot_nos[start:start + BATCH_SIZE], fetch)
+
+    def _discover_sheet(self, village_no, sheet_no):
+        """Find and fill the occupied plot range with a dense fill and a sampled gap scan"""
+        key = self.village_key(village_no)
+        progress = self.checkpoints.sheet_progress(key, sheet_no)
+        fetch = lambda plot_nos: self._fetch_batch(village_no, sheet_no, plot_nos)
+        scheduled = lambda plot_nos: self._scheduled_probe((self.location, village_no, sheet_no), plot_nos, fetch)
+        probe = lambda plot_nos: abort_on_failures((fetch if self.scheduler is None else scheduled)(plot_nos))
+        discovery = PlotRangeDiscovery(
+            probe,
+            prior=self.checkpoints.prior(key, sheet_no),
+            probed=self.checkpoints.probed_plots(key, sheet_no) if progress else None,
+            max_plot_found=progress["max_plot"] if progress else 0,
+            on_probed=lambda plot_nos, max_plot_found: self._checkpoint_probes(
+                village_no, sheet_no, plot_nos, max_plot_found
+            )
+        )
+        stats = discovery.run()
+
+        with self._tally_lock:
+            for key in ("requests", "linear_estimate", "saved"):
+                self.discovery_stats[key] += stats[key]
+        return stats["max_plot_found"]
+
+    def process_sheet(self, village_no, sheet_no):
+        """
+        Process all plots in a sheet. Found plots go to the village's plot
+        log (and the on_plot hook) only; nothing is kept in memory.
+
+        Returns:
+            dict: The sheet's found / empty / failed counts (all 0 when it
+            was already processed)
+
+        Raises:
+            SheetAborted: MAX_CONSECUTIVE_FAILED plots in a row failed; the
+            sheet keeps its checkpoint and is not marked done
+        """
+        tally = {"found": 0, "empty": 0, "failed": 0}
+        key = self.village_key(village_no)
+        if self.checkpoints.is_sheet_done(key, sheet_no):
+            logging.info(f"Sheet {sheet_no} in Village {village_no} already processed. Skipping...")
+            return tally
+
+        start = time.monotonic()
+        resumed = self.checkpoints.sheet_progress(key, sheet_no) is not None
+        try:
+            if self.discovery_mode == "adaptive":
+                max_plot_found = self._discover_sheet(village_no, sheet_no)
+            else:
+                max_plot_found = self._sweep_sheet(village_no, sheet_no)
+            self.checkpoints.mark_sheet_done(key, sheet_no, max_plot_found)
+        finally:
+            # An interrupted sheet (aborted, out of budget, ...) starts its next run from a clean tally
+            with self._tally_lock:
+                tally = self.sheet_tallies.pop((village_no, sheet_no), tally)
+        logging.info(
+            f"Sheet {sheet_no} in Village {village_no}: {tally['found']} found, {tally['empty']} empty, "
+            f"{tally['failed']} failed, up to plot {max_plot_found} in {time.monotonic() - start:.1f}s"
+        )
+        if self.on_sheet_done is not None:
+            self.on_sheet_done(village_no, sheet_no, resumed)
+        return tally
+
+    @contextmanager
+    def _village_writer(self, village_no, fresh=False):
+        """Open the village's plot log for the duration of a block"""
+        writer = PlotStreamWriter(self.village_key(village_no), fresh=fresh)
+        self.writers[village_no] = writer
+        try:
+            yield writer
+        finally:
+            writer.close()
+            del self.writers[village_no]
+
+    def scrape_sheet(self, village_no, sheet_no):
+        """
+        Scrape a single sheet, appending its plots to the village's plot log.
+        Used by the orchestrator, where one village is spread across workers.
+
+        Returns:
+            int: Number of plots found on the sheet
+        """
+        with self._village_writer(village_no):
+            return self.process_sheet(village_no, sheet_no)["found"]
+
+    def probe_plots(self, village_no, sheet_no, plot_nos):
+        """
+        Probe specific plots of a sheet (e.g. dead-lettered ones), appending
+        any found to the village's plot log. A completed sheet's stored
+        max_plot_found is raised if one of them lies beyond it.
+
+        Returns:
+            list: Fetch results for the plots
+        """
+        with self._village_writer(village_no):
+            results = list(self._fetch_batch(village_no, sheet_no, plot_nos))
+
+        found = [result["plot_no"] for result in results if result["success"] and result["has_data"] == "Y"]
+        key = self.village_key(village_no)
+        done_max = self.checkpoints.processed_sheets(key).get(sheet_no)
+        if found and done_max is not None and max(found) > done_max:
+            self.checkpoints.mark_sheet_done(key, sheet_no, max(found))
+        return results
 
     def get_sheet_numbers(self, village_no):
         """Get all sheet numbers for a village"""
         params = SHEET_PARAMS.copy()
-        params["selections"] = f"1,1,2,{village_no},"
+        params["selections"] = f"{self.location},{village_no},"
+
+        if self.cache is not None and self.read_cache:
+            cached = self.cache.get(API_URL, params)
+            if cached is not None:
+                return cached
         
         try:
-            response = requests.get(API_URL, params=params, timeout=TIMEOUT_SECONDS)
-            soup = BeautifulSoup(response.text, "html.parser")
-            select_tag = soup.find("select", {"id": "level_5"})
-            return [option["value"] for option in select_tag.find_all("option") if option["value"].isdigit()] if select_tag else []
+            with self.limiter.request("sheets") as ticket:
+                response = self.session.get(API_URL, params=params, timeout=TIMEOUT_SECONDS)
+                ticket.ok = response.status_code == 200
+            self.metrics.inc("bytes_total", len(response.content), endpoint="sheets")
+            options = extract_options(response.text, "level_5") or {}
+            sheet_nos = [value for value in options if value.isdigit()]
+            if sheet_nos and self.cache is not None:
+                self.cache.put("sheets", API_URL, params, sheet_nos)
+            return sheet_nos
         except Exception as e:
             logging.error(f"Error getting sheet numbers for village {village_no}: {e}")
             return []
@@ -147,23 +510,48 @@ class VillageScraper:
             village_no (str): Village number to scrape
             
         Returns:
-            dict: Scraped village data if successful, None if failed
+            dict: Scraped village data (str(plot_no) -> plot dict), read back
+            from the plot log so a resumed run includes the plots found
+            before it was interrupted; None if failed
         """
-        vil_json = {village_no: {}}
-        
+        self.discovery_stats = {"requests": 0, "linear_estimate": 0, "saved": 0}
+
+        # Append to the existing plot log only when resuming this village
+        key = self.village_key(village_no)
+        fresh = not self.checkpoints.has_progress(key)
+        writer = PlotStreamWriter(key, fresh=fresh)
+        self.writers[village_no] = writer
+
         try:
             sheet_nos = self.get_sheet_numbers(village_no)
             logging.info(f"Found sheets for village {village_no}: {sheet_nos}")
 
             for sheet_no in sheet_nos:
                 logging.info(f"Processing sheet {sheet_no}")
-                self.process_sheet(village_no, sheet_no, vil_json)
-                save_village_data(village_no, vil_json[village_no])
-                time.sleep(2)  # Rate limiting between sheets
+                try:
+                    self.process_sheet(village_no, sheet_no)
+                except SheetAborted as e:
+                    logging.error(f"Sheet {sheet_no} in Village {village_no} aborted ({e}); it resumes on the next run")
+                writer.flush()
+
+            writer.close()
+            data = finalize_village_data(key)
 
-            return vil_json[village_no]
+            if self.discovery_mode == "adaptive":
+                logging.info(
+                    f"Village {village_no}: {self.discovery_stats['requests']} plot requests, "
+                    f"{self.discovery_stats['saved']} saved against the linear sweep"
+                )
+            if self.cache is not None:
+                logging.info(f"Response cache: {self.cache.stats()}")
+
+            return data
 
         except Exception as e:
+            # Plots found so far are in the plot log, where a resumed run picks them up
             logging.error(f"Error scraping village {village_no}: {e}")
-            save_village_data(f"{village_no}_error", vil_json.get(village_no, {}))
-            return None
\ No newline at end of file
+            return None
+
+        finally:
+            writer.close()
+            del self.writers[village_no]
@@ -0,0 +1,248 @@
+# spatial_index.py
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import logging
+from config import SPATIAL_INDEX_DB, OUTPUT_DIR
+from utils import load_village_file, village_keys
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS plot_bounds USING rtree(id, xmin, xmax, ymin, ymax);
+CREATE TABLE IF NOT EXISTS plots (
+    id INTEGER PRIMARY KEY,
+    village TEXT NOT NULL,
+    plot_no INTEGER NOT NULL,
+    gis_code TEXT NOT NULL,
+    xmin REAL NOT NULL,
+    ymin REAL NOT NULL,
+    xmax REAL NOT NULL,
+    ymax REAL NOT NULL,
+    center_x REAL NOT NULL,
+    center_y REAL NOT NULL,
+    UNIQUE (village, plot_no)
+);
+CREATE TABLE IF NOT EXISTS indexed_villages (
+    village TEXT PRIMARY KEY,
+    source_mtime REAL NOT NULL,
+    plots INTEGER NOT NULL,
+    plot_size REAL NOT NULL DEFAULT 0
+);
+"""
+
+COLUMNS = "p.village, p.plot_no, p.gis_code, p.xmin, p.ymin, p.xmax, p.ymax, p.center_x, p.center_y"
+NEAREST_MAX_ROUNDS = 40  # Window doublings before a nearest-plot search gives up
+
+def _village_file(village_no, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, f"village_{village_no}.json")
+
+def _row_to_plot(row):
+    keys = ("village", "plot_no", "gisCode", "xmin", "ymin", "xmax", "ymax", "center_x", "center_y")
+    return dict(zip(keys, row))
+
+def _bbox_distance(plot, x, y):
+    """Distance from (x, y) to a plot's bbox, 0 inside it"""
+    dx = max(plot["xmin"] - x, 0.0, x - plot["xmax"])
+    dy = max(plot["ymin"] - y, 0.0, y - plot["ymax"])
+    return math.hypot(dx, dy)
+
+class SpatialIndex:
+    """
+    Persisted R*Tree over the bounding boxes of every scraped plot.
+
+    The R*Tree stores 32-bit bounds rounded outwards, so candidates are
+    re-checked against the exact coordinates kept in the plots table.
+    Lookups are by bbox: a point query returns the plots whose bbox
+    contains the point.
+    """
+
+    def __init__(self, path=SPATIAL_INDEX_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def index_village(self, village_no, output_dir=OUTPUT_DIR, force=False):
+        """
+        (Re)index one village from its JSON output in output_dir, skipping
+        it when the file has not changed since it was last indexed.
+
+        Returns:
+            int: Plots indexed, or None if the village was up to date
+
+        Raises:
+            OSError, ValueError: The file cannot be read; the village keeps
+            its earlier rows
+        """
+        source = _village_file(village_no, output_dir)
+        mtime = os.path.getmtime(source) if os.path.exists(source) else 0.0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_mtime FROM indexed_villages WHERE village = ?", (village_no,)
+            ).fetchone()
+        if row is not None and row[0] == mtime and not force:
+            return None
+
+        plots = load_village_file(source).values()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM plot_bounds WHERE id IN (SELECT id FROM plots WHERE village = ?)", (village_no,)
+            )
+            self._conn.execute("DELETE FROM plots WHERE village = ?", (village_no,))
+            count = 0
+            total_size = 0.0
+            for plot in plots:
+                cursor = self._conn.execute(
+                    "INSERT INTO plots (village, plot_no, gis_code, xmin, ymin, xmax, ymax, center_x, center_y) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (village_no, int(plot["plot_no"]), plot["gisCode"], plot["xmin"], plot["ymin"],
+                     plot["xmax"], plot["ymax"], plot["center_x"], plot["center_y"])
+                )
+                self._conn.execute(
+                    "INSERT INTO plot_bounds (id, xmin, xmax, ymin, ymax) VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, plot["xmin"], plot["xmax"], plot["ymin"], plot["ymax"])
+                )
+                count += 1
+                total_size += (plot["xmax"] - plot["xmin"] + plot["ymax"] - plot["ymin"]) / 2
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexed_villages (village, source_mtime, plots, plot_size) "
+                "VALUES (?, ?, ?, ?)",
+                (village_no, mtime, count, total_size / count if count else 0.0)
+            )
+        return count
+
+    def build(self, output_dir=OUTPUT_DIR, force=False):
+        """
+        Index every village_<key>.json in output_dir that changed since the
+        last build, and drop villages whose file is gone.
+
+        Returns:
+            dict: village -> plots indexed, for the villages (re)indexed
+        """
+        villages = village_keys(output_dir)
+        indexed = {}
+        for village_no in villages:
+            try:
+                count = self.index_village(village_no, output_dir, force=force)
+            except Exception as e:
+                logging.error(f"Error indexing village {village_no}: {e}")
+                continue
+            if count is not None:
+                indexed[village_no] = count
+
+        with self._lock, self._conn:
+            stale = [row[0] for row in self._conn.execute("SELECT village FROM indexed_villages")
+                     if row[0] not in villages]
+            for village_no in stale:
+                self._conn.execute(
+                    "DELETE FROM plot_bounds WHERE id IN (SELECT id FROM plots WHERE village = ?)", (village_no,)
+                )
+                self._conn.execute("DELETE FROM plots WHERE village = ?", (village_no,))
+                self._conn.execute("DELETE FROM indexed_villages WHERE village = ?", (village_no,))
+        return indexed
+
+    def window(self, xmin, ymin, xmax, ymax, limit=None):
+        """Plots whose bbox intersects the window"""
+        sql = (
+            f"SELECT {COLUMNS} FROM plot_bounds b JOIN plots p ON p.id = b.id "
+            "WHERE b.xmax >= ? AND b.xmin <= ? AND b.ymax >= ? AND b.ymin <= ? "
+            "AND p.xmax >= ? AND p.xmin <= ? AND p.ymax >= ? AND p.ymin <= ?"
+        )
+        params = (xmin, xmax, ymin, ymax) * 2
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (int(limit),)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_plot(row) for row in rows]
+
+    def point(self, x, y):
+        """Plots whose bbox contains (x, y)"""
+        return self.window(x, y, x, y)
+
+    def nearest(self, x, y, k=1):
+        """
+        The k plots whose bboxes are closest to (x, y), nearest first.
+
+        Searches a square window around the point, doubling it until it
+        holds k plots no farther than its half-width (so nothing outside the
+        window can be closer).
+        """
+        with self._lock:
+            # Mean plot size, from the per-village summaries rather than a scan of plots
+            size = self._conn.execute(
+                "SELECT SUM(plot_size * plots) / SUM(plots) FROM indexed_villages WHERE plots > 0"
+            ).fetchone()[0]
+        if not size:
+            return []
+
+        radius = size
+        for _ in range(NEAREST_MAX_ROUNDS):
+            candidates = self.window(x - radius, y - radius, x + radius, y + radius)
+            for plot in candidates:
+                plot["distance"] = _bbox_distance(plot, x, y)
+            candidates.sort(key=lambda plot: plot["distance"])
+            if len(candidates) >= k and candidates[k - 1]["distance"] <= radius:
+                return candidates[:k]
+            radius *= 2
+        return candidates[:k]
+
+    def stats(self):
+        with self._lock:
+            villages, plots = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(plots), 0) FROM indexed_villages"
+            ).fetchone()
+        return {"villages": villages, "plots": plots}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatial queries over scraped plots")
+    parser.add_argument("--db", default=SPATIAL_INDEX_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Index new or changed village JSON files")
+    build.add_argument("--output-dir", default=OUTPUT_DIR)
+    build.add_argument("--force", action="store_true", help="Reindex every village")
+
+    point = commands.add_parser("point", help="Plots containing a point")
+    point.add_argument("x", type=float)
+    point.add_argument("y", type=float)
+
+    window = commands.add_parser("window", help="Plots intersecting a bbox")
+    for name in ("xmin", "ymin", "xmax", "ymax"):
+        window.add_argument(name, type=float)
+    window.add_argument("--limit", type=int)
+
+    nearest = commands.add_parser("nearest", help="Plots nearest to a point")
+    nearest.add_argument("x", type=float)
+    nearest.add_argument("y", type=float)
+    nearest.add_argument("-k", type=int, default=1)
+
+    commands.add_parser("stats", help="Indexed villages and plots")
+    args = parser.parse_args()
+
+    index = SpatialIndex(args.db)
+    try:
+        if args.command == "build":
+            indexed = index.build(args.output_dir, force=args.force)
+            print(f"Indexed {len(indexed)} villages ({sum(indexed.values())} plots); {index.stats()}")
+        elif args.command == "point":
+            print(json.dumps(index.point(args.x, args.y), indent=4))
+        elif args.command == "window":
+            print(json.dumps(index.window(args.xmin, args.ymin, args.xmax, args.ymax, args.limit), indent=4))
+        elif args.command == "nearest":
+            print(json.dumps(index.nearest(args.x, args.y, args.k), indent=4))
+        else:
+            print(index.stats())
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    main()
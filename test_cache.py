@@ -0,0 +1,63 @@
+# test_cache.py
+
+import sqlite3
+import cache
+from cache import ResponseCache
+
+URL = "http://portal/ScalarDatahandler"
+
+def open_cache(tmp_path, **kwargs):
+    kwargs.setdefault("ttls", {"plot_pos": 3600, "plot_neg": -1})
+    kwargs.setdefault("flush_every", 1000)
+    kwargs.setdefault("flush_seconds", 3600)
+    return ResponseCache(str(tmp_path / "cache.db"), **kwargs)
+
+def stored_keys(tmp_path):
+    with sqlite3.connect(str(tmp_path / "cache.db")) as conn:
+        return {row[0] for row in conn.execute("SELECT key FROM responses")}
+
+def test_entries_expire_by_kind(tmp_path):
+    store = open_cache(tmp_path)
+    store.put("plot_pos", URL, {"plotno": 1}, {"has_data": "Y"})
+    store.put("plot_neg", URL, {"plotno": 2}, {"has_data": "N"})
+    assert store.get(URL, {"plotno": 1}) == {"has_data": "Y"}
+    assert store.get(URL, {"plotno": 2}) is None
+    assert store.get(URL, {"plotno": 3}) is None
+    assert store.stats()["misses"] == 2
+    store.close()
+
+def test_params_are_normalized():
+    assert ResponseCache.make_key(URL, {"b": 2, "a": "1"}) == ResponseCache.make_key(URL, {"a": 1, "b": "2"})
+
+def test_puts_are_buffered_until_flushed(tmp_path):
+    store = open_cache(tmp_path)
+    store.put("plot_pos", URL, {"plotno": 1}, [1, 2])
+    assert store.get(URL, {"plotno": 1}) == [1, 2]
+    assert stored_keys(tmp_path) == set()
+    store.flush()
+    assert stored_keys(tmp_path) == {ResponseCache.make_key(URL, {"plotno": 1})}
+    store.close()
+
+    reopened = open_cache(tmp_path)
+    assert reopened.get(URL, {"plotno": 1}) == [1, 2]
+    reopened.close()
+
+def test_flush_every_commits_without_an_explicit_flush(tmp_path):
+    store = open_cache(tmp_path, flush_every=2)
+    store.put("plot_pos", URL, {"plotno": 1}, 1)
+    store.put("plot_pos", URL, {"plotno": 2}, 2)
+    assert len(stored_keys(tmp_path)) == 2
+    store.close()
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "EVICTION_INTERVAL", 1)
+    store = open_cache(tmp_path, max_entries=2)
+    store.put("plot_pos", URL, {"plotno": 1}, 1)
+    store.put("plot_pos", URL, {"plotno": 2}, 2)
+    store.flush()
+    # A hit refreshes plot 1, leaving plot 2 the least recently used
+    assert store.get(URL, {"plotno": 1}) == 1
+    store.put("plot_pos", URL, {"plotno": 3}, 3)
+    store.flush()
+    assert stored_keys(tmp_path) == {ResponseCache.make_key(URL, {"plotno": n}) for n in (1, 3)}
+    store.close()
@@ -0,0 +1,60 @@
+# test_checkpoint.py
+
+import json
+import checkpoint
+from checkpoint import CheckpointStore
+
+def open_store(tmp_path):
+    return CheckpointStore(str(tmp_path / "state.db"))
+
+def test_progress_survives_a_reopen(tmp_path):
+    store = open_store(tmp_path)
+    store.record_probes("1_1_1_7", "1", range(1, 201), max_plot=150, consecutive_empty=50)
+    store.record_probes("1_1_1_7", "1", [205, 204, 203], max_plot=204)
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.has_progress("1_1_1_7")
+    assert not store.has_progress("7")
+    assert store.probed_plots("1_1_1_7", "1") == set(range(1, 201)) | {203, 204, 205}
+    assert store.sheet_progress("1_1_1_7", "1") == {"max_plot": 204, "next_plot": 206, "consecutive_empty": 0}
+    assert not store.is_sheet_done("1_1_1_7", "1")
+    store.close()
+
+def test_done_sheets_drop_their_ranges(tmp_path):
+    store = open_store(tmp_path)
+    store.record_probes("7", "1", range(1, 101), max_plot=60)
+    store.mark_sheet_done("7", "1", 60)
+    assert store.processed_sheets("7") == {"1": 60}
+    assert store.probed_plots("7", "1") == set()
+    store.close()
+
+def test_reset_keeps_finished_sheets_as_priors(tmp_path):
+    store = open_store(tmp_path)
+    store.mark_sheet_done("7", "1", 60)
+    store.record_probes("7", "2", range(1, 51), max_plot=20)
+    store.mark_sheet_done("8", "1", 90)
+    store.reset("7")
+    assert not store.has_progress("7")
+    assert store.priors("7") == {"1": 60}
+    assert store.prior("7", "2") == 0
+    assert store.processed_sheets("8") == {"1": 90}
+    store.close()
+
+def test_legacy_state_is_imported_into_a_new_database(tmp_path, monkeypatch):
+    legacy = tmp_path / "scraper_state.json"
+    legacy.write_text(json.dumps({
+        "processed_sheets": {"7": {"1": 60, "2": 45}},
+        "plot_priors": {"8": {"3": 120}}
+    }))
+    monkeypatch.setattr(checkpoint, "DP_STATE_FILE", str(legacy))
+    store = open_store(tmp_path)
+    assert store.processed_sheets("7") == {"1": 60, "2": 45}
+    assert store.prior("8", "3") == 120
+    store.close()
+
+    # Only a new database imports it; later opens keep their own progress
+    legacy.write_text(json.dumps({"processed_sheets": {"9": {"1": 10}}}))
+    store = open_store(tmp_path)
+    assert store.processed_sheets("9") == {}
+    store.close()
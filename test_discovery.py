@@ -0,0 +1,74 @@
+# test_discovery.py
+
+import random
+from discovery import PlotRangeDiscovery, gap_scan_cost
+
+GAP = 50  # Stands in for MAX_CONSECUTIVE_EMPTY, small enough to keep the sheets short
+
+def linear_sweep(occupied, gap=GAP):
+    """Plots the fixed linear sweep finds: 1, 2, ... until `gap` empty plots in a row"""
+    found = set()
+    plot_no = 1
+    empty = 0
+    while empty < gap:
+        if plot_no in occupied:
+            found.add(plot_no)
+            empty = 0
+        else:
+            empty += 1
+        plot_no += 1
+    return found
+
+def discover(occupied, prior=0, gap=GAP, dense_gap=GAP, stride=10):
+    found = set()
+
+    def probe(plot_nos):
+        for plot_no in plot_nos:
+            has_data = "Y" if plot_no in occupied else "N"
+            if has_data == "Y":
+                found.add(plot_no)
+            yield {"success": True, "has_data": has_data, "plot_no": plot_no}
+
+    stats = PlotRangeDiscovery(probe, prior=prior, gap_scan=gap, dense_gap=dense_gap, stride=stride).run()
+    return found, stats
+
+def sparse_sheets(count, density, size, seed=1):
+    rng = random.Random(seed)
+    return [{plot_no for plot_no in range(1, size + 1) if rng.random() < density} for _ in range(count)]
+
+def test_sparse_sheets_match_linear_sweep():
+    for density in (0.8, 0.3, 0.05):
+        for occupied in sparse_sheets(100, density, 100):
+            found, stats = discover(occupied)
+            assert found == linear_sweep(occupied)
+            assert stats["max_plot_found"] == max(found, default=0)
+
+def test_priors_do_not_change_the_result():
+    for occupied in sparse_sheets(50, 0.5, 300, seed=2):
+        expected = linear_sweep(occupied)
+        for prior in (1, max(expected, default=0), 1000):
+            assert discover(occupied, prior=prior)[0] == expected
+
+def test_run_beyond_the_gap_is_found_after_a_hit_inside_it():
+    occupied = set(range(1, 41)) | {80} | set(range(120, 161))
+    assert discover(occupied)[0] == linear_sweep(occupied) == occupied
+
+def test_sampled_gap_bounds_the_probes_past_the_last_plot():
+    occupied = set(range(1, 301))
+    found, stats = discover(occupied, gap=1000, dense_gap=100, stride=20)
+    assert found == occupied
+    # 300 plots, then 100 dense probes and 44 clusters of 2 instead of 1000 probes; samples
+    # sent before the last plot was known add at most a cluster
+    assert gap_scan_cost(1000, 100, 20, 2) == 188
+    assert 300 + 188 <= stats["requests"] <= 300 + 188 + 2
+    assert stats["saved"] == 300 + 1000 - stats["requests"]
+
+def test_sampled_gap_finds_runs_at_least_a_stride_long():
+    occupied = set(range(1, 101)) | set(range(500, 520)) | set(range(900, 960))
+    found, _ = discover(occupied, gap=1000, dense_gap=100, stride=20)
+    assert found == occupied
+
+def test_sampled_gap_can_miss_a_short_run():
+    occupied = set(range(1, 101)) | {503}
+    found, _ = discover(occupied, gap=1000, dense_gap=100, stride=20)
+    assert found == set(range(1, 101))
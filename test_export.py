@@ -0,0 +1,81 @@
+# test_export.py
+
+import json
+import os
+import pytest
+
+pytest.importorskip("pyarrow")
+import export
+from export import ColumnarExport, open_state_table
+from plot_store import COORD_FIELDS
+
+def write_village(output_dir, key, plot_nos):
+    plots = {
+        str(plot_no): {"plot_no": plot_no, "gisCode": f"21010203000{plot_no:05d}02", **{f: float(plot_no) for f in COORD_FIELDS}}
+        for plot_no in plot_nos
+    }
+    with open(os.path.join(output_dir, f"village_{key}.json"), "w") as f:
+        json.dump({"metadata": {}, "plots": plots}, f, indent=4)
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    # No hierarchy index: every village file is placed by its key alone
+    monkeypatch.setattr(export, "HIERARCHY_DB", str(tmp_path / "missing.db"))
+    output_dir = tmp_path / "village_data"
+    output_dir.mkdir()
+    return str(output_dir), str(tmp_path / "export")
+
+def test_same_numbered_villages_of_two_ris_get_their_own_partitions(dirs):
+    output_dir, root = dirs
+    write_village(output_dir, "3", range(1, 6))  # 3 under the default location 1,1,2
+    write_village(output_dir, "1_1_1_3", range(1, 8))
+    result = ColumnarExport(root).merge(output_dir)
+    assert result == {"written": {"1,1,1,3": 7, "1,1,2,3": 5}, "removed": []}
+    assert os.path.exists(os.path.join(root, "district=1/tehsil=1/ri=1/village=3/plots.parquet"))
+    assert os.path.exists(os.path.join(root, "district=1/tehsil=1/ri=2/village=3/plots.parquet"))
+
+def test_merge_rewrites_only_changed_villages_and_drops_removed_ones(dirs):
+    output_dir, root = dirs
+    write_village(output_dir, "1_1_1_3", range(1, 8))
+    write_village(output_dir, "1_1_1_4", range(1, 3))
+    exporter = ColumnarExport(root)
+    exporter.merge(output_dir)
+    assert exporter.merge(output_dir)["written"] == {}
+
+    write_village(output_dir, "1_1_1_3", range(1, 10))
+    os.remove(os.path.join(output_dir, "village_1_1_1_4.json"))
+    assert ColumnarExport(root).merge(output_dir) == {"written": {"1,1,1,3": 9}, "removed": ["1,1,1,4"]}
+
+def test_non_canonical_and_unreadable_files_are_skipped(dirs):
+    output_dir, root = dirs
+    write_village(output_dir, "3", range(1, 6))
+    write_village(output_dir, "1_1_2_3", range(1, 3))  # Same village as village_3.json
+    with open(os.path.join(output_dir, "village_1_1_1_9.json"), "w") as f:
+        f.write("{broken")
+    assert ColumnarExport(root).merge(output_dir)["written"] == {"1,1,2,3": 5}
+
+def test_compact_joins_partitions_with_their_location_columns(dirs):
+    output_dir, root = dirs
+    write_village(output_dir, "1_1_1_3", range(1, 4))
+    write_village(output_dir, "3", range(1, 3))
+    exporter = ColumnarExport(root)
+    exporter.merge(output_dir)
+    path = exporter.compact()
+    assert exporter.compact() == path
+    table = open_state_table(root)
+    assert table.column_names[:6] == ["district", "tehsil", "ri", "village", "sheet", "plot_no"]
+    assert list(zip(table["ri"].to_pylist(), table["plot_no"].to_pylist())) == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2)]
+    assert set(table["sheet"].to_pylist()) == {2}
+
+def test_an_older_manifest_is_rebuilt(dirs):
+    output_dir, root = dirs
+    stale = os.path.join(root, "district=1/tehsil=1/village=3")
+    os.makedirs(stale)
+    with open(os.path.join(root, "_manifest.json"), "w") as f:
+        json.dump({"generation": 4, "compacted": 4,
+                   "villages": {"3": {"path": "district=1/tehsil=1/village=3/plots.parquet"}}}, f)
+    write_village(output_dir, "3", range(1, 3))
+    exporter = ColumnarExport(root)
+    assert not os.path.exists(stale)
+    assert exporter.merge(output_dir)["written"] == {"1,1,2,3": 2}
+    assert exporter.manifest["generation"] == 6
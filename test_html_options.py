@@ -0,0 +1,46 @@
+# test_html_options.py
+
+import pytest
+import html_options
+from html_options import extract_options
+
+PAGE = """
+<html><body>
+<select id="level_4"><option value="9">Other</option></select>
+<select id="level_5" class="sheets">
+  <option value="-1">--Select--</option>
+  <option value="1">Sheet 1</option>
+  <option value="2" selected>Sheet &amp; 2</option>
+  <option>3</option>
+</select>
+<select id="level_6"><option value="7">After</option></select>
+</body></html>
+"""
+
+def test_options_of_the_requested_select():
+    assert extract_options(PAGE, "level_5") == {"-1": "--Select--", "1": "Sheet 1", "2": "Sheet & 2", "3": "3"}
+    assert extract_options(PAGE, "level_4") == {"9": "Other"}
+
+def test_missing_select_is_none():
+    assert extract_options(PAGE, "level_3") is None
+    assert extract_options("", "level_5") is None
+
+def test_unclosed_select_keeps_the_options_seen():
+    html = '<select id="level_5"><option value="1">One<option value="2">Two'
+    assert extract_options(html, "level_5") == {"1": "One", "2": "Two"}
+
+def test_scanning_stops_at_the_end_of_the_select(monkeypatch):
+    # Anything after the select is never fed to the handlers, so it cannot break the scan
+    monkeypatch.setattr(html_options, "_extract_with_soup", lambda html, select_id: pytest.fail("fell back"))
+    assert extract_options(PAGE + "<select id='level_5'><option value='x'>", "level_5")["1"] == "Sheet 1"
+
+def test_ambiguous_pages_fall_back_to_beautifulsoup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(html_options, "_extract_with_soup", lambda html, select_id: calls.append(select_id) or {})
+    assert extract_options('<script>var id = "level_5";</script>', "level_5") == {}
+    assert calls == ["level_5"]
+
+def test_matches_beautifulsoup_on_well_formed_pages():
+    pytest.importorskip("bs4")
+    for select_id in ("level_4", "level_5", "level_6"):
+        assert extract_options(PAGE, select_id) == html_options._extract_with_soup(PAGE, select_id)
@@ -0,0 +1,53 @@
+# test_plot_store.py
+
+from plot_store import PlotBitmap, PlotStore
+
+def make_plot(plot_no, sheet, x, y, size=1.0):
+    return {
+        "plot_no": plot_no, "gisCode": f"21010203{sheet}",
+        "xmin": x, "ymin": y, "xmax": x + size, "ymax": y + size,
+        "center_x": x + size / 2, "center_y": y + size / 2
+    }
+
+def test_reads_like_the_plot_dict_mapping():
+    plots = [make_plot(3, "01", 0.0, 0.0), make_plot(2000, "02", 5.0, 5.0)]
+    store = PlotStore.from_plots(plots)
+    assert len(store) == 2
+    assert list(store) == ["3", "2000"]
+    assert store["3"] == plots[0]
+    assert store.to_dict() == {"3": plots[0], "2000": plots[1]}
+    assert "4" not in store
+    assert store.gis_codes() == ["2101020301", "2101020302"]
+
+def test_adding_a_plot_again_replaces_it():
+    store = PlotStore(capacity=1)
+    store.add(make_plot(7, "01", 0.0, 0.0))
+    store.add(make_plot(8, "01", 1.0, 1.0))
+    store.add(make_plot(7, "02", 9.0, 9.0))
+    assert len(store) == 2
+    assert store["7"]["gisCode"] == "2101020302"
+    assert store.column("xmin").tolist() == [9.0, 1.0]
+    assert store.column("plot_no").tolist() == [7, 8]
+
+def test_sheet_bboxes_cover_each_sheets_plots():
+    store = PlotStore.from_plots([
+        make_plot(1, "01", 0.0, 0.0),
+        make_plot(2, "02", 10.0, 10.0, size=2.0),
+        make_plot(3, "01", 3.0, -1.0),
+        make_plot(4, "02", 8.0, 11.0),
+    ])
+    assert store.sheet_bboxes() == {
+        "01": (0.0, -1.0, 4.0, 1.0),
+        "02": (8.0, 10.0, 12.0, 12.0),
+    }
+    assert store.sheet_bboxes(sheet_of=lambda code: "all") == {"all": (0.0, -1.0, 12.0, 12.0)}
+    assert PlotStore().sheet_bboxes() == {}
+
+def test_bitmap_membership_and_size():
+    bitmap = PlotBitmap()
+    for plot_no in (0, 7, 8, 5000):
+        bitmap.add(plot_no)
+    bitmap.add(8)
+    assert len(bitmap) == 4
+    assert 5000 in bitmap and 8 in bitmap
+    assert 9 not in bitmap and 100000 not in bitmap
@@ -0,0 +1,68 @@
+# test_refresh.py
+
+from refresh import VillageRefresher, diff_plots, plot_sheet
+
+def make_plot(plot_no, x=0.0):
+    return {"plot_no": plot_no, "gisCode": f"2101020300{plot_no:05d}01", "xmin": x, "ymin": 0.0,
+            "xmax": x + 1, "ymax": 1.0, "center_x": x + 0.5, "center_y": 0.5}
+
+class FakeScraper:
+    """Answers probes from a {plot_no: plot} portal; plots in `failing` fail"""
+
+    def __init__(self, portal, failing=()):
+        self.portal = portal
+        self.failing = set(failing)
+        self.probes = 0
+
+    def _fetch_batch(self, village_no, sheet_no, plot_nos, found):
+        for plot_no in plot_nos:
+            self.probes += 1
+            if plot_no in self.failing:
+                yield {"success": False, "failed": True, "has_data": "N", "plot_no": plot_no}
+                continue
+            plot = self.portal.get(plot_no)
+            if plot is not None:
+                found.add(plot)
+            yield {"success": True, "has_data": "Y" if plot else "N", "plot_no": plot_no}
+
+def saved(plot_nos):
+    return {str(plot_no): make_plot(plot_no) for plot_no in plot_nos}
+
+def test_unchanged_sheet_is_only_sampled():
+    portal = {plot_no: make_plot(plot_no) for plot_no in range(1, 101)}
+    scraper = FakeScraper(portal)
+    refresher = VillageRefresher(scraper, sample_rate=0.1, min_sample=5, frontier=10, seed=1)
+    result = refresher.refresh_sheet("1", "1", saved(range(1, 101)), 100)
+    assert not result["stats"]["escalated"]
+    assert result["plots"] == saved(range(1, 101))
+    assert scraper.probes == result["stats"]["requests"] == 10 + 10
+
+def test_shrunk_sheet_reports_removed_plots_once_probed():
+    portal = {plot_no: make_plot(plot_no) for plot_no in range(1, 41)}
+    portal[7] = make_plot(7, x=5.0)
+    # Plot 90 cannot be probed, so it is kept rather than reported removed
+    scraper = FakeScraper(portal, failing={90})
+    refresher = VillageRefresher(scraper, sample_rate=0.5, min_sample=5, frontier=10, seed=1)
+    old = saved(range(1, 101))
+    result = refresher.refresh_sheet("1", "1", old, 100)
+    assert result["stats"]["escalated"]
+    assert result["stats"]["failed"] == 1
+    assert set(result["plots"]) == {str(plot_no) for plot_no in list(range(1, 41)) + [90]}
+
+    diff = diff_plots(old, result["plots"])
+    assert [plot["plot_no"] for plot in diff["removed"]] == [n for n in range(41, 101) if n != 90]
+    assert diff["added"] == []
+    assert diff["changed"] == [{"old": make_plot(7), "new": make_plot(7, x=5.0)}]
+
+def test_new_plots_past_the_frontier_are_found():
+    portal = {plot_no: make_plot(plot_no) for plot_no in range(1, 61)}
+    scraper = FakeScraper(portal)
+    refresher = VillageRefresher(scraper, sample_rate=0.1, min_sample=5, frontier=10, seed=1)
+    result = refresher.refresh_sheet("1", "1", saved(range(1, 51)), 50)
+    assert result["max_plot"] == 60
+    assert [plot["plot_no"] for plot in diff_plots(saved(range(1, 51)), result["plots"])["added"]] == list(range(51, 61))
+
+def test_plot_sheet_matches_the_crawl_numbering():
+    assert plot_sheet({"gisCode": "2101020300000701"}) == "1"
+    assert plot_sheet({"gisCode": "2101020300000712"}) == "12"
+    assert plot_sheet({"gisCode": "21010203000007AB"}) is None
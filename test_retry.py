@@ -0,0 +1,55 @@
+# test_retry.py
+
+import asyncio
+import pytest
+import requests
+from retry import (DeadLetterLog, SheetAborted, abort_on_failures, backoff_delay, is_transient_exception,
+                   is_transient_status, should_retry)
+
+def test_status_classification():
+    for status in (429, 500, 502, 503, 504):
+        assert is_transient_status(status)
+    for status in (200, 400, 403, 404, 501):
+        assert not is_transient_status(status)
+
+def test_exception_classification():
+    assert is_transient_exception(requests.exceptions.ReadTimeout())
+    assert is_transient_exception(requests.exceptions.ConnectionError())
+    assert is_transient_exception(asyncio.TimeoutError())
+    assert is_transient_exception(ConnectionResetError())
+    # An undecodable body will not decode on a retry either
+    assert not is_transient_exception(ValueError("Expecting value"))
+    assert not is_transient_exception(KeyError("plotno"))
+
+def test_retries_stop_at_the_attempt_limit_and_on_permanent_errors():
+    assert should_retry(0, True, max_attempts=3)
+    assert should_retry(1, True, max_attempts=3)
+    assert not should_retry(2, True, max_attempts=3)
+    assert not should_retry(0, False, max_attempts=3)
+
+def test_backoff_is_jittered_under_a_capped_exponential():
+    for attempt in range(10):
+        for _ in range(50):
+            assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2 ** attempt)
+
+def test_consecutive_failures_abort_the_sheet():
+    def results(pattern):
+        for plot_no, failed in enumerate(pattern, 1):
+            yield {"plot_no": plot_no, "failed": failed}
+
+    passed = list(abort_on_failures(results([True, True, False, True, True]), limit=3))
+    assert len(passed) == 5
+    with pytest.raises(SheetAborted):
+        list(abort_on_failures(results([False, True, True, True, False]), limit=3))
+
+def test_dead_letters_survive_an_interrupted_replay(tmp_path):
+    log = DeadLetterLog(str(tmp_path / "dead_letter.jsonl"))
+    log.add("1,1,2", "7", "1", 5, "Timeout", 3)
+    log.add("1,1,2", "7", "1", 6, "Status 503", 3)
+    assert [entry["plot_no"] for entry in log.take()] == [5, 6]
+
+    # Interrupted before finish_replay: the entries come back along with new ones
+    log.add("1,1,2", "7", "2", 9, "Timeout", 3)
+    assert [entry["plot_no"] for entry in log.take()] == [5, 6, 9]
+    log.finish_replay()
+    assert log.take() == []
@@ -0,0 +1,66 @@
+# test_village_file.py
+
+import json
+import os
+import pytest
+from village_file import VillageReader, write_village_file, index_path
+
+def make_plots(plot_nos, tag="A"):
+    return {
+        str(plot_no): {"plot_no": plot_no, "gisCode": f"{tag}{plot_no:05d}01", "xmin": plot_no * 1.5,
+                       "name": "ଓଡ଼ିଆ"}
+        for plot_no in plot_nos
+    }
+
+def test_written_file_is_plain_indented_json(tmp_path):
+    filename = str(tmp_path / "village_1.json")
+    metadata = {"village_number": "1", "sheets": ["1", "2"]}
+    plots = make_plots([3, 1, 2000])
+    write_village_file(filename, metadata, plots)
+    with open(filename, encoding="utf-8") as f:
+        text = f.read()
+    assert text == json.dumps({"metadata": metadata, "plots": plots}, indent=4, ensure_ascii=False)
+    assert os.path.exists(index_path(filename))
+
+def test_reader_looks_up_and_iterates_lazily(tmp_path, monkeypatch):
+    filename = str(tmp_path / "village_1.json")
+    plots = make_plots(range(1, 2500))
+    write_village_file(filename, {}, plots)
+    # Small chunks exercise the batched decoding across chunk boundaries
+    monkeypatch.setattr("village_file.DECODE_CHUNK", 7)
+    with VillageReader(filename) as reader:
+        assert len(reader) == 2499
+        assert reader.get(1234) == plots["1234"]
+        assert reader.get(0) is None and reader.get(99999) is None
+        assert reader.find_gis_code("A0204801") == plots["2048"]
+        assert reader.find_gis_code("B0204801") is None
+        assert dict(reader.items()) == plots
+
+def test_file_without_a_sidecar_is_scanned_once(tmp_path):
+    filename = str(tmp_path / "village_1.json")
+    plots = make_plots([5, 6, 9])
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {}, "plots": plots}, f, indent=4, ensure_ascii=False)
+    with VillageReader(filename) as reader:
+        assert dict(reader.items()) == plots
+    assert os.path.exists(index_path(filename))
+    with VillageReader(filename) as reader:
+        assert reader.get(9) == plots["9"]
+
+def test_stale_sidecar_is_rebuilt_even_when_it_looks_newer(tmp_path):
+    filename = str(tmp_path / "village_1.json")
+    write_village_file(filename, {}, make_plots(range(1, 8)))
+    # Rewritten without its sidecar and back-dated, as a copy that preserves mtimes would be
+    plots = make_plots(range(1, 10), tag="B")
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {}, "plots": plots}, f, indent=4, ensure_ascii=False)
+    os.utime(filename, (1, 1))
+    with VillageReader(filename) as reader:
+        assert dict(reader.items()) == plots
+
+def test_other_layouts_are_rejected(tmp_path):
+    filename = str(tmp_path / "village_1.json")
+    with open(filename, "w") as f:
+        json.dump({"metadata": {}, "plots": make_plots([1, 2])}, f)
+    with pytest.raises(ValueError):
+        VillageReader(filename)
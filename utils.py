@@ -1,56 +1,115 @@
 # utils.py
 
+import atexit
+import itertools
 import json
 import os
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+import re
 from datetime import datetime
-from config import OUTPUT_DIR, DP_STATE_FILE, LOG_FILE
+from config import DEFAULT_LOCATION, OUTPUT_DIR, LOG_FILE, LOG_LEVEL, PLOT_LOGGER, PLOT_LOG_LEVEL, PLOT_LOG_SAMPLE_EVERY
+from plot_stream import stream_path, iter_stream
+from village_file import write_village_file, VillageReader
+
+class SampleFilter(logging.Filter):
+    """Pass one record in every `every`, dropping the rest"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._count = itertools.count()
+
+    def filter(self, record):
+        return next(self._count) % self.every == 0
+
+_listener = None
+_queue_handler = None
+_logging_pid = None
 
 def setup_logging():
-    """Configure logging for the scraper"""
-    logging.basicConfig(
-        filename=LOG_FILE,
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        filemode='w'  # This will overwrite the log file each time
-    )
+    """
+    Configure logging for the scraper.
+
+    Records are handed to a queue and written to the log file and console
+    by a background listener, so worker threads never block on log I/O.
+    Calling this again in the same process is a no-op; a worker process
+    (forked or spawned) gets its own listener appending to the same file.
+    """
+    global _listener, _queue_handler, _logging_pid
+    if _logging_pid == os.getpid():
+        return
+
+    root = logging.getLogger('')
+    if _queue_handler is not None:
+        # Inherited across fork: the parent's listener thread does not exist here
+        root.removeHandler(_queue_handler)
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    if _logging_pid is None and multiprocessing.parent_process() is None:
+        # Overwrite the log file on the first run only, never under a running parent;
+        # a spawned worker starts with fresh module state, so ask multiprocessing
+        open(LOG_FILE, 'w').close()
+    # Append mode keeps writes at the end even if init truncates the file mid-run
+    file_handler = logging.FileHandler(LOG_FILE, mode='a')
+    file_handler.setFormatter(formatter)
     # Also log to console
     console = logging.StreamHandler()
-    console.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     console.setFormatter(formatter)
-    logging.getLogger('').addHandler(console)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    plot_logger = logging.getLogger(PLOT_LOGGER)
+    plot_logger.setLevel(PLOT_LOG_LEVEL)
+    if not plot_logger.filters:
+        plot_logger.addFilter(SampleFilter(PLOT_LOG_SAMPLE_EVERY))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console)
+    _listener.start()
+    _logging_pid = os.getpid()
+    atexit.register(_listener.stop)
+
+def village_key(location, village_no):
+    """
+    Key of a village's checkpoints, plot log and output files.
+
+    Village numbers repeat across RIs, so villages outside DEFAULT_LOCATION
+    are keyed "d_t_r_v"; those under it keep their bare number, as before.
+    """
+    if location == DEFAULT_LOCATION:
+        return str(village_no)
+    return "_".join(location.split(",") + [str(village_no)])
+
+def split_village_key(key):
+    """(location, village number) of a village key"""
+    parts = str(key).split("_")
+    if len(parts) == 1:
+        return DEFAULT_LOCATION, parts[0]
+    return ",".join(parts[:-1]), parts[-1]
+
+def village_key_order(key):
+    """Sort key putting village keys in numeric order"""
+    return [int(part) for part in str(key).split("_")]
+
+def village_keys(output_dir=OUTPUT_DIR):
+    """Keys of the villages with a village_<key>.json in output_dir, in numeric order"""
+    keys = []
+    for name in os.listdir(output_dir) if os.path.isdir(output_dir) else ():
+        match = re.fullmatch(r"village_((?:\d+_){3}\d+|\d+)\.json", name)
+        if match:
+            keys.append(match.group(1))
+    return sorted(keys, key=village_key_order)
 
 def ensure_directories():
     """Create necessary directories if they don't exist"""
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
-def load_state():
-    """Load the scraper state from file or create new if doesn't exist"""
-    try:
-        if os.path.exists(DP_STATE_FILE):
-            with open(DP_STATE_FILE, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        logging.error(f"Error loading state file: {e}")
-    
-    # Return fresh state if file doesn't exist or error occurs
-    return {
-        "processed_sheets": {},
-        "last_village": None,
-        "last_sheet": None
-    }
-
-def save_state(state_data):
-    """Save the current scraper state"""
-    try:
-        with open(DP_STATE_FILE, 'w') as f:
-            json.dump(state_data, f, indent=4)
-        logging.info("State saved successfully")
-    except Exception as e:
-        logging.error(f"Error saving state: {e}")
-
 def save_village_data(village_no, data):
     """Save village data with metadata to JSON file"""
     filename = os.path.join(OUTPUT_DIR, f"village_{village_no}.json")
@@ -65,17 +124,32 @@ def save_village_data(village_no, data):
             "plots": data
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=4, ensure_ascii=False)
+        write_village_file(filename, output_data["metadata"], output_data["plots"])
         logging.info(f"Saved data for village {village_no}")
         return True
     except Exception as e:
         logging.error(f"Error saving village data: {e}")
         return False
 
-def load_village_data(village_no):
-    """Load existing village data if available"""
-    filename = os.path.join(OUTPUT_DIR, f"village_{village_no}.json")
+def _stream_is_current(village_no):
+    """True when village_N.jsonl holds newer data than village_N.json"""
+    stream_file = stream_path(village_no)
+    json_file = os.path.join(OUTPUT_DIR, f"village_{village_no}.json")
+    if not os.path.exists(stream_file):
+        return False
+    return not os.path.exists(json_file) or os.path.getmtime(stream_file) > os.path.getmtime(json_file)
+
+def _open_reader(filename):
+    """Memory-mapped reader over a village file, or None when it is missing or not in the indent=4 layout"""
+    if not os.path.exists(filename):
+        return None
+    try:
+        return VillageReader(filename)
+    except Exception as e:
+        logging.warning(f"Cannot index {filename}, loading it whole: {e}")
+        return None
+
+def _load_json_plots(filename):
     try:
         if os.path.exists(filename):
             with open(filename, 'r') as f:
@@ -83,4 +157,66 @@ def load_village_data(village_no):
                 return data.get("plots", {})
     except Exception as e:
         logging.error(f"Error loading village data: {e}")
-    return {}
\ No newline at end of file
+    return {}
+
+def iter_village_plots(village_no):
+    """
+    Lazily yield each plot of a village once.
+
+    Reads the streamed village_N.jsonl while a crawl is in progress (keeping
+    the first record per plot_no), otherwise the finalized village_N.json
+    through its memory-mapped reader.
+    """
+    if _stream_is_current(village_no):
+        seen = set()
+        for plot in iter_stream(village_no):
+            if plot["plot_no"] not in seen:
+                seen.add(plot["plot_no"])
+                yield plot
+        return
+
+    filename = os.path.join(OUTPUT_DIR, f"village_{village_no}.json")
+    reader = _open_reader(filename)
+    if reader is None:
+        yield from _load_json_plots(filename).values()
+        return
+    with reader:
+        yield from reader
+
+def finalize_village_data(village_no):
+    """
+    Build village_N.json from the streamed plot log in one pass.
+
+    Returns:
+        dict: Every plot in the log keyed by str(plot_no), including those
+        written by earlier, interrupted runs; None if saving failed
+    """
+    plots = {}
+    for plot in iter_stream(village_no):
+        plots.setdefault(str(plot["plot_no"]), plot)
+    return plots if save_village_data(village_no, plots) else None
+
+def load_village_file(filename):
+    """
+    Plots of a finalized village file at any path, keyed by str(plot_no).
+    Unlike load_village_data, a missing or unreadable file raises instead
+    of reading as empty.
+    """
+    reader = _open_reader(filename)
+    if reader is None:
+        with open(filename, 'r') as f:
+            return json.load(f)["plots"]
+    with reader:
+        return dict(reader.items())
+
+def load_village_data(village_no):
+    """Load existing village data if available"""
+    if _stream_is_current(village_no):
+        return {str(plot["plot_no"]): plot for plot in iter_village_plots(village_no)}
+
+    filename = os.path.join(OUTPUT_DIR, f"village_{village_no}.json")
+    reader = _open_reader(filename)
+    if reader is None:
+        return _load_json_plots(filename)
+    with reader:
+        return dict(reader.items())
@@ -0,0 +1,196 @@
+# village_file.py
+
+import hashlib
+import json
+import mmap
+import os
+import numpy as np
+
+# One row per plot, sorted by plot_no; gis_order lists the rows by gis_hash
+INDEX_DTYPE = np.dtype([
+    ("plot_no", "<i8"), ("offset", "<i8"), ("length", "<i8"), ("gis_hash", "<u8"), ("gis_order", "<i8")
+])
+PLOT_INDENT = 8  # Plots sit two levels deep in village_N.json
+PLOT_END = b"\n" + b" " * PLOT_INDENT + b"}"
+PLOT_START = b"\n" + b" " * PLOT_INDENT + b'"'
+DECODE_CHUNK = 1024  # Consecutive plots decoded per json.loads while iterating
+
+def index_path(filename):
+    """Offset index sidecar of a village file: village_N.json -> village_N.idx.npy"""
+    return os.path.splitext(filename)[0] + ".idx.npy"
+
+def gis_hash(gis_code):
+    return int.from_bytes(hashlib.blake2b(str(gis_code).encode("utf-8"), digest_size=8).digest(), "little")
+
+def _nested(value, depth):
+    """json.dumps(indent=4) of a value sitting `depth` levels into the document"""
+    return json.dumps(value, indent=4, ensure_ascii=False).replace("\n", "\n" + " " * 4 * depth)
+
+def _build_index(entries):
+    index = np.array(entries, dtype=INDEX_DTYPE)
+    index.sort(order="plot_no", kind="stable")
+    index["gis_order"] = np.argsort(index["gis_hash"], kind="stable")
+    return index
+
+def _save_index(filename, index, source_mtime_ns):
+    """Write the sidecar, stamped with the mtime of the file version it indexes"""
+    path = index_path(filename)
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, index)
+    os.utime(f"{path}.tmp", ns=(source_mtime_ns, source_mtime_ns))
+    os.replace(f"{path}.tmp", path)
+
+def write_village_file(filename, metadata, plots):
+    """
+    Write {"metadata": ..., "plots": ...} exactly as json.dump(indent=4,
+    ensure_ascii=False) would, recording the byte span of every plot in
+    the offset index sidecar as it goes.
+    """
+    sidecar = index_path(filename)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
+
+    entries = []
+    with open(filename, "wb") as f:
+        offset = f.write(('{\n    "metadata": ' + _nested(metadata, 1) + ',\n    "plots": ').encode("utf-8"))
+        if not plots:
+            f.write(b"{}\n}")
+        else:
+            offset += f.write(b"{")
+            for count, (key, plot) in enumerate(plots.items()):
+                prefix = ("," if count else "") + "\n" + " " * PLOT_INDENT + json.dumps(key, ensure_ascii=False) + ": "
+                offset += f.write(prefix.encode("utf-8"))
+                length = f.write(_nested(plot, 2).encode("utf-8"))
+                entries.append((int(key), offset, length, gis_hash(plot["gisCode"]), 0))
+                offset += length
+            f.write(b"\n    }\n}")
+
+    _save_index(filename, _build_index(entries), os.stat(filename).st_mtime_ns)
+
+def _scan_index(data):
+    """
+    Build the offset index of a village file written without one, by
+    walking its indent=4 layout. Only the plots are decoded, one at a time.
+    """
+    start = data.find(b'\n    "plots": {')
+    if start < 0:
+        raise ValueError("No plots object found")
+    pos = start + len(b'\n    "plots": {')
+    entries = []
+
+    while data[pos:pos + len(PLOT_START)] == PLOT_START:
+        key_start = pos + len(PLOT_START)
+        key_end = data.find(b'": ', key_start)
+        value_start = key_end + 3
+        value_end = data.find(PLOT_END, value_start) + len(PLOT_END)
+        if key_end < 0 or value_end < len(PLOT_END) or data[value_start:value_start + 1] != b"{":
+            raise ValueError(f"Unexpected layout at byte {pos}")
+        plot = json.loads(data[value_start:value_end])
+        entries.append((int(data[key_start:key_end]), value_start, value_end - value_start,
+                        gis_hash(plot["gisCode"]), 0))
+        pos = value_end + 1 if data[value_end:value_end + 1] == b"," else value_end
+
+    if data[pos:pos + 6] != b"\n    }" and data[pos:pos + 1] != b"}":
+        raise ValueError(f"Unexpected layout at byte {pos}")
+    return _build_index(entries)
+
+class VillageReader:
+    """
+    Lazy, memory-mapped view of a village_N.json file.
+
+    Plots are located through the offset index sidecar (rebuilt with one
+    scan when it is missing or was built for another version of the file,
+    i.e. its mtime differs from the file's) and decoded only when
+    read, so iterating or looking up a plot never holds the whole document
+    in memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = self._load_index()
+        except Exception:
+            self.close()
+            raise
+
+    def _load_index(self):
+        sidecar = index_path(self.filename)
+        mtime_ns = os.fstat(self._file.fileno()).st_mtime_ns
+        if os.path.exists(sidecar) and os.stat(sidecar).st_mtime_ns == mtime_ns:
+            index = np.load(sidecar, mmap_mode="r")
+            if len(index) == 0 or (index["offset"] + index["length"]).max() <= len(self._data):
+                return index
+        index = _scan_index(self._data)
+        _save_index(self.filename, index, mtime_ns)
+        return index
+
+    def _decode(self, row):
+        entry = self._index[row]
+        start = int(entry["offset"])
+        return json.loads(self._data[start:start + int(entry["length"])])
+
+    def __len__(self):
+        return len(self._index)
+
+    def items(self):
+        """
+        Yield (str(plot_no), plot) in file order.
+
+        Runs of consecutive plots are decoded together: the members between
+        the first plot's key and the last plot's closing brace, wrapped in
+        braces, form a JSON object of their own.
+        """
+        index = np.sort(self._index, order="offset")
+        data = self._data
+        for first in range(0, len(index), DECODE_CHUNK):
+            chunk = index[first:first + DECODE_CHUNK]
+            start = data.rfind(PLOT_START, 0, int(chunk["offset"][0])) + 1
+            end = int(chunk["offset"][-1] + chunk["length"][-1])
+            plots = json.loads(b"{" + data[start:end] + b"}")
+            if len(plots) == len(chunk):
+                yield from plots.items()
+                continue
+            # Entries not laid out back to back: decode them one by one
+            for plot_no, offset, length in zip(chunk["plot_no"].tolist(), chunk["offset"].tolist(),
+                                               chunk["length"].tolist()):
+                yield str(plot_no), json.loads(data[offset:offset + length])
+
+    def __iter__(self):
+        for _, plot in self.items():
+            yield plot
+
+    def get(self, plot_no):
+        """The plot with this number, or None"""
+        plot_nos = self._index["plot_no"]
+        row = int(np.searchsorted(plot_nos, int(plot_no)))
+        if row < len(plot_nos) and plot_nos[row] == int(plot_no):
+            return self._decode(row)
+        return None
+
+    def find_gis_code(self, gis_code):
+        """The plot with this gisCode, or None"""
+        target = gis_hash(gis_code)
+        order = self._index["gis_order"]
+        hashes = self._index["gis_hash"]
+        position = int(np.searchsorted(hashes, target, sorter=order))
+        while position < len(order) and hashes[order[position]] == target:
+            plot = self._decode(int(order[position]))
+            if plot["gisCode"] == gis_code:
+                return plot
+            position += 1
+        return None
+
+    def close(self):
+        if getattr(self, "_data", None) is not None:
+            self._index = None
+            self._data.close()
+            self._data = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()